@@ -348,6 +348,12 @@ RQ_QUEUES = {
         "DEFAULT_TIMEOUT": 7200,
         "AUTOCOMMIT": False,
     },
+    # Creating scratch orgs for org pools, apart from the build workers
+    "pool": {
+        "USE_REDIS_CACHE": "default",
+        "DEFAULT_TIMEOUT": 3600,
+        "AUTOCOMMIT": False,
+    },
 }
 RQ_EXCEPTION_HANDLERS = ["metaci.build.exceptions.maybe_requeue_job"]
 CRON_JOBS = {
@@ -355,9 +361,23 @@ CRON_JOBS = {
         "func": "metaci.build.autoscaling.autoscale",
         "cron_string": "* * * * *",
     },
+    "reconcile_scratch_org_capacity": {
+        "func": "metaci.build.tasks.reconcile_scratch_org_capacity",
+        "cron_string": "* * * * *",
+    },
+    "fill_scratch_org_pools": {
+        "func": "metaci.cumulusci.tasks.fill_scratch_org_pools",
+        "cron_string": "*/5 * * * *",
+    },
+    "schedule_builds": {
+        "func": "metaci.build.tasks.schedule_builds",
+        "cron_string": "* * * * *",
+    },
     "check_waiting_builds": {
         "func": "metaci.build.tasks.check_waiting_builds",
-        "cron_string": "* * * * *",
+        # Waiting builds are woken when their org or capacity is released;
+        # this is only a safety net for missed wakeups.
+        "cron_string": "*/10 * * * *",
     },
     "monthly_builds_job": {
         "func": "metaci.plan.tasks.run_scheduled_monthly",
@@ -375,6 +395,12 @@ CRON_JOBS = {
         "func": "metaci.plan.tasks.run_scheduled_hourly",
         "cron_string": "0 * * * *",
     },
+    "check_webhook_deliveries": {
+        "func": "metaci.repository.tasks.check_webhook_deliveries",
+        # Deliveries are processed as they arrive;
+        # this is only a safety net for failed jobs.
+        "cron_string": "* * * * *",
+    },
     "prune_branches": {
         "func": "metaci.repository.tasks.prune_branches",
         "cron_string": "0 * * * *",
@@ -413,6 +439,11 @@ FROM_EMAIL = "test@mailinator.com"
 GITHUB_USERNAME = env("GITHUB_USERNAME", default=None)
 GITHUB_PASSWORD = env("GITHUB_PASSWORD", default=None)
 GITHUB_WEBHOOK_SECRET = env("GITHUB_WEBHOOK_SECRET", default="")
+# How long (in seconds) a process reuses the repository metadata it fetched
+# from GitHub, such as the default branch.
+METACI_GITHUB_REPO_TTL = env.int("METACI_GITHUB_REPO_TTL", 300)
+# How long (in seconds) GitHub responses are kept to revalidate by ETag.
+METACI_GITHUB_CACHE_TTL = env.int("METACI_GITHUB_CACHE_TTL", 86400)
 
 # Salesforce OAuth Connected App credentials
 SFDX_CLIENT_ID = None
@@ -440,6 +471,24 @@ METACI_CHANGE_CASE_URL_TEMPLATE = env(
 METACI_LONG_RUNNING_BUILD_CONFIG = json.loads(
     env("METACI_LONG_RUNNING_BUILD_CONFIG", default="{}")
 )
+# Whether rq workers import build dependencies before forking job processes
+METACI_WORKER_PREIMPORT = env.bool("METACI_WORKER_PREIMPORT", default=True)
+# The most builds a metaci_build_server process runs at once
+METACI_BUILD_SERVER_MAX_BUILDS = env.int("METACI_BUILD_SERVER_MAX_BUILDS", 4)
+# How long (in seconds) a request for new output of a running log
+# waits for some before returning without it
+METACI_LOG_STREAM_TIMEOUT = env.int("METACI_LOG_STREAM_TIMEOUT", 20)
+# Builds are reindexed for search in batches,
+# this many seconds after their status changes.
+METACI_SEARCH_INDEX_DELAY = env.int("METACI_SEARCH_INDEX_DELAY", 30)
+METACI_SEARCH_INDEX_BATCH_SIZE = env.int("METACI_SEARCH_INDEX_BATCH_SIZE", 500)
+# Where build workers cache repository zipballs, and the cache size limit.
+# Defaults to a directory in the system temp dir.
+METACI_ZIPBALL_CACHE_DIR = env("METACI_ZIPBALL_CACHE_DIR", default=None)
+METACI_ZIPBALL_CACHE_MAX_SIZE_MB = env.int("METACI_ZIPBALL_CACHE_MAX_SIZE_MB", 2048)
+# How long (in seconds) a running build's lock on a persistent org lasts
+# without being renewed. The lock is freed this long after a worker dies.
+METACI_ORG_LOCK_LEASE = env.int("METACI_ORG_LOCK_LEASE", 60)
 
 # GUS BUS OWNER ID
 GUS_BUS_OWNER_ID = env("GUS_BUS_OWNER_ID", default="")
@@ -447,6 +496,43 @@ GUS_BUS_OWNER_ID = env("GUS_BUS_OWNER_ID", default="")
 
 # Number of scratch orgs to leave available in the org.
 SCRATCH_ORG_RESERVE = env.int("METACI_SCRATCH_ORG_RESERVE", 10)
+# Dev Hubs to spread scratch orgs over, as a JSON list of
+# {"name": ..., "username": ..., "client_id": ..., "key": ...}.
+# Defaults to the hub in SFDX_HUB_USERNAME. See metaci.cumulusci.devhubs.
+METACI_DEV_HUBS = env.json("METACI_DEV_HUBS", default=[])
+# How long (in seconds) capacity reserved for a build's scratch org
+# is kept if the build never creates the org or releases it.
+METACI_SCRATCH_ORG_RESERVATION_TIMEOUT = env.int(
+    "METACI_SCRATCH_ORG_RESERVATION_TIMEOUT", 3600
+)
+# Pooled scratch orgs with less than this long (in seconds) before they
+# expire are not claimed by builds, and are deleted.
+METACI_SCRATCH_ORG_POOL_MIN_LIFETIME = env.int(
+    "METACI_SCRATCH_ORG_POOL_MIN_LIFETIME", 4 * 3600
+)
+# Pools are sized from the builds queued in this many seconds...
+METACI_SCRATCH_ORG_POOL_DEMAND_WINDOW = env.int(
+    "METACI_SCRATCH_ORG_POOL_DEMAND_WINDOW", 3600
+)
+# ...to cover the builds expected in this many seconds,
+# about how long it takes to create a scratch org.
+METACI_SCRATCH_ORG_POOL_LEAD_TIME = env.int("METACI_SCRATCH_ORG_POOL_LEAD_TIME", 900)
+
+# Builds are released to the workers of each autoscaler fairly between
+# repositories (see metaci.build.scheduler). Queues no autoscaler serves
+# may be given a number of slots as JSON, e.g. {"robot": 4}. The robot
+# queue defaults to 1 slot, for the single robot_worker in the Procfile;
+# set it to the number of robot_worker dynos if there are more.
+METACI_SCHEDULER_QUEUE_SLOTS = {
+    "robot": 1,
+    **env.json("METACI_SCHEDULER_QUEUE_SLOTS", default={}),
+}
+# The most builds of one repository or plan released at once (0 for no limit)
+METACI_SCHEDULER_REPO_LIMIT = env.int("METACI_SCHEDULER_REPO_LIMIT", 0)
+METACI_SCHEDULER_PLAN_LIMIT = env.int("METACI_SCHEDULER_PLAN_LIMIT", 0)
+# A build waiting this many seconds is released as if its repository
+# had one build fewer running
+METACI_SCHEDULER_AGING = env.int("METACI_SCHEDULER_AGING", 600)
 
 # Autoscaler class used for scaling the worker formation
 METACI_WORKER_AUTOSCALER = env(
@@ -186,7 +186,12 @@ HEROKU_APP_NAME = env("HEROKU_APP_NAME", default=None)
 
 if HEROKU_TOKEN and HEROKU_APP_NAME:
     METACI_WORKER_AUTOSCALER = "metaci.build.autoscaling.HerokuAutoscaler"
-    METACI_LONG_RUNNING_BUILD_CLASS = "metaci.build.autoscaling.HerokuOneOffBuilder"
+    # Set to metaci.build.autoscaling.WarmOneOffBuilder to run long-running
+    # builds on a build_server dyno instead of a new one-off dyno each
+    METACI_LONG_RUNNING_BUILD_CLASS = env(
+        "METACI_LONG_RUNNING_BUILD_CLASS",
+        default="metaci.build.autoscaling.HerokuOneOffBuilder",
+    )
 
 # Autoscalers are defined per METACI_APP
 AUTOSCALERS = json.loads(env("AUTOSCALERS", default="{}"))
@@ -80,3 +80,8 @@ METACI_RELEASE_WEBHOOK_ISSUER = "MetaCI"
 METACI_RELEASE_WEBHOOK_URL = "https://webhook"
 
 SITE_URL = "https://webhook"
+
+# Use a stand-in Dev Hub that doesn't talk to Salesforce
+METACI_DEV_HUBS = [
+    {"name": "local", "class": "metaci.cumulusci.devhubs.LocalDevHub", "max_orgs": 100}
+]
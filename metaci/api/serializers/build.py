@@ -10,6 +10,8 @@ from metaci.repository.models import Branch, Repository
 
 
 class BuildFlowSerializer(serializers.HyperlinkedModelSerializer):
+    log = serializers.CharField(source="get_log", read_only=True)
+
     class Meta:
         model = BuildFlow
         fields = (
@@ -19,6 +21,7 @@ class BuildFlowSerializer(serializers.HyperlinkedModelSerializer):
             "exception",
             "flow",
             "log",
+            "phase_timings",
             "rebuild",
             "status",
             "tests_fail",
@@ -77,6 +80,7 @@ class BuildSerializer(serializers.HyperlinkedModelSerializer):
     repo_id = serializers.PrimaryKeyRelatedField(
         queryset=Repository.objects.all(), source="repo", write_only=True
     )
+    log = serializers.CharField(source="get_log", read_only=True)
 
     class Meta:
         model = Build
@@ -94,6 +98,7 @@ class BuildSerializer(serializers.HyperlinkedModelSerializer):
             "org",
             "org_id",
             "org_instance",
+            "phase_timings",
             "plan",
             "plan_id",
             "pr",
@@ -0,0 +1,58 @@
+import pytest
+from rest_framework.test import APIClient
+
+from metaci.conftest import (
+    BuildFactory,
+    BuildFlowFactory,
+    PlanFactory,
+    StaffSuperuserFactory,
+)
+
+
+def timing(phase, duration):
+    return {
+        "phase": phase,
+        "start": "2021-01-01T00:00:00+00:00",
+        "end": "2021-01-01T00:00:00+00:00",
+        "duration": duration,
+    }
+
+
+@pytest.mark.django_db
+def test_plan_phase_timings():
+    plan = PlanFactory()
+    for duration in (10, 20, 30):
+        build = BuildFactory(
+            plan=plan, phase_timings=[timing("checkout", duration), timing("org", 60)]
+        )
+        BuildFlowFactory(build=build, phase_timings=[timing("flow", duration * 2)])
+    BuildFactory(plan=plan)
+    BuildFactory(phase_timings=[timing("checkout", 1000)])
+    client = APIClient()
+    client.force_authenticate(StaffSuperuserFactory())
+
+    response = client.get(f"/api/plans/{plan.id}/phase_timings/")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["builds"] == 3
+    assert data["phases"]["checkout"] == {
+        "count": 3,
+        "mean": 20,
+        "median": 20,
+        "p90": 30,
+        "max": 30,
+    }
+    assert data["phases"]["org"]["mean"] == 60
+    assert data["flow_phases"]["flow"]["max"] == 60
+
+
+@pytest.mark.django_db
+def test_plan_phase_timings__invalid_days():
+    plan = PlanFactory()
+    client = APIClient()
+    client.force_authenticate(StaffSuperuserFactory())
+
+    response = client.get(f"/api/plans/{plan.id}/phase_timings/", {"days": "0"})
+
+    assert response.status_code == 400
@@ -1,7 +1,14 @@
+from datetime import timedelta
+
 from django.shortcuts import render
-from rest_framework import viewsets
+from django.utils import timezone
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from metaci.api.serializers.plan import PlanRepositorySerializer, PlanSerializer
+from metaci.build.models import Build, BuildFlow
+from metaci.build.utils import summarize_phase_timings
 from metaci.plan.filters import PlanFilter, PlanRepositoryFilter
 from metaci.plan.models import Plan, PlanRepository
 
@@ -15,6 +22,37 @@ class PlanViewSet(viewsets.ModelViewSet):
     queryset = Plan.objects.all()
     filterset_class = PlanFilter
 
+    @action(detail=True, methods=["get"])
+    def phase_timings(self, request, pk=None):
+        """
+        Summarize how long each phase of the plan's builds and flows took
+        over the last ?days=30 days.
+        """
+        plan = self.get_object()
+        days = serializers.IntegerField(min_value=1).run_validation(
+            request.query_params.get("days", 30)
+        )
+        since = timezone.now() - timedelta(days=days)
+        build_timings = list(
+            Build.objects.filter(plan=plan, time_queue__gte=since)
+            .exclude(phase_timings=[])
+            .values_list("phase_timings", flat=True)
+        )
+        flow_timings = (
+            BuildFlow.objects.filter(build__plan=plan, time_queue__gte=since)
+            .exclude(phase_timings=[])
+            .values_list("phase_timings", flat=True)
+        )
+        return Response(
+            {
+                "plan": plan.id,
+                "days": days,
+                "builds": len(build_timings),
+                "phases": summarize_phase_timings(build_timings),
+                "flow_phases": summarize_phase_timings(flow_timings),
+            }
+        )
+
 
 class PlanRepositoryViewSet(viewsets.ModelViewSet):
     """
@@ -1,7 +1,10 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from metaci.api.serializers.repository import BranchSerializer, RepositorySerializer
 from metaci.api.utils import PkOrSlugMixin
+from metaci.repository import github
 from metaci.repository.filters import BranchFilter, RepositoryFilter
 from metaci.repository.models import Branch, Repository
 
@@ -25,3 +28,8 @@ class RepositoryViewSet(PkOrSlugMixin, viewsets.ModelViewSet):
     queryset = Repository.objects.all()
     filterset_class = RepositoryFilter
     lookup_slug_field = "name"
+
+    @action(detail=False, methods=["get"])
+    def github_cache(self, request):
+        """Hits and misses of the GitHub response cache, and the rate limit left."""
+        return Response(github.get_cache_stats())
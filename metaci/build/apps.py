@@ -7,8 +7,11 @@ class BuildConfig(AppConfig):
 
     def ready(self):
         import metaci.build.handlers  # noqa; side effect import
+        from metaci.build.search import defer_index_updates
 
         Build = self.get_model("Build")
         BuildFlow = self.get_model("BuildFlow")
-        watson.register(Build, exclude=["log"])
-        watson.register(BuildFlow, exclude=["log"])
+        watson.register(Build, exclude=["log", "log_html"])
+        watson.register(BuildFlow, exclude=["log", "log_html"])
+        defer_index_updates(Build)
+        defer_index_updates(BuildFlow)
@@ -1,18 +1,27 @@
+import heapq
 import logging
+import statistics
 import subprocess
 import typing as T
+from datetime import timedelta
 
 import django_rq
 import requests
 from cumulusci.core.utils import import_global
+from django.apps import apps
 from django.conf import settings
+from django.utils import timezone
 from rq import Worker
 from rq.registry import StartedJobRegistry
 
+from metaci.build.warm import queue_warm_build
 from metaci.exceptions import ConfigError
 
 logger = logging.getLogger(__name__)
 
+# Number of recent builds of a plan its expected duration is estimated from
+DURATION_HISTORY = 20
+
 
 class Autoscaler(object):
     """Utility to adjust the # of workers based on queue size."""
@@ -131,6 +140,18 @@ class LocalOneOffBuilder(OneOffBuilder):
         return proc.pid
 
 
+class WarmOneOffBuilder(OneOffBuilder):
+    """Hand builds to the metaci_build_server command.
+
+    The build server imports build dependencies once and forks a process
+    for each build, so builds don't pay for a cold process start.
+    """
+
+    def one_off_build(self, build_id: T.Union[int, str], lock_id: str):
+        queue_warm_build(build_id, lock_id)
+        return f"build-server-{build_id}"
+
+
 class HerokuAutoscaler(Autoscaler):
     """Scale using Heroku worker dynos."""
 
@@ -201,6 +222,130 @@ class HerokuAutoscaler(Autoscaler):
         return requests.patch(url, json={"quantity": target_workers}, headers=headers)
 
 
+def workers_needed(remaining, queued, wait_target, max_workers):
+    """Return the fewest workers that start every queued build within wait_target.
+
+    remaining is the seconds left on each running build, and queued is
+    the expected duration of each queued build, in the order they will
+    start. Returns max_workers if even that many are not enough.
+    """
+    for workers in range(max(len(remaining), 1), max_workers + 1):
+        # When each worker will be free
+        free_at = sorted(remaining) + [0] * (workers - len(remaining))
+        heapq.heapify(free_at)
+        for duration in queued:
+            start = heapq.heappop(free_at)
+            if start > wait_target:
+                break
+            heapq.heappush(free_at, start + duration)
+        else:
+            return workers
+    return max_workers
+
+
+class PredictiveAutoscaler(Autoscaler):
+    """Scale to the workers needed for queued builds to start within a target wait.
+
+    The time left on running builds and the time queued builds will take
+    are estimated from the durations of recent builds of the same plans.
+    Builds expected to be queued before a new worker could start are
+    counted too, at the average of the rate builds were queued in the last
+    hour and in the same hour a week ago. When no builds are active, as
+    many workers are kept as builds are expected while a worker starts.
+
+    Besides the Autoscaler config, this takes optional wait_target,
+    startup_time and default_duration (for plans with no finished builds)
+    in seconds.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.wait_target = config.get("wait_target", 300)
+        self.startup_time = config.get("startup_time", 120)
+        self.default_duration = config.get("default_duration", 1800)
+        self._durations = {}
+
+    def now(self):
+        return timezone.now()
+
+    def get_builds(self):
+        """Return (plan id, time started) for each queued or running build."""
+        Build = apps.get_model("build", "Build")
+        return Build.objects.filter(
+            status__in=("queued", "running"),
+            plan__queue__in=[queue.name for queue in self.queues],
+        ).values_list("plan_id", "time_start")
+
+    def get_expected_duration(self, plan_id):
+        """Return the median duration in seconds of recent builds of a plan."""
+        if plan_id not in self._durations:
+            Build = apps.get_model("build", "Build")
+            builds = (
+                Build.objects.filter(
+                    plan_id=plan_id, time_start__isnull=False, time_end__isnull=False
+                )
+                .order_by("-time_end")
+                .values_list("time_start", "time_end")[:DURATION_HISTORY]
+            )
+            durations = [(end - start).total_seconds() for start, end in builds]
+            self._durations[plan_id] = (
+                statistics.median(durations) if durations else self.default_duration
+            )
+        return self._durations[plan_id]
+
+    def get_arrival_rate(self):
+        """Return how many builds per second are expected to be queued."""
+        Build = apps.get_model("build", "Build")
+        builds = Build.objects.filter(
+            plan__queue__in=[queue.name for queue in self.queues]
+        )
+        now = self.now()
+        hour = timedelta(hours=1)
+        week_ago = now - timedelta(weeks=1)
+        recent = builds.filter(time_queue__gt=now - hour, time_queue__lte=now)
+        last_week = builds.filter(
+            time_queue__gt=week_ago, time_queue__lte=week_ago + hour
+        )
+        return (recent.count() + last_week.count()) / 2 / hour.total_seconds()
+
+    def measure(self):
+        now = self.now()
+        remaining = []
+        queued = []
+        for plan_id, time_start in self.get_builds():
+            duration = self.get_expected_duration(plan_id)
+            if time_start:
+                elapsed = (now - time_start).total_seconds()
+                remaining.append(max(duration - elapsed, 0))
+            else:
+                queued.append(duration)
+        self.active_builds = len(remaining) + len(queued)
+
+        arrivals = round(self.get_arrival_rate() * self.startup_time)
+        if not self.active_builds:
+            self.target_workers = min(arrivals, self.max_workers)
+            return
+        if arrivals:
+            average = sum(remaining + queued) / self.active_builds
+            queued += [average] * arrivals
+        self.target_workers = workers_needed(
+            remaining, queued, self.wait_target, self.max_workers
+        )
+
+
+class PredictiveHerokuAutoscaler(PredictiveAutoscaler, HerokuAutoscaler):
+    """Predictive scaling of Heroku worker dynos."""
+
+    def scale(self):
+        # Workers are only stopped when no builds are active,
+        # because we don't know which worker will be stopped.
+        active_workers = self.count_workers()
+        if not self.active_builds and active_workers > self.target_workers:
+            self._scale_down(num_workers=self.target_workers)
+        elif self.target_workers > active_workers:
+            self._scale_up(num_workers=self.target_workers)
+
+
 class HerokuOneOffBuilder(OneOffBuilder):
     """Run a build in a Heroku one-off dyno."""
 
@@ -0,0 +1,160 @@
+"""Admission control for scratch orgs on the Dev Hubs.
+
+Builds reserve a scratch org in a ledger on Redis before they are
+dispatched, so that builds admitted at the same time can't overcommit a
+Dev Hub. For each hub, the ledger counts orgs that are active on the hub
+and orgs that builds have been admitted to create but haven't created yet:
+
+- A build's reservation is pending from when it is admitted until its
+  org is created, which moves it to the active count, or until the build
+  finishes without creating an org. That includes the time the build
+  waits in the scheduler for a worker, so that it can create its org
+  as soon as it gets one.
+- Deleting an org takes it off the active count.
+- The active count and the hub's limit are periodically reset from
+  the hub's limits, which also count orgs created outside MetaCI.
+"""
+import time
+
+from django_redis import get_redis_connection
+
+MAX_KEY = "metaci:scratch-capacity:{}:max"
+ACTIVE_KEY = "metaci:scratch-capacity:{}:active"
+PENDING_KEY = "metaci:scratch-capacity:{}:pending"
+# If the ledger hasn't been reconciled for this long,
+# it is reconciled before the next build is admitted.
+RECONCILED_TIMEOUT = 600
+
+RESERVE_SCRIPT = """
+local max = redis.call("get", KEYS[1])
+if not max then
+    return -1
+end
+if redis.call("hexists", KEYS[3], ARGV[1]) == 1 then
+    return 1
+end
+local used = tonumber(redis.call("get", KEYS[2]) or "0") + redis.call("hlen", KEYS[3])
+if tonumber(max) - used < tonumber(ARGV[3]) then
+    return 0
+end
+redis.call("hset", KEYS[3], ARGV[1], ARGV[2])
+return 1
+"""
+
+ORG_CREATED_SCRIPT = """
+if redis.call("hdel", KEYS[2], ARGV[1]) == 1 then
+    redis.call("incr", KEYS[1])
+end
+"""
+
+ORG_DELETED_SCRIPT = """
+if tonumber(redis.call("get", KEYS[1]) or "0") > 0 then
+    redis.call("decr", KEYS[1])
+end
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def reserve(hub, build_id, keep_available):
+    """Reserve a scratch org on a hub for a build.
+
+    The build is only admitted if the hub has at least keep_available
+    orgs available. Returns True if the build was admitted (or already had a reservation),
+    False if the hub doesn't have capacity, or None if the hub's ledger
+    needs to be reconciled first.
+    """
+    result = _redis().eval(
+        RESERVE_SCRIPT,
+        3,
+        MAX_KEY.format(hub),
+        ACTIVE_KEY.format(hub),
+        PENDING_KEY.format(hub),
+        build_id,
+        time.time(),
+        keep_available,
+    )
+    return None if result == -1 else bool(result)
+
+
+def get_headroom(hub):
+    """Return how many more orgs a hub has room for.
+
+    Returns None if the hub's ledger needs to be reconciled.
+    """
+    redis = _redis()
+    with redis.pipeline() as pipe:
+        pipe.get(MAX_KEY.format(hub))
+        pipe.get(ACTIVE_KEY.format(hub))
+        pipe.hlen(PENDING_KEY.format(hub))
+        max_orgs, active, pending = pipe.execute()
+    if max_orgs is None:
+        return None
+    return int(max_orgs) - int(active or 0) - pending
+
+
+def get_reserved_hub(build_id, hubs):
+    """Return the hub a build reserved its scratch org on, if any."""
+    redis = _redis()
+    for hub in hubs:
+        if redis.hexists(PENDING_KEY.format(hub), build_id):
+            return hub
+
+
+def org_created(hub, build_id):
+    """Move a build's reservation from pending to active once its org exists."""
+    _redis().eval(
+        ORG_CREATED_SCRIPT, 2, ACTIVE_KEY.format(hub), PENDING_KEY.format(hub), build_id
+    )
+
+
+def org_deleted(hub):
+    _redis().eval(ORG_DELETED_SCRIPT, 1, ACTIVE_KEY.format(hub))
+
+
+def release(build_id, hubs):
+    """Drop a build's pending reservation.
+
+    Returns the hub it was on if the build still had one
+    (its org was never created).
+    """
+    redis = _redis()
+    for hub in hubs:
+        if redis.hdel(PENDING_KEY.format(hub), build_id):
+            return hub
+
+
+def reconcile(hub, limits, pending_timeout, waiting=()):
+    """Reset a hub's ledger from the hub's limits.
+
+    Pending reservations older than pending_timeout seconds are dropped,
+    in case the build that made them died, except that the reservations
+    of the builds in waiting, which are known to be alive, are renewed.
+    Returns the number of orgs that can be reserved.
+    """
+    redis = _redis()
+    pending_key = PENDING_KEY.format(hub)
+    now = time.time()
+    waiting = {str(build_id) for build_id in waiting}
+    reservations = {
+        build_id.decode(): float(reserved)
+        for build_id, reserved in redis.hgetall(pending_key).items()
+    }
+    renewed = {build_id: now for build_id in reservations if build_id in waiting}
+    stale = [
+        build_id
+        for build_id, reserved in reservations.items()
+        if build_id not in renewed and now - reserved > pending_timeout
+    ]
+    with redis.pipeline() as pipe:
+        pipe.set(MAX_KEY.format(hub), limits.max, ex=RECONCILED_TIMEOUT)
+        pipe.set(ACTIVE_KEY.format(hub), limits.max - limits.remaining)
+        if renewed:
+            pipe.hset(pending_key, mapping=renewed)
+        if stale:
+            pipe.hdel(pending_key, *stale)
+        pipe.hlen(pending_key)
+        pending = pipe.execute()[-1]
+    return limits.remaining - pending
@@ -0,0 +1,110 @@
+"""Limits on how many builds of a plan run at once.
+
+Plan.concurrency_limit caps the builds of a plan across all repositories
+and branches, and PlanRepository.branch_concurrency_limit caps the builds
+of a plan on each branch of a repository. When a build is dispatched, it
+takes a slot under every limit that applies to it, or none of them; a
+build that can't get all its slots waits until a build holding one
+finishes and gives it back.
+"""
+from django.apps import apps
+from django_redis import get_redis_connection
+
+SLOTS_KEY = "metaci:concurrency:{}"
+
+# Takes a slot in each of KEYS for the build ARGV[1], if each has fewer
+# holders than its limit in ARGV[2...]; a build never takes a slot twice.
+ACQUIRE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call("sismember", key, ARGV[1]) == 0
+        and redis.call("scard", key) >= tonumber(ARGV[i + 1]) then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call("sadd", key, ARGV[1])
+end
+return 1
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def get_resources(build):
+    """Return the names of the limits a build may count against."""
+    resources = [f"concurrency:plan-{build.plan_id}"]
+    if build.planrepo_id and build.branch_id:
+        resources.append(
+            f"concurrency:planrepo-{build.planrepo_id}:branch-{build.branch_id}"
+        )
+    return resources
+
+
+def get_limits(build):
+    """Return the limits that apply to a build, as (resource, limit) pairs."""
+    plan_resource, *branch_resource = get_resources(build)
+    limits = []
+    if build.plan.concurrency_limit:
+        limits.append((plan_resource, build.plan.concurrency_limit))
+    if branch_resource and build.planrepo.branch_concurrency_limit:
+        limits.append((branch_resource[0], build.planrepo.branch_concurrency_limit))
+    return limits
+
+
+def acquire(build_id, limits):
+    """Take a slot under each limit for a build, or none of them."""
+    if not limits:
+        return True
+    keys = [SLOTS_KEY.format(resource) for resource, _ in limits]
+    return bool(
+        _redis().eval(
+            ACQUIRE_SCRIPT,
+            len(keys),
+            *keys,
+            build_id,
+            *[limit for _, limit in limits],
+        )
+    )
+
+
+def release(build_id, resources):
+    """Give back a build's slots.
+
+    Returns the resources the build held a slot under.
+    """
+    redis = _redis()
+    return [
+        resource
+        for resource in resources
+        if redis.srem(SLOTS_KEY.format(resource), build_id)
+    ]
+
+
+def get_holders(resource):
+    """Return the ids of the builds holding slots under a limit."""
+    return sorted(
+        int(build_id) for build_id in _redis().smembers(SLOTS_KEY.format(resource))
+    )
+
+
+def prune(resource):
+    """Give back the slots of builds that are no longer queued or running,
+    such as builds whose worker died.
+
+    Returns the ids of those builds.
+    """
+    Build = apps.get_model("build", "Build")
+    holders = get_holders(resource)
+    active = {
+        build.id
+        for build in Build.objects.filter(id__in=holders).select_related(
+            "current_rebuild"
+        )
+        if build.get_status() in ("queued", "running")
+    }
+    stale = [build_id for build_id in holders if build_id not in active]
+    if stale:
+        _redis().srem(SLOTS_KEY.format(resource), *stale)
+    return stale
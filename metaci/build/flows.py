@@ -1,4 +1,5 @@
 import logging
+from contextlib import nullcontext
 
 from cumulusci.core.flowrunner import FlowCallback
 from django.conf import settings
@@ -17,8 +18,10 @@ logger = logging.getLogger("cumulusci")
 class MetaCIFlowCallback(FlowCallback):
     """An implementation of FlowCallback that logs task execution to the database."""
 
-    def __init__(self, buildflow_id):
+    def __init__(self, buildflow_id, build_flow=None):
         self.buildflow_id = buildflow_id
+        # The running BuildFlow, if available, to record phase timings on
+        self.build_flow = build_flow
 
     def pre_task(self, step):
         flowtask = FlowTask.objects.find_task(
@@ -47,9 +50,15 @@ class MetaCIFlowCallback(FlowCallback):
             flowtask.status = "complete"
         flowtask.save()
         if "robot_outputdir" in result.return_values:
-            test_results = import_robot_test_results(
-                flowtask, result.return_values["robot_outputdir"]
+            phase = (
+                self.build_flow.timed_phase("import_robot_test_results")
+                if self.build_flow
+                else nullcontext()
             )
+            with phase:
+                test_results = import_robot_test_results(
+                    flowtask, result.return_values["robot_outputdir"]
+                )
             if settings.METACI_RESULT_EXPORT_ENABLED:
                 try:
                     export_robot_test_results(flowtask, test_results)
@@ -3,7 +3,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from metaci.build.models import Build, Rebuild
-from metaci.build.tasks import check_queued_build, set_github_status
+from metaci.build.tasks import check_queued_build, set_github_status, supersede_builds
 
 
 @receiver(post_save, sender=Build)
@@ -13,6 +13,9 @@ def queue_build(sender, **kwargs):
     if not created or build.build_type == "manual-command":
         return
 
+    if build.plan.supersede_outdated_builds and build.build_type == "auto":
+        supersede_builds(build)
+
     # Queue the pending status task
     if settings.GITHUB_STATUS_UPDATES_ENABLED:
         res_status = set_github_status.delay(build.id)
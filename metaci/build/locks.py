@@ -0,0 +1,267 @@
+"""Lease-based locks on persistent orgs.
+
+Only one build at a time may use a persistent org. The lock is taken
+with a long timeout when the build is dispatched, so that it is held while
+the build waits for a worker. Once the build is running, it holds a short
+lease instead, which a heartbeat renews; if the worker dies, the org is
+unlocked as soon as the lease runs out.
+
+Builds waiting for an org are queued in the order they were queued.
+When the lock is released, it is reserved for the build at the head of
+that queue for long enough for the build to be checked, so builds that
+were queued later can't take the org first.
+
+Org locks used to be set through the Django cache, which stores them
+under a versioned key with a pickled value. A lock still held that way
+is honoured until it is released or expires.
+"""
+import logging
+import pickle
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+WAITERS_KEY = "metaci:waiters:{}"
+RESERVATION_KEY = "metaci:lock-reserved:{}"
+# Long enough for the check of the build the lock is reserved for to run
+RESERVATION_TIMEOUT = 60
+
+# Reserves the lock for the next waiter. Expects KEYS[2] to be the
+# reservation, KEYS[3] the waiters and ARGV[2] the reservation timeout.
+_RESERVE_NEXT = """
+local head = redis.call("zpopmin", KEYS[3])
+if head[1] then
+    redis.call("set", KEYS[2], head[1], "ex", ARGV[2])
+    return head[1]
+end
+redis.call("del", KEYS[2])
+return false
+"""
+
+ACQUIRE_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 or redis.call("exists", KEYS[4]) == 1 then
+    return 0
+end
+local reserved = redis.call("get", KEYS[2])
+if reserved and ARGV[2] ~= "" and reserved ~= ARGV[2] then
+    return 0
+end
+if ARGV[3] == "" then
+    redis.call("set", KEYS[1], ARGV[1])
+else
+    redis.call("set", KEYS[1], ARGV[1], "ex", ARGV[3])
+end
+if ARGV[2] ~= "" then
+    redis.call("del", KEYS[2])
+    redis.call("zrem", KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = (
+    """
+if ARGV[1] ~= "" and redis.call("get", KEYS[1]) ~= ARGV[1] then
+    return false
+end
+redis.call("del", KEYS[1])
+"""
+    + _RESERVE_NEXT
+)
+
+RESERVE_IF_FREE_SCRIPT = (
+    """
+if redis.call("exists", KEYS[1]) == 1 or redis.call("exists", KEYS[2]) == 1
+    or redis.call("exists", KEYS[4]) == 1 then
+    return false
+end
+"""
+    + _RESERVE_NEXT
+)
+
+PASS_RESERVATION_SCRIPT = (
+    """
+if redis.call("get", KEYS[2]) ~= ARGV[1] then
+    return false
+end
+"""
+    + _RESERVE_NEXT
+)
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _keys(lock_id):
+    return [
+        lock_id,
+        RESERVATION_KEY.format(lock_id),
+        WAITERS_KEY.format(lock_id),
+        _legacy_key(lock_id),
+    ]
+
+
+def _legacy_key(lock_id):
+    return cache.make_key(lock_id)
+
+
+def _get_legacy_holder(lock_id):
+    value = _redis().get(_legacy_key(lock_id))
+    return pickle.loads(value) if value else None
+
+
+def _build_id(value):
+    return int(value) if value else None
+
+
+def acquire(lock_id, holder, build_id=None, timeout=None):
+    """Take a lock if it is free and not reserved for another build.
+
+    If build_id is None, the lock is taken even if it is reserved
+    (this is used to lock orgs manually).
+    """
+    result = _redis().eval(
+        ACQUIRE_SCRIPT,
+        4,
+        *_keys(lock_id),
+        holder,
+        build_id or "",
+        timeout or "",
+    )
+    return bool(result)
+
+
+def renew(lock_id, holder, timeout):
+    """Extend the lease on a lock, if it is still held by holder."""
+    if _redis().eval(RENEW_SCRIPT, 1, lock_id, holder, timeout):
+        return True
+    if _get_legacy_holder(lock_id) == holder:
+        # Move the lock to the current key
+        _redis().set(lock_id, holder, ex=timeout)
+        _redis().delete(_legacy_key(lock_id))
+        return True
+    return False
+
+
+def release(lock_id, holder=None):
+    """Release a lock and reserve it for the next waiter.
+
+    If holder is given, the lock is only released if it is still held by holder.
+    Returns the id of the build the lock was reserved for, if any.
+    """
+    legacy_holder = _get_legacy_holder(lock_id)
+    if legacy_holder is not None and holder in (None, legacy_holder):
+        _redis().delete(_legacy_key(lock_id))
+        # Nothing else can hold the lock while the legacy key is set
+        holder = None
+    return _build_id(
+        _redis().eval(
+            RELEASE_SCRIPT, 4, *_keys(lock_id), holder or "", RESERVATION_TIMEOUT
+        )
+    )
+
+
+def reserve_if_free(lock_id):
+    """Reserve a lock for the next waiter if it is neither held nor reserved.
+
+    Returns the id of the build the lock was reserved for, if any.
+    """
+    return _build_id(
+        _redis().eval(
+            RESERVE_IF_FREE_SCRIPT, 4, *_keys(lock_id), "", RESERVATION_TIMEOUT
+        )
+    )
+
+
+def pass_reservation(lock_id, build_id):
+    """Pass the reservation of a lock from a build to the next waiter.
+
+    Returns the id of the build the lock was reserved for, if any.
+    """
+    return _build_id(
+        _redis().eval(
+            PASS_RESERVATION_SCRIPT, 4, *_keys(lock_id), build_id, RESERVATION_TIMEOUT
+        )
+    )
+
+
+def get_holder(lock_id):
+    holder = _redis().get(lock_id)
+    return holder.decode() if holder else _get_legacy_holder(lock_id)
+
+
+def get_ttl(lock_id):
+    """Return the seconds until a lock expires, or None if it doesn't expire."""
+    ttl = _redis().ttl(lock_id)
+    if ttl == -2:
+        ttl = _redis().ttl(_legacy_key(lock_id))
+    return ttl if ttl >= 0 else None
+
+
+def get_reservation(lock_id):
+    return _build_id(_redis().get(RESERVATION_KEY.format(lock_id)))
+
+
+def add_waiter(resource, build):
+    """Register a waiting build to be woken when a resource is released.
+
+    Waiters are woken in the order their builds were queued.
+    """
+    _redis().zadd(
+        WAITERS_KEY.format(resource), {build.id: build.get_time_queue().timestamp()}
+    )
+
+
+def remove_waiter(resource, build_id):
+    _redis().zrem(WAITERS_KEY.format(resource), build_id)
+
+
+def get_waiters(resource):
+    """Return the ids of the builds waiting for a resource, in order."""
+    return [
+        int(build_id)
+        for build_id in _redis().zrange(WAITERS_KEY.format(resource), 0, -1)
+    ]
+
+
+class LeaseHeartbeat:
+    """Hold the lock on an org with a short lease, renewed until the block exits."""
+
+    def __init__(self, lock_id, holder, lease=None):
+        self.lock_id = lock_id
+        self.holder = holder
+        self.lease = lease or settings.METACI_ORG_LOCK_LEASE
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        # Replace the long timeout the lock was taken with
+        if not renew(self.lock_id, self.holder, self.lease):
+            logger.warning(f"{self.holder} does not hold the lock {self.lock_id}")
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.lease / 3):
+            try:
+                if not renew(self.lock_id, self.holder, self.lease):
+                    logger.warning(f"{self.holder} lost the lock {self.lock_id}")
+                    return
+            except Exception:
+                # Try again at the next heartbeat, before the lease runs out
+                logger.exception(f"Could not renew the lock {self.lock_id}")
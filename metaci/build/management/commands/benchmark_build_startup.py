@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from metaci.build.warm import benchmark_startup
+
+
+class Command(BaseCommand):
+    help = "Compares the startup time of cold and warm (forked) build processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3)
+
+    def handle(self, *args, **options):
+        result = benchmark_startup(options["runs"])
+        self.stdout.write(f"Cold process startup: {result['cold']:.3f}s")
+        self.stdout.write(f"Warm forked startup: {result['warm']:.3f}s")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from metaci.build.models import Build, BuildFlow
+
+
+class Command(BaseCommand):
+    help = (
+        "Folds leftover log chunks of finished builds into their log field, "
+        "and renders the HTML of logs that have none."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--include-running",
+            action="store_true",
+            help="Also compact logs of builds that are still queued or running.",
+        )
+
+    def handle(self, *args, **options):
+        for model in (Build, BuildFlow):
+            objects = model.objects.filter(
+                Q(log_chunks__isnull=False) | Q(log_html__isnull=True, log__gt="")
+            ).distinct()
+            if not options["include_running"]:
+                objects = objects.exclude(status__in=["queued", "waiting", "running"])
+            count = 0
+            for obj in objects.iterator():
+                obj.compact_log()
+                count += 1
+            self.stdout.write(f"Compacted logs of {count} {model._meta.verbose_name}s")
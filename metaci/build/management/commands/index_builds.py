@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from metaci.build.models import Build, BuildFlow
+from metaci.build.search import update_objects_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search index for builds and build flows in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Only reindex builds queued within this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (Build, BuildFlow):
+            objects = model.objects.defer("log", "log_html").order_by("pk")
+            if options["days"]:
+                since = timezone.now() - timedelta(days=options["days"])
+                objects = objects.filter(time_queue__gte=since)
+
+            count = 0
+            batch = []
+            for obj in objects.iterator(chunk_size=options["batch_size"]):
+                batch.append(obj)
+                if len(batch) >= options["batch_size"]:
+                    count += update_objects_index(batch)
+                    batch = []
+            count += update_objects_index(batch)
+            self.stdout.write(f"Indexed {count} {model._meta.verbose_name}s")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from rq.exceptions import ShutDownImminentException
+
+from metaci.build.warm import WarmBuildServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs long-running builds queued by the WarmOneOffBuilder, "
+        "each in a process forked from a warm parent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-builds",
+            type=int,
+            help="Maximum number of builds to run at the same time. "
+            "Defaults to METACI_BUILD_SERVER_MAX_BUILDS.",
+        )
+
+    def handle(self, *args, **options):
+        WarmBuildServer(max_builds=options["max_builds"]).serve()
+
+
+# As in metaci_rqworker, so that ShutDownImminentException falls through
+# `except Exception` handlers to run_build
+ShutDownImminentException.__bases__ = (BaseException,)
@@ -5,6 +5,8 @@ from django_rq.management.commands.rqworker import Command as BaseCommand
 from rq.exceptions import ShutDownImminentException
 from rq.worker import HerokuWorker
 
+from metaci.build.warm import preimport
+
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
@@ -20,6 +22,11 @@ class Command(BaseCommand):
             # This ensures that workers exit in a way that can requeue running jobs.
             options["worker_class"] = "rq.worker.HerokuWorker"
 
+        if settings.METACI_WORKER_PREIMPORT:
+            # rq forks a work horse for each job; import build dependencies
+            # once here so that each job doesn't import them again.
+            preimport()
+
         return super().handle(*args, **options)
 
 
@@ -0,0 +1,80 @@
+import json
+from datetime import timedelta
+
+from cumulusci.core.utils import import_global
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from metaci.build.models import Build
+from metaci.build.simulation import Simulation, export_trace, load_trace, save_trace
+
+
+class Command(BaseCommand):
+    help = "Replays build history against autoscalers and compares how they do."
+
+    def add_arguments(self, parser):
+        parser.add_argument("app_name", type=str, help="An app in AUTOSCALERS.")
+        parser.add_argument(
+            "--autoscaler",
+            action="append",
+            help="Autoscaler class to simulate; may be given more than once. "
+            "Defaults to METACI_WORKER_AUTOSCALER.",
+        )
+        parser.add_argument(
+            "--config",
+            type=json.loads,
+            default={},
+            help="JSON to override the app's autoscaler config with.",
+        )
+        parser.add_argument(
+            "--trace", type=str, help="Replay a trace file instead of the database."
+        )
+        parser.add_argument(
+            "--days", type=int, default=7, help="Days of build history to replay."
+        )
+        parser.add_argument(
+            "--save-trace", type=str, help="Write the trace replayed to a file."
+        )
+        parser.add_argument("--tick", type=int, default=60)
+        parser.add_argument("--startup-time", type=int, default=120)
+        parser.add_argument("--workers", type=int, default=0)
+        parser.add_argument("--dyno-limit", type=int)
+
+    def handle(self, app_name, *args, **options):
+        config = {**settings.AUTOSCALERS[app_name], **options["config"]}
+        if options["trace"]:
+            with open(options["trace"]) as f:
+                trace = load_trace(f)
+        else:
+            since = timezone.now() - timedelta(days=options["days"])
+            trace = export_trace(
+                Build.objects.filter(
+                    time_queue__gte=since, plan__queue__in=config["queues"]
+                )
+            )
+        if options["save_trace"]:
+            with open(options["save_trace"], "w") as f:
+                save_trace(trace, f)
+
+        for path in options["autoscaler"] or [settings.METACI_WORKER_AUTOSCALER]:
+            report = Simulation(
+                import_global(path),
+                config,
+                trace,
+                tick=options["tick"],
+                startup_time=options["startup_time"],
+                workers=options["workers"],
+                dyno_limit=options["dyno_limit"],
+            ).run()
+            self.stdout.write(path)
+            self.stdout.write(
+                f"  Builds: {report.builds} "
+                f"({report.unfinished} unfinished, {report.interrupted} interrupted)"
+            )
+            self.stdout.write(
+                f"  Queue wait: p50 {report.wait_p50:.0f}s, p90 {report.wait_p90:.0f}s, "
+                f"p99 {report.wait_p99:.0f}s, max {report.wait_max:.0f}s"
+            )
+            self.stdout.write(f"  Worker-minutes: {report.worker_minutes:.0f}")
+            self.stdout.write(f"  Peak workers: {report.peak_workers}")
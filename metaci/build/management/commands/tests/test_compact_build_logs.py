@@ -0,0 +1,46 @@
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+
+from metaci.build.models import Build
+from metaci.build.utils import hash_log
+from metaci.conftest import BuildFactory
+
+
+@pytest.mark.django_db
+def test_compact_build_logs():
+    finished = BuildFactory(status="success", log="head\n")
+    finished.append_log("tail\n")
+    running = BuildFactory(status="running", log="")
+    running.append_log("still going\n")
+
+    call_command("compact_build_logs")
+
+    finished = Build.objects.get(id=finished.id)
+    assert finished.log == "head\ntail\n"
+    assert not finished.log_chunks.exists()
+    assert running.log_chunks.count() == 1
+
+
+@pytest.mark.django_db
+def test_compact_build_logs__include_running():
+    running = BuildFactory(status="running", log="")
+    running.append_log("still going\n")
+
+    call_command("compact_build_logs", include_running=True)
+
+    assert Build.objects.get(id=running.id).log == "still going\n"
+
+
+@pytest.mark.django_db
+def test_compact_build_logs__renders_html():
+    legacy = BuildFactory(status="success", log="\x1b[31mold\x1b[0m\n")
+
+    call_command("compact_build_logs")
+
+    legacy = Build.objects.get(id=legacy.id)
+    assert legacy.log_html_hash == hash_log(legacy.log)
+    with mock.patch("metaci.build.models.format_log_fragment") as fragment:
+        assert "old" in legacy.get_log_html()
+    fragment.assert_not_called()
@@ -0,0 +1,29 @@
+import io
+
+from django.core.management import call_command
+
+from metaci.build.simulation import TraceBuild, save_trace
+
+
+def test_simulate_autoscaler(tmp_path):
+    trace = tmp_path / "trace.json"
+    with open(trace, "w") as f:
+        save_trace([TraceBuild(1, "default", 0, 600)], f)
+    out = io.StringIO()
+
+    call_command(
+        "simulate_autoscaler",
+        "test-app",
+        trace=str(trace),
+        autoscaler=["metaci.build.autoscaling.NonAutoscaler"],
+        workers=1,
+        stdout=out,
+    )
+
+    assert out.getvalue() == (
+        "metaci.build.autoscaling.NonAutoscaler\n"
+        "  Builds: 1 (0 unfinished, 0 interrupted)\n"
+        "  Queue wait: p50 0s, p90 0s, p99 0s, max 0s\n"
+        "  Worker-minutes: 10\n"
+        "  Peak workers: 1\n"
+    )
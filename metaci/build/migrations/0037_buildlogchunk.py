@@ -0,0 +1,36 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('build', '0036_update_jsonfield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildLogChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('time_created', models.DateTimeField(auto_now_add=True)),
+                ('build', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='log_chunks', to='build.build')),
+                ('build_flow', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='log_chunks', to='build.buildflow')),
+            ],
+            options={
+                'ordering': ['sequence'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='buildlogchunk',
+            constraint=models.UniqueConstraint(fields=('build', 'sequence'), name='unique_build_log_chunk'),
+        ),
+        migrations.AddConstraint(
+            model_name='buildlogchunk',
+            constraint=models.UniqueConstraint(fields=('build_flow', 'sequence'), name='unique_build_flow_log_chunk'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('build', '0037_buildlogchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildlogchunk',
+            name='offset',
+            field=models.PositiveIntegerField(default=0, help_text="Position of this chunk's first character in the full log"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('build', '0038_buildlogchunk_offset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='log_html',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='log_html_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='buildflow',
+            name='log_html',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='buildflow',
+            name='log_html_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='buildlogchunk',
+            name='html',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0039_log_html"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="build",
+            name="phase_timings",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name="buildflow",
+            name="phase_timings",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
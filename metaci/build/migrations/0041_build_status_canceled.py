@@ -0,0 +1,49 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0040_phase_timings"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="build",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                    ("canceled", "Canceled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="rebuild",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                    ("canceled", "Canceled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+    ]
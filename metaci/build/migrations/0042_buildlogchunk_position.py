@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 21:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('build', '0041_build_status_canceled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildlogchunk',
+            name='ansi_state',
+            field=models.CharField(blank=True, default='', help_text='ANSI color codes in effect where this chunk starts', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='buildlogchunk',
+            name='line',
+            field=models.PositiveIntegerField(default=0, help_text='Number of the log line this chunk starts on'),
+        ),
+    ]
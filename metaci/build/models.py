@@ -3,10 +3,11 @@ import os
 import shutil
 import sys
 import tempfile
+import time
 import traceback
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from glob import iglob
-from io import BytesIO
 
 from cumulusci import __version__ as cumulusci_version
 from cumulusci.core.config import FAILED_TO_CREATE_SCRATCH_ORG
@@ -19,25 +20,36 @@ from cumulusci.core.exceptions import (
 from cumulusci.core.flowrunner import FlowCoordinator
 from cumulusci.salesforce_api.exceptions import MetadataComponentFailure
 from cumulusci.utils import elementtree_parse_file
+from django import db
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Length, Replace, Substr
 from django.http import Http404
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
 from jinja2.sandbox import ImmutableSandboxedEnvironment
+from redis.exceptions import RedisError
 
 from metaci.build.tasks import set_github_status
-from metaci.build.utils import format_log, set_build_info
+from metaci.build.utils import (
+    LogPosition,
+    format_log_fragment,
+    get_ansi_state,
+    hash_log,
+    set_build_info,
+    wrap_log_html,
+)
+from metaci.build.zipballs import extract_zipball, list_zipball, open_zipball
 from metaci.cumulusci.config import MetaCIUniversalConfig
 from metaci.cumulusci.keychain import MetaCIProjectKeychain
 from metaci.cumulusci.logger import init_logger
-from metaci.release.utils import (
-    send_start_webhook,
-    send_stop_webhook,
-)
+from metaci.release.utils import send_start_webhook, send_stop_webhook
 from metaci.testresults.importer import import_test_results
 from metaci.utils import generate_hash
 
@@ -49,6 +61,7 @@ BUILD_STATUSES = (
     ("error", "Error"),
     ("fail", "Failed"),
     ("qa", "QA Testing"),
+    ("canceled", "Canceled"),
 )
 BUILD_FLOW_STATUSES = (
     ("queued", "Queued"),
@@ -81,6 +94,10 @@ FAIL_EXCEPTIONS = (
     MetadataComponentFailure,
     RobotTestFailure,
 )
+# Times to retry appending a log chunk when another process appended first
+APPEND_LOG_ATTEMPTS = 5
+# How far back from the end of a compacted log its ANSI state is read from
+ANSI_STATE_WINDOW = 64 * 1024
 
 jinja2_env = ImmutableSandboxedEnvironment()
 
@@ -95,6 +112,264 @@ class GnarlyEncoder(DjangoJSONEncoder):
             return repr(obj)
 
 
+class ChunkedLogMixin:
+    """Append-only log storage for models with a ``log`` field.
+
+    While a build is running, log output is written as ``BuildLogChunk`` rows
+    instead of rewriting the whole ``log`` column on every flush. The ``log``
+    field holds the compacted head of the log (including logs written before
+    chunked storage existed), and ``get_log`` reassembles the full text.
+
+    Each chunk's HTML is rendered when it is appended, and ``compact_log``
+    folds it into ``log_html`` (keyed by ``log_html_hash``, the hash of the
+    log it was rendered from), so each piece of log output is converted from
+    ANSI to HTML only once, and reading the log HTML never writes.
+    """
+
+    log_chunk_field = None
+
+    def _log_chunk_filter(self):
+        return {self.log_chunk_field: self}
+
+    @property
+    def log_channel(self):
+        """The Redis channel notified whenever the log changes."""
+        return f"metaci:log:{self._meta.label_lower}:{self.pk}"
+
+    def _notify_log_changed(self):
+        try:
+            get_redis_connection("default").publish(self.log_channel, 1)
+        except RedisError:
+            # Live viewers still see the change once their request times out
+            pass
+
+    def _get_log_head(self, offset=0):
+        """Return the stored length of the ``log`` field and its text after offset."""
+        return (
+            type(self)
+            .objects.filter(pk=self.pk)
+            .annotate(head_length=Length("log"), head_tail=Substr("log", offset + 1))
+            .values("head_length", "head_tail")
+            .get()
+        )
+
+    def append_log(self, text):
+        """Append text to the log by inserting a new chunk, with its HTML.
+
+        The next chunk's position is cached on the instance. If another
+        process appended a chunk since, the insert conflicts with it, and
+        the position is read again from the last chunk.
+        """
+        if not text:
+            return
+        position = getattr(self, "_log_position", None)
+        for attempt in range(APPEND_LOG_ATTEMPTS):
+            if position is None:
+                position = self._get_log_position()
+            sequence, offset, log_position = position
+            try:
+                with transaction.atomic():
+                    BuildLogChunk.objects.create(
+                        sequence=sequence,
+                        offset=offset,
+                        line=log_position.line,
+                        ansi_state=log_position.ansi_state,
+                        content=text,
+                        html=format_log_fragment(text, *log_position),
+                        **self._log_chunk_filter(),
+                    )
+            except IntegrityError:
+                if attempt == APPEND_LOG_ATTEMPTS - 1:
+                    raise
+                position = None
+            else:
+                break
+        self._log_position = (
+            sequence + 1,
+            offset + len(text),
+            log_position.advance(text),
+        )
+        self._notify_log_changed()
+
+    def _get_log_position(self):
+        """Return the sequence, offset and LogPosition of the next chunk.
+
+        These are taken from the last chunk, or if there are none, from the
+        compacted head without reading all of it.
+        """
+        last_chunk = (
+            BuildLogChunk.objects.filter(**self._log_chunk_filter())
+            .order_by("-sequence")
+            .values("sequence", "offset", "line", "ansi_state", "content")
+            .first()
+        )
+        if last_chunk:
+            content = last_chunk["content"]
+            return (
+                last_chunk["sequence"] + 1,
+                last_chunk["offset"] + len(content),
+                LogPosition(last_chunk["ansi_state"], last_chunk["line"]).advance(
+                    content
+                ),
+            )
+        head = (
+            type(self)
+            .objects.filter(pk=self.pk)
+            .annotate(
+                head_length=Length("log"),
+                head_lines=Length("log") - Length(Replace("log", Value("\n"))),
+                head_end=Substr(
+                    "log", Greatest(Length("log") - ANSI_STATE_WINDOW, 0) + 1
+                ),
+            )
+            .values("head_length", "head_lines", "head_end")
+            .get()
+        )
+        head_end = head["head_end"] or ""
+        return (
+            1,
+            head["head_length"] or 0,
+            LogPosition(
+                get_ansi_state(head_end),
+                head["head_lines"] or 0,
+                not head_end.endswith("\n") if head_end else False,
+            ),
+        )
+
+    def read_log(self, offset=0):
+        """Return ``(text, end)``: the log text after ``offset`` and the log length.
+
+        Chunks are read before the compacted head so that a concurrent
+        ``compact_log`` can never make text disappear between the two reads;
+        anything already folded into the head is taken from the head.
+        """
+        chunks = list(
+            BuildLogChunk.objects.filter(**self._log_chunk_filter())
+            .annotate(end=F("offset") + Length("content"))
+            .filter(end__gte=offset)
+            .order_by("sequence")
+            .values_list("offset", "content")
+        )
+        head = self._get_log_head(offset)
+        head_length = head["head_length"] or 0
+
+        parts = []
+        if offset < head_length:
+            parts.append(head["head_tail"])
+        position = end = max(offset, head_length) if chunks else head_length
+        for chunk_offset, content in chunks:
+            end = max(end, chunk_offset + len(content))
+            if end > position:
+                parts.append(content[max(position - chunk_offset, 0) :])
+                position = end
+        return "".join(parts), end
+
+    def get_log(self):
+        """Return the full log text: the compacted head plus any chunks."""
+        chunks = BuildLogChunk.objects.filter(**self._log_chunk_filter()).order_by(
+            "sequence"
+        )
+        return (self.log or "") + "".join(chunks.values_list("content", flat=True))
+
+    def get_log_tail(self, lines=25):
+        """Return the last ``lines`` lines of the log."""
+        return "\n".join(self.get_log().split("\n")[-lines:])
+
+    def replace_log(self, text):
+        """Replace the whole log with text, discarding any chunks."""
+        log_html = format_log_fragment(text, line=0)
+        with transaction.atomic():
+            self.log = text
+            self.log_html = log_html
+            self.log_html_hash = hash_log(text)
+            type(self).objects.filter(pk=self.pk).update(
+                log=text, log_html=log_html, log_html_hash=self.log_html_hash
+            )
+            BuildLogChunk.objects.filter(**self._log_chunk_filter()).delete()
+        self._log_position = None
+        self._notify_log_changed()
+
+    def compact_log(self):
+        """Fold pending chunks into the ``log`` field in a single write.
+
+        The rendered HTML of the chunks is folded into ``log_html`` as well,
+        so a finished log never has to be converted again. A log without
+        chunks whose ``log_html`` is missing or stale is rendered and saved.
+        """
+        with transaction.atomic():
+            log, log_html, log_html_hash = (
+                type(self)
+                .objects.select_for_update()
+                .values_list("log", "log_html", "log_html_hash")
+                .get(pk=self.pk)
+            )
+            chunks = list(
+                BuildLogChunk.objects.select_for_update()
+                .filter(**self._log_chunk_filter())
+                .order_by("sequence")
+            )
+            log = log or ""
+            log_hash = hash_log(log)
+            if not chunks and log_html is not None and log_html_hash == log_hash:
+                return
+            self.log_html = self._render_log(log, log_html, log_html_hash, chunks)
+            if chunks:
+                self.log = log + "".join(chunk.content for chunk in chunks)
+                self.log_html_hash = hash_log(self.log)
+                type(self).objects.filter(pk=self.pk).update(
+                    log=self.log,
+                    log_html=self.log_html,
+                    log_html_hash=self.log_html_hash,
+                )
+                BuildLogChunk.objects.filter(
+                    pk__in=[chunk.pk for chunk in chunks]
+                ).delete()
+            else:
+                self.log_html_hash = log_hash
+                type(self).objects.filter(pk=self.pk).update(
+                    log_html=self.log_html, log_html_hash=self.log_html_hash
+                )
+        self._log_position = None
+        # Live viewers check whether the build has finished
+        self._notify_log_changed()
+
+    def _render_log(self, log, log_html, log_html_hash, chunks):
+        """Return the HTML of a log head and its chunks.
+
+        Stored renderings are used where they are current; anything else is
+        rendered here but not saved, as only ``compact_log`` and the methods
+        that write the log save renderings.
+        """
+        if log_html is None or log_html_hash != hash_log(log):
+            log_html = format_log_fragment(log, line=0)
+        parts = [log_html]
+        position = None
+        if any(chunk.html is None for chunk in chunks):
+            position = LogPosition().advance(log)
+        for chunk in chunks:
+            if position is None:
+                parts.append(chunk.html)
+                continue
+            if chunk.html is None:
+                parts.append(format_log_fragment(chunk.content, *position))
+            else:
+                parts.append(chunk.html)
+            position = position.advance(chunk.content)
+        return "".join(parts)
+
+    def get_log_html(self):
+        chunks = BuildLogChunk.objects.filter(**self._log_chunk_filter()).order_by(
+            "sequence"
+        )
+        chunks = list(chunks)
+        if self.log or chunks:
+            return wrap_log_html(
+                self._render_log(
+                    self.log or "", self.log_html, self.log_html_hash, chunks
+                )
+            )
+
+
 class BuildQuerySet(models.QuerySet):
     def for_user(self, user, perms=None):
         if user.is_superuser:
@@ -111,7 +386,73 @@ class BuildQuerySet(models.QuerySet):
             raise Http404
 
 
-class Build(models.Model):
+# Phases timed while a build waits to be dispatched
+WAIT_PHASES = ("capacity_wait", "lock_wait", "concurrency_wait")
+
+
+class PhaseTimingMixin:
+    """Records how long each phase of a build or build flow took.
+
+    ``phase_timings`` is a list of ``{"phase", "start", "end", "duration"}``
+    records (durations in seconds) in the order the phases started.
+    Phases may overlap, e.g. checkout and scratch org creation.
+    """
+
+    def record_phase(self, phase, start, end):
+        self.phase_timings.append(
+            {
+                "phase": phase,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "duration": round((end - start).total_seconds(), 3),
+            }
+        )
+        self._save_phase_timings()
+
+    def start_phase(self, phase):
+        """Start timing a phase, unless it is already being timed."""
+        if self._get_open_phase(phase):
+            return
+        self.phase_timings.append(
+            {
+                "phase": phase,
+                "start": timezone.now().isoformat(),
+                "end": None,
+                "duration": None,
+            }
+        )
+        self._save_phase_timings()
+
+    def end_phase(self, phase):
+        record = self._get_open_phase(phase)
+        if not record:
+            return
+        end = timezone.now()
+        record["end"] = end.isoformat()
+        record["duration"] = round(
+            (end - parse_datetime(record["start"])).total_seconds(), 3
+        )
+        self._save_phase_timings()
+
+    @contextmanager
+    def timed_phase(self, phase):
+        self.start_phase(phase)
+        try:
+            yield
+        finally:
+            self.end_phase(phase)
+
+    def _get_open_phase(self, phase):
+        for record in reversed(self.phase_timings):
+            if record["phase"] == phase and record["end"] is None:
+                return record
+
+    def _save_phase_timings(self):
+        # Only write this field, so concurrent phases don't overwrite other changes
+        type(self).objects.filter(pk=self.pk).update(phase_timings=self.phase_timings)
+
+
+class Build(ChunkedLogMixin, PhaseTimingMixin, models.Model):
     repo = models.ForeignKey(
         "repository.Repository", related_name="builds", on_delete=models.CASCADE
     )
@@ -163,6 +504,10 @@ class Build(models.Model):
         on_delete=models.SET_NULL,
     )
     log = models.TextField(null=True, blank=True)
+    log_html = models.TextField(null=True, blank=True, editable=False)
+    log_html_hash = models.CharField(
+        max_length=64, null=True, blank=True, editable=False
+    )
     exception = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
     traceback = models.TextField(null=True, blank=True)
@@ -192,6 +537,7 @@ class Build(models.Model):
     time_end = models.DateTimeField(null=True, blank=True)
     time_qa_start = models.DateTimeField(null=True, blank=True)
     time_qa_end = models.DateTimeField(null=True, blank=True)
+    phase_timings = models.JSONField(default=list, blank=True, editable=False)
 
     build_type = models.CharField(max_length=16, choices=BUILD_TYPES, default="legacy")
     user = models.ForeignKey(
@@ -209,6 +555,8 @@ class Build(models.Model):
 
     objects = BuildQuerySet.as_manager()
 
+    log_chunk_field = "build"
+
     class Meta:
         ordering = ["-time_queue"]
         permissions = (("search_builds", "Search Builds"),)
@@ -233,10 +581,6 @@ class Build(models.Model):
     def __str__(self):
         return f"{self.id}: {self.repo} - {self.commit}"
 
-    def get_log_html(self):
-        if self.log:
-            return format_log(self.log)
-
     def get_absolute_url(self):
         return reverse("build_detail", kwargs={"build_id": str(self.id)})
 
@@ -290,9 +634,9 @@ class Build(models.Model):
         build.status = status
         build.save()
 
-    def flush_log(self):
+    def flush_log(self, force=False):
         for handler in self.logger.handlers:
-            handler.stream.flush()
+            handler.stream.flush(force=force)
 
     @property
     def worker_id(self):
@@ -306,7 +650,18 @@ class Build(models.Model):
         )
         self.flush_log()
         build = self.current_rebuild if self.current_rebuild else self
-        set_build_info(build, status="running", time_start=timezone.now())
+        time_start = timezone.now()
+        set_build_info(build, status="running", time_start=time_start)
+
+        # Start a fresh timing record, keeping time spent waiting for this run
+        queued = build.time_queue.isoformat()
+        self.phase_timings = [
+            record
+            for record in self.phase_timings
+            if record["phase"] in WAIT_PHASES and record["start"] >= queued
+        ]
+        self.end_wait_phases()
+        self.record_phase("queue", build.time_queue, time_start)
 
         if self.schedule:
             self.logger.info(
@@ -315,18 +670,9 @@ class Build(models.Model):
 
         try:
 
-            # Extract the repo to a temp build dir
-            self.build_dir = self.checkout()
-            self.root_dir = os.getcwd()
-
-            # Change directory to the build_dir
-            os.chdir(self.build_dir)
-
-            # Initialize the project config
-            project_config = self.get_project_config()
-
-            # Look up or spin up the org
-            org_config = self.get_org(project_config)
+            # Extract the repo to a temp build dir, change directory to it,
+            # initialize the project config and look up or spin up the org
+            project_config, org_config = self.checkout_and_get_org()
             if self.plan.change_traffic_control:
                 send_start_webhook(
                     self.release,
@@ -365,7 +711,8 @@ class Build(models.Model):
                     build=self, rebuild=self.current_rebuild, flow=flow
                 )
                 build_flow.save()
-                build_flow.run(project_config, org_config, self.root_dir)
+                with self.timed_phase(f"flow:{flow}"):
+                    build_flow.run(project_config, org_config, self.root_dir)
 
                 if build_flow.status != "success":
                     self.logger = init_logger(self)
@@ -449,28 +796,131 @@ class Build(models.Model):
         else:
             set_build_info(build, status="success", time_end=timezone.now())
 
+    def end_wait_phases(self):
+        for phase in WAIT_PHASES:
+            self.end_phase(phase)
+
     def checkout(self):
         # get the ref
-        zip_content = BytesIO()
-        gh = self.repo.get_github_api()
-        gh.archive("zipball", zip_content, ref=self.commit)
+        zip_content = open_zipball(self.repo, self.commit, self.logger)
         build_dir = tempfile.mkdtemp()
         self.logger.info(f"-- Extracting zip to temp dir {build_dir}")
         self.save()
-        zip_file = zipfile.ZipFile(zip_content)
-        zip_file.extractall(build_dir)
+        with zip_content:
+            extract_zipball(zip_content, build_dir, self.logger)
         # assume the zipfile has a single child dir with the repo
         build_dir = os.path.join(build_dir, os.listdir(build_dir)[0])
         self.logger.info(f"-- Commit extracted to build dir: {build_dir}")
         self.save()
+        self.inject_sfdx_config(build_dir)
+        return build_dir
 
+    def inject_sfdx_config(self, build_dir):
         if self.plan.sfdx_config:
             self.logger.info("-- Injecting custom sfdx-workspace.json from plan")
             filename = os.path.join(build_dir, "sfdx-workspace.json")
             with open(filename, "w") as f:
                 f.write(self.plan.sfdx_config)
 
-        return build_dir
+    def checkout_and_get_org(self):
+        """Check out the commit, then initialize the project config and org.
+
+        Creating a scratch org takes minutes but only needs a few files from
+        the repository, so for scratch orgs those files are extracted first
+        and the org is created in a background thread while the rest of the
+        archive is extracted.
+
+        Changes directory to the build dir and returns
+        ``(project_config, org_config)``.
+        """
+        self.root_dir = os.getcwd()
+        Org = apps.get_model("cumulusci.Org")
+        org_name = self.org.name if self.org else self.plan.org
+        org = Org.objects.filter(repo=self.repo, name=org_name).first()
+        if org is None or not org.scratch:
+            with self.timed_phase("checkout"):
+                self.build_dir = self.checkout()
+            os.chdir(self.build_dir)
+            with self.timed_phase("project_config"):
+                project_config = self.get_project_config()
+            with self.timed_phase("org"):
+                org_config = self.get_org(project_config)
+            return project_config, org_config
+
+        self.start_phase("checkout")
+        zip_content = open_zipball(self.repo, self.commit, self.logger)
+        with zip_content:
+            build_dir = tempfile.mkdtemp()
+            self.logger.info(f"-- Extracting zip to temp dir {build_dir}")
+            names = list_zipball(zip_content)
+            # assume the zipfile has a single child dir with the repo
+            root = names[0].split("/")[0]
+            self.build_dir = os.path.join(build_dir, root)
+            setup_files = {
+                f"{root}/{name}"
+                for name in (
+                    "cumulusci.yml",
+                    "sfdx-project.json",
+                    org.json.get("config_file"),
+                )
+                if name
+            }
+            extract_zipball(zip_content, build_dir, self.logger, members=setup_files)
+            self.inject_sfdx_config(self.build_dir)
+            os.chdir(self.build_dir)
+            with self.timed_phase("project_config"):
+                project_config = self.get_project_config()
+
+            self.logger.info("-- Creating org while extracting the commit")
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                org_future = executor.submit(self._timed_get_org_config, project_config)
+                start = time.monotonic()
+                try:
+                    extract_zipball(
+                        zip_content,
+                        build_dir,
+                        self.logger,
+                        members=[name for name in names if name not in setup_files],
+                    )
+                except Exception:
+                    # Don't leave behind an org that will never be used
+                    try:
+                        org_config, _, _ = org_future.result()
+                    except Exception:
+                        pass
+                    else:
+                        self._set_org(org_config)
+                        self.delete_org(org_config)
+                    raise
+                extract_time = time.monotonic() - start
+                self.end_phase("checkout")
+                org_config, org_start, org_end = org_future.result()
+        self.record_phase("org", org_start, org_end)
+        self._set_org(org_config)
+
+        self.logger.info(f"-- Commit extracted to build dir: {self.build_dir}")
+        self.logger.info(
+            "-- Overlapping extraction with org creation saved "
+            f"{min(extract_time, (org_end - org_start).total_seconds()):.1f}s"
+        )
+        self.save()
+        return project_config, org_config
+
+    def _timed_get_org_config(self, project_config):
+        """Look up or create the build's org, in a thread of its own.
+
+        Returns the org config and when it started and ended. The thread
+        only logs to the logger the main thread set up; the main thread
+        records the org and the phase once the thread is done, so the
+        two never write to the build at the same time.
+        """
+        try:
+            start = timezone.now()
+            org_config = self._get_org_config(project_config)
+            return org_config, start, timezone.now()
+        finally:
+            # This runs in its own thread, with its own database connection.
+            db.connection.close()
 
     def get_project_config(self):
         universal_config = MetaCIUniversalConfig()
@@ -481,6 +931,12 @@ class Build(models.Model):
 
     def get_org(self, project_config, retries=3):
         self.logger = init_logger(self)
+        org_config = self._get_org_config(project_config, retries)
+        self._set_org(org_config)
+        return org_config
+
+    def _get_org_config(self, project_config, retries=3):
+        """Look up or create the build's org, without recording it on the build."""
         attempt = 1
         if self.org:
             # If the build's org was already set, keep using it
@@ -505,6 +961,9 @@ class Build(models.Model):
                     continue
                 else:
                     raise e
+        return org_config
+
+    def _set_org(self, org_config):
         self.org = org_config.org
         if self.current_rebuild:
             self.current_rebuild.org_instance = org_config.org_instance
@@ -565,7 +1024,8 @@ class Build(models.Model):
 
         try:
             org_instance = self.get_org_instance()
-            org_instance.delete_org(org_config)
+            with self.timed_phase("delete_org"):
+                org_instance.delete_org(org_config)
         except Exception as e:
             self.logger.error(str(e))
             self.save()
@@ -577,7 +1037,7 @@ class Build(models.Model):
             self.save()
 
 
-class BuildFlow(models.Model):
+class BuildFlow(ChunkedLogMixin, PhaseTimingMixin, models.Model):
     build = models.ForeignKey(
         "build.Build", related_name="flows", on_delete=models.CASCADE
     )
@@ -593,6 +1053,10 @@ class BuildFlow(models.Model):
     )
     flow = models.CharField(max_length=255, null=True, blank=True)
     log = models.TextField(null=True, blank=True)
+    log_html = models.TextField(null=True, blank=True, editable=False)
+    log_html_hash = models.CharField(
+        max_length=64, null=True, blank=True, editable=False
+    )
     exception = models.TextField(null=True, blank=True)
     traceback = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
@@ -602,8 +1066,11 @@ class BuildFlow(models.Model):
     tests_total = models.IntegerField(null=True, blank=True)
     tests_pass = models.IntegerField(null=True, blank=True)
     tests_fail = models.IntegerField(null=True, blank=True)
+    phase_timings = models.JSONField(default=list, blank=True, editable=False)
     asset_hash = models.CharField(max_length=64, unique=True, default=generate_hash)
 
+    log_chunk_field = "build_flow"
+
     def __str__(self):
         return f"{self.build.id}: {self.build.repo} - {self.build.commit} - {self.flow}"
 
@@ -613,10 +1080,6 @@ class BuildFlow(models.Model):
             + f"#flow-{self.flow}"
         )
 
-    def get_log_html(self):
-        if self.log:
-            return format_log(self.log)
-
     def run(self, project_config, org_config, root_dir):
         self.root_dir = root_dir
         # Record the start
@@ -631,13 +1094,15 @@ class BuildFlow(models.Model):
 
         try:
             # Run the flow
-            self.run_flow(project_config, org_config)
+            with self.timed_phase("flow"):
+                self.run_flow(project_config, org_config)
 
             # Determine build commit status
             self.set_commit_status()
 
             # Load test results
-            self.load_test_results()
+            with self.timed_phase("load_test_results"):
+                self.load_test_results()
 
             # Record result
             exception = None
@@ -646,7 +1111,8 @@ class BuildFlow(models.Model):
         except FAIL_EXCEPTIONS as e:
             self.logger.error(traceback.format_exc())
             exception = e
-            self.load_test_results()
+            with self.timed_phase("load_test_results"):
+                self.load_test_results()
             status = "fail"
 
         except Exception as e:
@@ -661,6 +1127,11 @@ class BuildFlow(models.Model):
             kwargs["traceback"] = "".join(traceback.format_tb(exception.__traceback__))
         set_build_info(self, **kwargs)
 
+        # The flow is finished, so fold its log chunks back into a single row
+        for handler in self.logger.handlers:
+            handler.stream.flush(force=True)
+        self.compact_log()
+
     def run_flow(self, project_config, org_config):
         # Add the repo root to syspath to allow for custom tasks and flows in
         # the repo
@@ -673,7 +1144,7 @@ class BuildFlow(models.Model):
 
         from metaci.build.flows import MetaCIFlowCallback
 
-        callbacks = MetaCIFlowCallback(buildflow_id=self.pk)
+        callbacks = MetaCIFlowCallback(buildflow_id=self.pk, build_flow=self)
 
         # Create the flow and handle initialization exceptions
         self.flow_instance = FlowCoordinator(
@@ -812,6 +1283,58 @@ def asset_upload_to(instance, filename):
     return os.path.join(folder, filename)
 
 
+class BuildLogChunk(models.Model):
+    """A piece of build or build flow log output, appended as the build runs."""
+
+    build = models.ForeignKey(
+        "build.Build",
+        related_name="log_chunks",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    build_flow = models.ForeignKey(
+        "build.BuildFlow",
+        related_name="log_chunks",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    sequence = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(
+        default=0, help_text="Position of this chunk's first character in the full log"
+    )
+    line = models.PositiveIntegerField(
+        default=0, help_text="Number of the log line this chunk starts on"
+    )
+    ansi_state = models.CharField(
+        max_length=255,
+        default="",
+        blank=True,
+        help_text="ANSI color codes in effect where this chunk starts",
+    )
+    content = models.TextField()
+    html = models.TextField(null=True, blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["sequence"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["build", "sequence"], name="unique_build_log_chunk"
+            ),
+            models.UniqueConstraint(
+                fields=["build_flow", "sequence"], name="unique_build_flow_log_chunk"
+            ),
+        ]
+
+    def __str__(self):
+        owner = (
+            f"build {self.build_id}" if self.build_id else f"flow {self.build_flow_id}"
+        )
+        return f"{owner}: chunk {self.sequence}"
+
+
 class BuildFlowAsset(models.Model):
     build_flow = models.ForeignKey(
         BuildFlow, related_name="assets", on_delete=models.CASCADE
@@ -0,0 +1,252 @@
+"""Fair sharing of build workers between repositories.
+
+rq runs the jobs in each queue in the order they were enqueued, so a
+repository that queues many builds at once would otherwise make every
+other repository's builds wait behind them. Instead, builds that are
+ready to run are submitted to this scheduler, which only releases as
+many builds to rq as there are workers to run them:
+
+- The queues served by each autoscaler share its max_workers slots.
+  Queues that no autoscaler serves, such as the robot queue in
+  production, get their slots from the METACI_SCHEDULER_QUEUE_SLOTS
+  setting; a queue with no slots there has its builds released at once.
+- When a slot frees up, the build released next is the one whose
+  repository has the fewest builds running for its build_weight, so
+  repositories share the workers in proportion to their weights.
+  Builds in the high queue still go first.
+- A build's priority rises the longer it waits, so no build waits forever.
+- METACI_SCHEDULER_REPO_LIMIT and METACI_SCHEDULER_PLAN_LIMIT cap how many
+  builds of one repository or plan are released at once.
+"""
+import json
+import math
+import time
+import uuid
+from collections import Counter
+
+import django_rq
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+PENDING_KEY = "metaci:scheduler:pending"
+RUNNING_KEY = "metaci:scheduler:running"
+PUMP_LOCK_KEY = "metaci:scheduler:pump-lock"
+DURATION_KEY = "metaci:scheduler:duration:{}"
+# Released builds are forgotten this long after their timeout,
+# in case the worker running them died
+RUNNING_GRACE = 600
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _load(key):
+    return {
+        int(build_id): json.loads(entry)
+        for build_id, entry in _redis().hgetall(key).items()
+    }
+
+
+def get_pools():
+    """Return the worker pool of each queue, as (pool name, slots)."""
+    pools = {}
+    for app_name, config in settings.AUTOSCALERS.items():
+        for queue in config["queues"]:
+            pools.setdefault(queue, (app_name, config["max_workers"]))
+    for queue, slots in settings.METACI_SCHEDULER_QUEUE_SLOTS.items():
+        pools.setdefault(queue, (queue, slots))
+    return pools
+
+
+def submit(build, lock_id=None):
+    """Submit a build that is ready to run.
+
+    Returns the id the build's rq job will have once it is released.
+    """
+    job_id = str(uuid.uuid4())
+    entry = {
+        "build": build.id,
+        "job_id": job_id,
+        "lock_id": lock_id,
+        "queue": build.plan.queue,
+        "timeout": build.plan.build_timeout,
+        "repo": build.repo_id,
+        "plan": build.plan_id,
+        "weight": build.repo.build_weight,
+        "submitted": time.time(),
+    }
+    _redis().hset(PENDING_KEY, build.id, json.dumps(entry))
+    return job_id
+
+
+def get_pending_builds():
+    """Return the ids of the builds waiting to be released."""
+    return {int(build_id) for build_id in _redis().hkeys(PENDING_KEY)}
+
+
+def finish(build_id):
+    """Free a build's slot once it has finished, and release the next builds."""
+    if _redis().hdel(RUNNING_KEY, build_id):
+        pump()
+
+
+def _priority(entry, repo_running, now):
+    share = repo_running[entry["repo"]] / max(entry["weight"], 1)
+    age = (now - entry["submitted"]) / settings.METACI_SCHEDULER_AGING
+    return (entry["queue"] != "high", share - age, entry["submitted"])
+
+
+def plan_releases(pending, running, pools, now, limit_slots=True):
+    """Return the pending builds to release, in the order to release them.
+
+    If limit_slots is False, the order all pending builds would be
+    released in as slots free up is returned.
+    """
+    pool_used = Counter()
+    repo_running = Counter()
+    plan_running = Counter()
+    for entry in running.values():
+        if entry["queue"] in pools:
+            pool_used[pools[entry["queue"]][0]] += 1
+        repo_running[entry["repo"]] += 1
+        plan_running[entry["plan"]] += 1
+    repo_limit = settings.METACI_SCHEDULER_REPO_LIMIT
+    plan_limit = settings.METACI_SCHEDULER_PLAN_LIMIT
+
+    def can_release(entry):
+        if entry["queue"] in pools and limit_slots:
+            name, slots = pools[entry["queue"]]
+            if pool_used[name] >= slots:
+                return False
+        if repo_limit and repo_running[entry["repo"]] >= repo_limit:
+            return False
+        if plan_limit and plan_running[entry["plan"]] >= plan_limit:
+            return False
+        return True
+
+    waiting = list(pending.values())
+    releases = []
+    while True:
+        candidates = [entry for entry in waiting if can_release(entry)]
+        if not candidates:
+            break
+        entry = min(candidates, key=lambda e: _priority(e, repo_running, now))
+        waiting.remove(entry)
+        releases.append(entry)
+        if entry["queue"] in pools:
+            pool_used[pools[entry["queue"]][0]] += 1
+        repo_running[entry["repo"]] += 1
+        plan_running[entry["plan"]] += 1
+    return releases
+
+
+def _prune_running(running):
+    """Forget released builds that have finished without calling finish."""
+    Build = apps.get_model("build", "Build")
+    active = {
+        build.id
+        for build in Build.objects.filter(id__in=running).select_related(
+            "current_rebuild"
+        )
+        if build.get_status() in ("queued", "running")
+    }
+    now = time.time()
+    stale = [
+        build_id
+        for build_id, entry in running.items()
+        if build_id not in active or entry["expires"] < now
+    ]
+    if stale:
+        _redis().hdel(RUNNING_KEY, *stale)
+    for build_id in stale:
+        del running[build_id]
+
+
+def pump():
+    """Release as many pending builds to rq as there are free slots.
+
+    Returns the ids of the builds that were released.
+    """
+    redis = _redis()
+    with redis.lock(PUMP_LOCK_KEY, timeout=60, blocking_timeout=30):
+        pending = _load(PENDING_KEY)
+        if not pending:
+            return []
+        running = _load(RUNNING_KEY)
+        _prune_running(running)
+
+        now = time.time()
+        released = []
+        for entry in plan_releases(pending, running, get_pools(), now):
+            django_rq.get_queue(entry["queue"]).enqueue(
+                "metaci.build.tasks.run_build",
+                entry["build"],
+                entry["lock_id"],
+                job_id=entry["job_id"],
+                job_timeout=entry["timeout"],
+            )
+            entry["expires"] = now + entry["timeout"] + RUNNING_GRACE
+            with redis.pipeline() as pipe:
+                pipe.hdel(PENDING_KEY, entry["build"])
+                pipe.hset(RUNNING_KEY, entry["build"], json.dumps(entry))
+                pipe.execute()
+            released.append(entry["build"])
+        return released
+
+
+def get_average_duration(queues):
+    """Return the average seconds recent builds in some queues ran for."""
+    key = DURATION_KEY.format(",".join(sorted(queues)))
+    duration = cache.get(key)
+    if duration is None:
+        Build = apps.get_model("build", "Build")
+        builds = (
+            Build.objects.filter(
+                plan__queue__in=queues,
+                time_start__isnull=False,
+                time_end__isnull=False,
+            )
+            .order_by("-time_end")
+            .values_list("time_start", "time_end")[:50]
+        )
+        durations = [(end - start).total_seconds() for start, end in builds]
+        duration = sum(durations) / len(durations) if durations else 0
+        cache.set(key, duration, timeout=300)
+    return duration or None
+
+
+def get_queue_position(build):
+    """Return where a build waiting for a worker is in line.
+
+    Returns (position, estimated seconds until it starts), where the
+    position is 1 for the build that will be released next. The estimate
+    is None if it can't be made. Returns None if the build isn't waiting
+    for the scheduler.
+    """
+    pending = _load(PENDING_KEY)
+    entry = pending.get(build.id)
+    if entry is None:
+        return None
+    pools = get_pools()
+    if entry["queue"] not in pools:
+        return 1, None
+    name, slots = pools[entry["queue"]]
+    queues = [queue for queue, pool in pools.items() if pool[0] == name]
+
+    order = plan_releases(
+        pending, _load(RUNNING_KEY), pools, time.time(), limit_slots=False
+    )
+    order = [e["build"] for e in order if e["queue"] in queues]
+    if build.id in order:
+        position = order.index(build.id) + 1
+    else:
+        # Held back by a repository or plan limit
+        position = len(order) + 1
+
+    duration = get_average_duration(queues)
+    if not duration or not slots:
+        return position, None
+    return position, math.ceil(position * duration / slots)
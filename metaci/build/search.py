@@ -0,0 +1,112 @@
+"""Deferred search indexing for builds.
+
+Builds and build flows are saved thousands of times while they run
+(log flushes, status updates), and watson normally rewrites their search
+index rows on every save. Instead, saves only mark an object as pending
+when its status changes, and a background job indexes all pending
+objects in one batch after a short delay.
+"""
+import logging
+from datetime import timedelta
+
+import django_rq
+from django import db
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django_redis import get_redis_connection
+from watson import search as watson
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PENDING_KEY = "metaci:search-index:pending"
+SEARCH_INDEX_SCHEDULED_KEY = "metaci:search-index:scheduled"
+
+
+def defer_index_updates(model):
+    """Replace watson's on-save indexing of a registered model with deferred indexing."""
+    post_save.disconnect(watson.default_search_engine._post_save_receiver, model)
+    post_save.connect(queue_index_update, model)
+
+
+def queue_index_update(sender, instance, created=False, **kwargs):
+    """Mark an object as pending reindexing when it is created or its status changes."""
+    status = instance.status
+    if not created and getattr(instance, "_search_index_status", None) == status:
+        return
+    instance._search_index_status = status
+
+    try:
+        get_redis_connection("default").sadd(
+            SEARCH_INDEX_PENDING_KEY, f"{instance._meta.label}:{instance.pk}"
+        )
+        schedule_index_update()
+    except Exception as e:
+        # Don't lose the update if Redis is unavailable; index inline instead.
+        logger.warning(f"Could not defer search indexing of {instance}: {e}")
+        watson.default_search_engine.update_obj_index(instance)
+
+
+def schedule_index_update():
+    """Index pending objects after a delay, unless that is already scheduled."""
+    # The flag expires in case the scheduled job is lost.
+    delay = settings.METACI_SEARCH_INDEX_DELAY
+    if cache.add(SEARCH_INDEX_SCHEDULED_KEY, True, timeout=delay * 10):
+        django_rq.get_scheduler("short").enqueue_in(
+            timedelta(seconds=delay),
+            update_search_index,
+        )
+
+
+def update_objects_index(objects):
+    """Rebuild the search index entries of several objects.
+
+    Existing entries are updated in place; new entries are created in bulk.
+    Returns the number of objects indexed.
+    """
+    engine = watson.default_search_engine
+    search_entries = []
+    count = 0
+    for obj in objects:
+        search_entries.extend(engine._update_obj_index_iter(obj))
+        count += 1
+    watson._bulk_save_search_entries(search_entries)
+    return count
+
+
+def _group_pending(members):
+    pending = {}
+    for member in members:
+        label, pk = member.decode().rsplit(":", 1)
+        pending.setdefault(label, []).append(pk)
+    return pending
+
+
+@django_rq.job("short")
+def update_search_index():
+    """Index all builds and build flows that were marked as pending."""
+    db.connection.close()
+
+    # Clear the flag first so that saves during this run schedule another run.
+    cache.delete(SEARCH_INDEX_SCHEDULED_KEY)
+
+    redis = get_redis_connection("default")
+    count = 0
+    while True:
+        members = redis.spop(
+            SEARCH_INDEX_PENDING_KEY, settings.METACI_SEARCH_INDEX_BATCH_SIZE
+        )
+        if not members:
+            break
+        try:
+            for label, pks in _group_pending(members).items():
+                model = apps.get_model(label)
+                count += update_objects_index(model.objects.in_bulk(pks).values())
+        except Exception:
+            # Put the batch back, and try again later
+            redis.sadd(SEARCH_INDEX_PENDING_KEY, *members)
+            schedule_index_update()
+            raise
+
+    return f"Updated search index for {count} objects"
@@ -0,0 +1,387 @@
+"""Offline replay of build history against an autoscaler.
+
+A trace is the time each past build was queued and how long it ran,
+exported from Build.time_queue, time_start and time_end. Simulation
+replays a trace against any Autoscaler subclass, running its measure()
+and scale() every tick as the autoscale job does, with rq, the Heroku
+formation API and local rqworker processes replaced by fakes:
+
+- Workers take builds from the high, medium and default queues, in that
+  order, and become available startup_time seconds after they are
+  started.
+- When the Heroku formation shrinks, the highest-numbered dynos stop,
+  and a build they were running is queued again to start over.
+- Local burst workers stop once there is nothing left to run.
+
+The simulation is deterministic, so autoscaler policies and settings can
+be compared on the same trace before they are deployed.
+"""
+import bisect
+import contextlib
+import json
+import math
+import statistics
+import typing as T
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from metaci.build.autoscaling import DURATION_HISTORY, LocalAutoscaler
+
+QUEUE_ORDER = ("high", "medium", "default")
+# Methods of PredictiveAutoscaler that read the database,
+# which the simulation answers from the trace instead
+HISTORY_METHODS = ("now", "get_builds", "get_expected_duration", "get_arrival_rate")
+
+
+class TraceBuild(T.NamedTuple):
+    plan_id: int
+    queue: str
+    queued_at: float
+    duration: float
+
+
+class Report(T.NamedTuple):
+    builds: int
+    unfinished: int
+    interrupted: int
+    wait_p50: float
+    wait_p90: float
+    wait_p99: float
+    wait_max: float
+    worker_minutes: float
+    peak_workers: int
+
+
+def export_trace(builds):
+    """Return the trace of a queryset of finished builds."""
+    builds = builds.filter(
+        time_queue__isnull=False, time_start__isnull=False, time_end__isnull=False
+    ).order_by("time_queue")
+    return [
+        TraceBuild(
+            plan_id=plan_id,
+            queue=queue,
+            queued_at=time_queue.timestamp(),
+            duration=(time_end - time_start).total_seconds(),
+        )
+        for plan_id, queue, time_queue, time_start, time_end in builds.values_list(
+            "plan_id", "plan__queue", "time_queue", "time_start", "time_end"
+        )
+    ]
+
+
+def save_trace(trace, f):
+    json.dump([build._asdict() for build in trace], f)
+
+
+def load_trace(f):
+    return sorted(
+        (TraceBuild(**build) for build in json.load(f)),
+        key=lambda build: build.queued_at,
+    )
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of some values."""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100), 1) - 1]
+
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class _Build(object):
+    def __init__(self, trace_build):
+        self.trace = trace_build
+        self.started_at = None
+        self.finished_at = None
+        self.interrupted = 0
+
+
+class _Worker(object):
+    def __init__(self, booted_at, ready_at, burst=False):
+        self.booted_at = booted_at
+        self.ready_at = ready_at
+        self.burst = burst
+        self.build = None
+        self.stopped_at = None
+
+
+class _Response(object):
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class Simulation(object):
+    """Replay a trace against an autoscaler class with an autoscaler config.
+
+    tick is the seconds between runs of the autoscaler, and startup_time
+    the seconds a worker takes to start. The simulation starts with
+    `workers` workers, as a fixed formation would have. dyno_limit caps
+    the Heroku formation, as an account's dyno limit does. Builds that
+    haven't finished `timeout` seconds after the last one was queued are
+    counted as unfinished, and those that haven't started as waiting
+    until then.
+    """
+
+    def __init__(
+        self,
+        autoscaler_class,
+        config,
+        trace,
+        tick=60,
+        startup_time=120,
+        workers=0,
+        dyno_limit=None,
+        timeout=86400,
+    ):
+        self.autoscaler_class = autoscaler_class
+        self.config = config
+        self.queues = list(config["queues"])
+        self.trace = sorted(
+            (build for build in trace if build.queue in self.queues),
+            key=lambda build: build.queued_at,
+        )
+        self.arrivals = [build.queued_at for build in self.trace]
+        self.tick = tick
+        self.startup_time = startup_time
+        self.initial_workers = workers
+        self.dyno_limit = dyno_limit
+        self.timeout = timeout
+
+    def run(self):
+        """Run the simulation and return a Report."""
+        self.builds = [_Build(build) for build in self.trace]
+        self.queued = defaultdict(deque)
+        self.workers = []
+        self.finished = defaultdict(list)
+        self.peak_workers = 0
+        if not self.builds:
+            return self._report()
+        self.now = self.builds[0].trace.queued_at
+        self.end = self.builds[-1].trace.queued_at + self.timeout
+        self._set_formation(self.initial_workers, ready=True)
+
+        arrivals = deque(self.builds)
+        next_tick = self.now
+        with self._fakes():
+            while self.now <= self.end:
+                self._finish_builds()
+                while arrivals and arrivals[0].trace.queued_at <= self.now:
+                    build = arrivals.popleft()
+                    self.queued[build.trace.queue].append(build)
+                self._start_builds()
+                if self.now >= next_tick:
+                    self._autoscale()
+                    self._start_builds()
+                    next_tick += self.tick
+                if not arrivals and not self._running() and not self._waiting():
+                    break
+                self.now = self._next_event(arrivals, next_tick)
+        for worker in self._alive():
+            worker.stopped_at = self.now
+        return self._report()
+
+    def _next_event(self, arrivals, next_tick):
+        """Return when the next build is queued, starts or ends, a worker
+        becomes available or the autoscaler runs."""
+        times = [next_tick]
+        if arrivals:
+            times.append(arrivals[0].trace.queued_at)
+        for worker in self._alive():
+            if worker.ready_at > self.now:
+                times.append(worker.ready_at)
+            if worker.build:
+                times.append(worker.build.started_at + worker.build.trace.duration)
+        return min(times)
+
+    def _report(self):
+        # Builds that never started are counted as waiting until the end,
+        # so a policy that starves builds doesn't look like it has no waits
+        waits = [
+            (self.now if build.started_at is None else build.started_at)
+            - build.trace.queued_at
+            for build in self.builds
+        ]
+        worker_seconds = sum(
+            worker.stopped_at - worker.booted_at for worker in self.workers
+        )
+        return Report(
+            builds=len(self.builds),
+            unfinished=sum(build.finished_at is None for build in self.builds),
+            interrupted=sum(build.interrupted for build in self.builds),
+            wait_p50=percentile(waits, 50),
+            wait_p90=percentile(waits, 90),
+            wait_p99=percentile(waits, 99),
+            wait_max=max(waits, default=0),
+            worker_minutes=worker_seconds / 60,
+            peak_workers=self.peak_workers,
+        )
+
+    # Simulated workers
+
+    def _alive(self):
+        return [worker for worker in self.workers if worker.stopped_at is None]
+
+    def _ready(self):
+        return [worker for worker in self._alive() if worker.ready_at <= self.now]
+
+    def _running(self, queue=None):
+        return [
+            worker.build
+            for worker in self._alive()
+            if worker.build and queue in (None, worker.build.trace.queue)
+        ]
+
+    def _waiting(self):
+        return sum(len(builds) for builds in self.queued.values())
+
+    def _start_worker(self, burst=False, ready=False):
+        ready_at = self.now if ready else self.now + self.startup_time
+        self.workers.append(_Worker(self.now, ready_at, burst))
+        self.peak_workers = max(self.peak_workers, len(self._alive()))
+
+    def _stop_worker(self, worker):
+        worker.stopped_at = self.now
+        build = worker.build
+        if build:
+            build.started_at = None
+            build.interrupted += 1
+            self.queued[build.trace.queue].appendleft(build)
+            worker.build = None
+
+    def _set_formation(self, quantity, ready=False):
+        alive = self._alive()
+        for worker in alive[quantity:][::-1]:
+            self._stop_worker(worker)
+        for _ in range(quantity - len(alive)):
+            self._start_worker(ready=ready)
+
+    def _finish_builds(self):
+        for worker in self._alive():
+            build = worker.build
+            if build and build.started_at + build.trace.duration <= self.now:
+                build.finished_at = self.now
+                self.finished[build.trace.plan_id].append(build)
+                worker.build = None
+
+    def _start_builds(self):
+        order = [queue for queue in QUEUE_ORDER if queue in self.queues]
+        order += [queue for queue in self.queues if queue not in order]
+        for worker in self._ready():
+            if worker.build:
+                continue
+            for queue in order:
+                if self.queued[queue]:
+                    worker.build = self.queued[queue].popleft()
+                    worker.build.started_at = self.now
+                    break
+            else:
+                if worker.burst:
+                    worker.stopped_at = self.now
+
+    # The autoscaler, and what it sees of rq, Heroku and the database
+
+    def _autoscale(self):
+        autoscaler = self.autoscaler_class(self.config)
+        for name in HISTORY_METHODS:
+            if hasattr(autoscaler, name):
+                setattr(autoscaler, name, getattr(self, f"_{name}"))
+        autoscaler.measure()
+        autoscaler.scale()
+
+    @contextlib.contextmanager
+    def _fakes(self):
+        queues = {name: self._fake_queue(name) for name in self.queues}
+        with mock.patch.multiple(
+            "metaci.build.autoscaling",
+            django_rq=SimpleNamespace(get_queue=queues.__getitem__),
+            requests=SimpleNamespace(
+                get=self._formation_get, patch=self._formation_patch
+            ),
+            subprocess=SimpleNamespace(Popen=self._popen),
+            Worker=SimpleNamespace(count=lambda queue: len(self._ready())),
+            StartedJobRegistry=lambda queue: self._running(queue.name),
+        ), mock.patch.object(LocalAutoscaler, "processes", []):
+            yield
+
+    def _fake_queue(self, name):
+        simulation = self
+
+        class Queue(object):
+            @property
+            def count(self):
+                return len(simulation.queued[name])
+
+        queue = Queue()
+        queue.name = name
+        return queue
+
+    def _formation_get(self, url, **kwargs):
+        return _Response(
+            [
+                {
+                    "type": self.config.get("worker_type"),
+                    "quantity": len(self._alive()),
+                }
+            ]
+        )
+
+    def _formation_patch(self, url, json, **kwargs):
+        quantity = json["quantity"]
+        if self.dyno_limit is not None and quantity > self.dyno_limit:
+            return _Response(
+                {"id": "cannot_update_above_limit", "limit": self.dyno_limit}
+            )
+        self._set_formation(quantity)
+        return _Response({"quantity": quantity})
+
+    def _popen(self, args, **kwargs):
+        self._start_worker(burst="--burst" in args)
+
+    def _now(self):
+        return _datetime(self.now)
+
+    def _get_builds(self):
+        builds = [(build.trace.plan_id, None) for build in self._queued_builds()]
+        builds += [
+            (build.trace.plan_id, _datetime(build.started_at))
+            for build in self._running()
+        ]
+        return builds
+
+    def _queued_builds(self):
+        return [build for queue in self.queues for build in self.queued[queue]]
+
+    def _get_expected_duration(self, plan_id):
+        durations = [
+            build.trace.duration for build in self.finished[plan_id][-DURATION_HISTORY:]
+        ]
+        if not durations:
+            return self.config.get("default_duration", 1800)
+        return statistics.median(durations)
+
+    def _get_arrival_rate(self):
+        hour = 3600
+        week_ago = self.now - 7 * 24 * hour
+
+        def count(start, end):
+            return bisect.bisect_right(self.arrivals, end) - bisect.bisect_right(
+                self.arrivals, start
+            )
+
+        recent = count(self.now - hour, self.now)
+        last_week = count(week_ago, week_ago + hour)
+        return (recent + last_week) / 2 / hour
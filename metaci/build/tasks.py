@@ -1,45 +1,56 @@
 import time
 import traceback
 import typing as T
-from collections import namedtuple
+from contextlib import nullcontext
+from datetime import timedelta
 
 import django_rq
 from cumulusci.core.utils import import_global
-from cumulusci.oauth.salesforce import jwt_session
 from django import db
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
+from django_redis import get_redis_connection
 from rq.exceptions import ShutDownImminentException
 
+from metaci.build import capacity, concurrency, locks, scheduler
 from metaci.build.autoscaling import autoscale
 from metaci.build.exceptions import RequeueJob
+from metaci.build.locks import WAITERS_KEY
 from metaci.build.signals import build_complete
 from metaci.build.utils import set_build_info
-from metaci.cumulusci.models import Org, sf_session
+from metaci.cumulusci.devhubs import ActiveScratchOrgLimits, get_dev_hubs
+from metaci.cumulusci.models import Org
 from metaci.repository.utils import create_status
 
 ACTIVESCRATCHORGLIMITS_KEY = "metaci:activescratchorgs:limits"
-
-ActiveScratchOrgLimits = namedtuple("ActiveScratchOrgLimits", ["remaining", "max"])
+LOCK_CHECK_SCHEDULED_KEY = "metaci:lock-check-scheduled:{}"
+# Resource that builds using scratch orgs wait on when the Dev Hub is full
+SCRATCH_ORG_CAPACITY = "scratch-org-capacity"
 
 
 def reset_database_connection():
     db.connection.close()
 
 
-def scratch_org_limits():
-    cached = cache.get(ACTIVESCRATCHORGLIMITS_KEY, None)
+def scratch_org_limits(dev_hub=None):
+    """Return the scratch org limits of a Dev Hub, or the totals across all hubs."""
+    if dev_hub is None:
+        limits = [scratch_org_limits(hub) for hub in get_dev_hubs()]
+        return ActiveScratchOrgLimits(
+            remaining=sum(hub_limits.remaining for hub_limits in limits),
+            max=sum(hub_limits.max for hub_limits in limits),
+        )
+
+    key = f"{ACTIVESCRATCHORGLIMITS_KEY}:{dev_hub.name}"
+    cached = cache.get(key, None)
     if cached:
         return cached
 
-    sfjwt = jwt_session(
-        settings.SFDX_CLIENT_ID, settings.SFDX_HUB_KEY, settings.SFDX_HUB_USERNAME
-    )
-    limits = sf_session(sfjwt).limits()["ActiveScratchOrgs"]
-    value = ActiveScratchOrgLimits(remaining=limits["Remaining"], max=limits["Max"])
+    value = dev_hub.limits()
     # store it for 65 seconds, enough til the next tick. we may want to tune this
-    cache.set(ACTIVESCRATCHORGLIMITS_KEY, value, 65)
+    cache.set(key, value, 65)
     return value
 
 
@@ -53,8 +64,22 @@ def run_build(build_id, lock_id=None):
         time.sleep(1)
         build = Build.objects.get(id=build_id)
 
+    if build.status == "canceled":
+        # The build was superseded after it was dispatched
+        if lock_id:
+            release_org_lock(lock_id, f"build-{build_id}")
+        release_scratch_org_reservation(build_id)
+        release_concurrency_slots(build)
+        scheduler.finish(build_id)
+        return build.status
+
+    if lock_id:
+        heartbeat = locks.LeaseHeartbeat(lock_id, f"build-{build_id}")
+    else:
+        heartbeat = nullcontext()
     try:
-        build.run()
+        with heartbeat:
+            build.run()
         if settings.GITHUB_STATUS_UPDATES_ENABLED:
             res_status = set_github_status.delay(build_id)
             build.task_id_status_end = res_status.id
@@ -69,21 +94,26 @@ def run_build(build_id, lock_id=None):
         # The Heroku dyno is restarting.
         # Log that, leave the build's status as running,
         # and let the exception fall through to the rq worker to requeue the job.
-        build.log += (
+        build.flush_log(force=True)
+        if lock_id:
+            # Keep the org locked until the requeued job runs
+            locks.renew(lock_id, f"build-{build_id}", build.plan.build_timeout)
+        build.append_log(
             "\nERROR: Build aborted because the Heroku dyno restarted. "
             "MetaCI will try to start a rebuild."
         )
-        build.save()
         raise RequeueJob
     except Exception as e:
         if lock_id:
-            cache.delete(lock_id)
+            release_org_lock(lock_id, f"build-{build_id}")
+            lock_id = None
         if settings.GITHUB_STATUS_UPDATES_ENABLED:
             res_status = set_github_status.delay(build_id)
             build.task_id_status_end = res_status.id
 
-        build.log += "\nERROR: The build raised an exception\n"
-        build.log += str(e)
+        if hasattr(build, "logger"):
+            build.flush_log(force=True)
+        build.append_log(f"\nERROR: The build raised an exception\n{e}")
         build.traceback = "".join(traceback.format_tb(e.__traceback__))
         build.save()
         set_build_info(
@@ -98,12 +128,34 @@ def run_build(build_id, lock_id=None):
         )
 
     if lock_id:
-        cache.delete(lock_id)
+        release_org_lock(lock_id, f"build-{build_id}")
+    # In case the build finished without creating its scratch org
+    release_scratch_org_reservation(build_id)
+    release_concurrency_slots(build)
+    scheduler.finish(build_id)
+
+    # The build is finished, so fold its log chunks back into a single row
+    if hasattr(build, "logger"):
+        build.flush_log(force=True)
+    build.compact_log()
 
     return build.get_status()
 
 
 def dispatch_build(build, lock_id: str = None):
+    """Run a build that has its org, unless that would exceed its plan's concurrency limits.
+
+    Returns None if the build has to wait for a slot under the limits.
+    """
+    # A build that waited for an org, capacity or a concurrency slot is
+    # queued again before it takes its slots, or concurrency.prune and the
+    # scheduler would take it for a finished build and free them
+    if build.get_status() == "waiting":
+        build.set_status("queued")
+    if not acquire_concurrency_slots(build):
+        park_build(build, lock_id)
+        return None
+    build.end_wait_phases()
     queue_name = build.plan.queue
     if queue_name == "long-running":
         return dispatch_one_off_build(build, lock_id)
@@ -119,9 +171,6 @@ def dispatch_one_off_build(build, lock_id: str = None):
 
     try:
         job_id = launch_one_off_build_worker(build, lock_id)
-        build.log = build.log or ""
-        build.log += f"\nRunning build in context (dyno) {job_id}\n"
-        build.save()
     except Exception as e:
         set_build_info(
             build,
@@ -132,23 +181,210 @@ def dispatch_one_off_build(build, lock_id: str = None):
             traceback="".join(traceback.format_tb(e.__traceback__)),
         )
         raise e
+    build.append_log(f"\nRunning build in context (dyno) {job_id}\n")
     return Result(job_id)
 
 
 def dispatch_queued_build(build, lock_id: str = None):
-    queue = django_rq.get_queue(build.plan.queue)
-    result = queue.enqueue(
-        run_build, build.id, lock_id, job_timeout=build.plan.build_timeout
-    )
+    class Result(T.NamedTuple):
+        id: T.Any
+
+    # The scheduler enqueues the build when it is the build's turn
+    job_id = scheduler.submit(build, lock_id)
     build.task_id_check = None
-    build.task_id_run = result.id
+    build.task_id_run = job_id
     build.save()
+    scheduler.pump()
     autoscale()
-    return result
+    return Result(job_id)
+
+
+def acquire_concurrency_slots(build):
+    limits = concurrency.get_limits(build)
+    if concurrency.acquire(build.id, limits):
+        return True
+    # Builds whose worker died never gave their slots back
+    for resource, _ in limits:
+        concurrency.prune(resource)
+    return concurrency.acquire(build.id, limits)
+
+
+def release_concurrency_slots(build):
+    """Give back a finished build's concurrency slots and wake the next waiting builds."""
+    for resource in concurrency.release(build.id, concurrency.get_resources(build)):
+        wake_waiters(resource)
+
+
+def park_build(build, lock_id=None):
+    """Make a build wait for a slot under its plan's concurrency limits.
+
+    The org lock or scratch org capacity the build had is released
+    for other builds to use meanwhile.
+    """
+    build.task_id_check = None
+    build.start_phase("concurrency_wait")
+    build.set_status("waiting")
+    build.replace_log(
+        "Waiting for other builds of the plan to finish (concurrency limit)"
+    )
+    build.save()
+    for resource, _ in concurrency.get_limits(build):
+        locks.add_waiter(resource, build)
+    if lock_id:
+        release_org_lock(lock_id, f"build-{build.id}")
+    release_scratch_org_reservation(build.id)
+    # In case a slot was released before the build started waiting
+    if acquire_concurrency_slots(build):
+        concurrency.release(build.id, concurrency.get_resources(build))
+        _wake_build(build.id)
 
 
 def lock_org(org, build_id, timeout):
-    return cache.add(org.lock_id, f"build-{build_id}", timeout=timeout)
+    return locks.acquire(org.lock_id, f"build-{build_id}", build_id, timeout)
+
+
+def release_org_lock(lock_id, holder=None):
+    """Unlock a persistent org and wake the next build waiting for it."""
+    wake_reserved_build(lock_id, locks.release(lock_id, holder))
+
+
+def reserve_scratch_org(build_id):
+    """Reserve capacity for a build's scratch org on the Dev Hub with the most room.
+
+    Returns the name of the hub, or None if no hub has capacity.
+    """
+    hubs = [hub.name for hub in get_dev_hubs()]
+    headroom = {hub: capacity.get_headroom(hub) for hub in hubs}
+    if None in headroom.values():
+        reconcile_scratch_org_capacity()
+        headroom = {hub: capacity.get_headroom(hub) for hub in hubs}
+    for hub in sorted(hubs, key=lambda hub: headroom[hub] or 0, reverse=True):
+        if capacity.reserve(hub, build_id, settings.SCRATCH_ORG_RESERVE):
+            return hub
+
+
+def release_scratch_org_reservation(build_id):
+    """Release the capacity reserved for a build that didn't create a scratch org."""
+    if capacity.release(build_id, [hub.name for hub in get_dev_hubs()]):
+        wake_waiters(SCRATCH_ORG_CAPACITY)
+
+
+def release_scratch_org_capacity(dev_hub):
+    """Wake the next build waiting for Dev Hub capacity after a scratch org is deleted."""
+    capacity.org_deleted(dev_hub.name)
+    # The cached limits still count the deleted org
+    cache.delete(f"{ACTIVESCRATCHORGLIMITS_KEY}:{dev_hub.name}")
+    wake_waiters(SCRATCH_ORG_CAPACITY)
+
+
+@django_rq.job("short", timeout=60)
+def reconcile_scratch_org_capacity():
+    """Reset the scratch org capacity ledger from the Dev Hubs' limits.
+
+    This also catches capacity freed by orgs expiring,
+    and wakes as many waiting builds as there is room for.
+    The reservations of builds still waiting for a worker are renewed.
+    """
+    admissible = 0
+    errors = []
+    waiting = scheduler.get_pending_builds()
+    for hub in get_dev_hubs():
+        cache.delete(f"{ACTIVESCRATCHORGLIMITS_KEY}:{hub.name}")
+        try:
+            available = capacity.reconcile(
+                hub.name,
+                scratch_org_limits(hub),
+                settings.METACI_SCRATCH_ORG_RESERVATION_TIMEOUT,
+                waiting,
+            )
+        except Exception as e:
+            errors.append(f"{hub.name}: {e}")
+            continue
+        admissible += max(0, available - settings.SCRATCH_ORG_RESERVE + 1)
+
+    woken = wake_waiters(SCRATCH_ORG_CAPACITY, admissible) if admissible else []
+    message = f"Room for {admissible} scratch orgs; woke builds {woken}"
+    if errors:
+        message += ". Could not reconcile " + ", ".join(errors)
+    return message
+
+
+def wake_waiters(resource, count=1):
+    """Check the builds that have waited longest for a resource, now that it may be free.
+
+    Builds that are no longer waiting (because they were canceled, or
+    check_waiting_builds already dispatched them) are skipped.
+    Returns the ids of the builds that were woken.
+    """
+    redis = get_redis_connection("default")
+    key = WAITERS_KEY.format(resource)
+    woken = []
+    while len(woken) < count:
+        popped = redis.zpopmin(key)
+        if not popped:
+            break
+        build_id = int(popped[0][0])
+        if _wake_build(build_id):
+            woken.append(build_id)
+    return woken
+
+
+def wake_reserved_build(lock_id, build_id):
+    """Check the build the lock on an org is reserved for.
+
+    If that build is no longer waiting, the reservation passes to the next waiter.
+    Returns the id of the build that was woken, if any.
+    """
+    while build_id is not None:
+        if _wake_build(build_id):
+            return build_id
+        build_id = locks.pass_reservation(lock_id, build_id)
+
+
+def _wake_build(build_id):
+    from metaci.build.models import Build
+
+    build = Build.objects.filter(id=build_id).first()
+    if build is None or build.get_status() != "waiting":
+        return False
+    res_check = check_queued_build.delay(build_id)
+    Build.objects.filter(id=build_id).update(task_id_check=res_check.id)
+    return True
+
+
+def schedule_org_lock_check(lock_id):
+    """Check the lock on an org again when it expires, in case its holder died.
+
+    Only one check is scheduled for an org at a time.
+    """
+    if locks.get_holder(lock_id):
+        ttl = locks.get_ttl(lock_id)
+        if ttl is None:
+            # Locked manually; waiters are woken when the org is unlocked
+            return
+    else:
+        ttl = locks.get_ttl(locks.RESERVATION_KEY.format(lock_id)) or 0
+    delay = ttl + 1
+    if cache.add(LOCK_CHECK_SCHEDULED_KEY.format(lock_id), True, timeout=delay + 60):
+        django_rq.get_scheduler("short").enqueue_in(
+            timedelta(seconds=delay), check_org_lock, lock_id
+        )
+
+
+@django_rq.job("short", timeout=60)
+def check_org_lock(lock_id):
+    """Wake the next build waiting for an org if its lock expired without being released."""
+    reset_database_connection()
+
+    cache.delete(LOCK_CHECK_SCHEDULED_KEY.format(lock_id))
+    if not locks.get_waiters(lock_id) and not locks.get_reservation(lock_id):
+        return "No builds are waiting for the org"
+
+    build_id = wake_reserved_build(lock_id, locks.reserve_if_free(lock_id))
+    schedule_org_lock_check(lock_id)
+    if build_id:
+        return f"The org lock expired; woke build {build_id}"
+    return f"The org is locked by {locks.get_holder(lock_id)}"
 
 
 @django_rq.job("short", timeout=60)
@@ -163,54 +399,129 @@ def check_queued_build(build_id):
         time.sleep(1)
         build = Build.objects.get(id=build_id)
 
+    if build.status == "canceled":
+        return "Build was canceled"
+
     # Check for concurrency blocking
-    try:
-        org = build.org or Org.objects.get(name=build.plan.org, repo=build.repo)
-    except Org.DoesNotExist:
-        message = f"Could not find org configuration for org {build.plan.org}"
-        build.log = message
+    if build.org and not build.org.pool_name:
+        org_name = build.org.name
+        orgs = [build.org]
+    else:
+        # A rebuild may use any org in the pool its org was leased from
+        org_name = build.org.pool_name if build.org else build.plan.org
+        orgs = list(Org.objects.for_org_name(build.repo, org_name))
+    if not orgs:
+        message = f"Could not find org configuration for org {org_name}"
+        build.replace_log(message)
         build.set_status("error")
         build.save()
         return message
+    org = orgs[0]
 
     if org.scratch:
         # For scratch orgs, we don't need concurrency blocking logic,
         # but we need to check capacity
 
-        if scratch_org_limits().remaining < settings.SCRATCH_ORG_RESERVE:
+        dev_hub = reserve_scratch_org(build_id)
+        if not dev_hub:
             build.task_id_check = None
+            build.start_phase("capacity_wait")
             build.set_status("waiting")
             msg = "DevHub does not have enough capacity to start this build. Requeueing task."
-            build.log = msg
+            build.replace_log(msg)
             build.save()
+            locks.add_waiter(SCRATCH_ORG_CAPACITY, build)
             return msg
         res_run = dispatch_build(build)
+        if res_run is None:
+            return "Build is waiting for a slot under its plan's concurrency limits"
         return (
-            "DevHub has scratch org capacity, running the build "
+            f"DevHub {dev_hub} has scratch org capacity, running the build "
             + f"as task {res_run.id}"
         )
     else:
-        # For persistent orgs, use the cache to lock the org
-        status = lock_org(org, build_id, build.plan.build_timeout)
+        # For persistent orgs, use a lease-based lock on the org,
+        # or on whichever org in the pool is free
+        for org in orgs:
+            if locks.get_holder(org.lock_id) == f"build-{build_id}":
+                # This build was checked twice and already got the lock
+                return "Build already has a lock on the org"
+        for org in orgs:
+            if lock_org(org, build_id, build.plan.build_timeout):
+                break
+        else:
+            org = None
 
-        if status is True:
+        if org is not None:
             # Lock successful, run the build
+            leave_org_queues(orgs, org, build_id)
+            build.org = org
+            build.save()
             res_run = dispatch_build(build, org.lock_id)
-            return f"Got a lock on the org, running as task {res_run.id}"
+            if res_run is None:
+                return "Build is waiting for a slot under its plan's concurrency limits"
+            return f"Got a lock on the org {org.name}, running as task {res_run.id}"
         else:
             # Failed to get lock, queue next check
             build.task_id_check = None
+            build.start_phase("lock_wait")
             build.set_status("waiting")
-            build.log = f"Waiting on build #{cache.get(org.lock_id)} to complete"
+            holders = [locks.get_holder(org.lock_id) for org in orgs]
+            if len(orgs) == 1:
+                build.replace_log(f"Waiting on build #{holders[0]} to complete")
+            else:
+                build.replace_log(
+                    f"Waiting for one of the {len(orgs)} orgs in pool {org_name} to be free"
+                )
             build.save()
+            for org in orgs:
+                locks.add_waiter(org.lock_id, build)
+                # In case the lock was released before this build started waiting
+                wake_reserved_build(org.lock_id, locks.reserve_if_free(org.lock_id))
+                schedule_org_lock_check(org.lock_id)
             return (
                 "Failed to get lock on org. "
-                + f"{cache.get(org.lock_id)} has the org locked. Queueing next check."
+                + f"{', '.join(map(str, holders))} has the org locked. Queueing next check."
             )
 
 
+def leave_org_queues(orgs, leased_org, build_id):
+    """Stop a build waiting for the other orgs in a pool once it has leased one.
+
+    If another org was already reserved for the build, the next waiter gets it.
+    """
+    for org in orgs:
+        if org == leased_org:
+            continue
+        locks.remove_waiter(org.lock_id, build_id)
+        if locks.get_reservation(org.lock_id) == build_id:
+            wake_reserved_build(
+                org.lock_id, locks.pass_reservation(org.lock_id, build_id)
+            )
+
+
+@django_rq.job("short", timeout=60)
+def schedule_builds():
+    """Release builds to the workers if there are free slots.
+
+    Slots are normally filled as builds finish;
+    this catches slots freed by builds whose worker died.
+    """
+    reset_database_connection()
+    released = scheduler.pump()
+    if released:
+        return f"Released builds {released}"
+    return "No builds released"
+
+
 @django_rq.job("short", timeout=60)
 def check_waiting_builds():
+    """Check all waiting builds.
+
+    Waiting builds are normally woken when the resource they wait for is
+    released, so this only catches builds whose wakeup was missed
+    (for example, when Dev Hub capacity is freed by an org expiring).
+    """
     reset_database_connection()
 
     from metaci.build.models import Build
@@ -238,6 +549,62 @@ def set_github_status(build_id):
     create_status(build)
 
 
+@django_rq.job("short")
+def set_github_statuses(build_ids):
+    reset_database_connection()
+
+    from metaci.build.models import Build
+
+    errors = []
+    for build in Build.objects.filter(id__in=build_ids):
+        try:
+            create_status(build)
+        except Exception as e:
+            errors.append(f"{build.id}: {e}")
+
+    if errors:
+        return "Could not set GitHub status for builds " + ", ".join(errors)
+    return f"Set GitHub status for {len(build_ids)} builds"
+
+
+def supersede_builds(build):
+    """Cancel queued or waiting builds of older commits on the same plan and branch.
+
+    Only automatic builds are canceled, and only if they haven't started running.
+    Returns the ids of the canceled builds.
+    """
+    from metaci.build.models import Build
+
+    with transaction.atomic():
+        outdated = list(
+            Build.objects.select_for_update()
+            .filter(
+                planrepo=build.planrepo,
+                branch=build.branch,
+                build_type="auto",
+                status__in=["queued", "waiting"],
+                current_rebuild__isnull=True,
+                time_queue__lt=build.time_queue,
+            )
+            .exclude(commit=build.commit)
+        )
+        build_ids = [outdated_build.id for outdated_build in outdated]
+        Build.objects.filter(id__in=build_ids).update(
+            status="canceled", time_end=timezone.now()
+        )
+
+    # If a build was already dispatched, run_build skips it and releases its lock.
+    for outdated_build in outdated:
+        outdated_build.append_log(
+            f"\nBuild canceled: superseded by build #{build.id} of commit {build.commit}\n"
+        )
+
+    if build_ids and settings.GITHUB_STATUS_UPDATES_ENABLED:
+        set_github_statuses.delay(build_ids)
+
+    return build_ids
+
+
 @django_rq.job("short")
 def delete_scratch_orgs():
     reset_database_connection()
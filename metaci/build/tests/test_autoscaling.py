@@ -1,5 +1,6 @@
 import json
 import os
+from datetime import datetime, timedelta
 from unittest import mock
 
 import pytest
@@ -9,11 +10,16 @@ from metaci.build.autoscaling import (
     Autoscaler,
     HerokuAutoscaler,
     LocalAutoscaler,
+    PredictiveAutoscaler,
+    PredictiveHerokuAutoscaler,
     autoscale,
     get_autoscaler,
+    workers_needed,
 )
 from metaci.exceptions import ConfigError
 
+NOW = datetime(2026, 1, 1)
+
 
 @pytest.fixture
 def non_scaler_config():
@@ -152,6 +158,67 @@ class TestHerokuAutoscaler:
         autoscaler.scale()
 
 
+def test_workers_needed():
+    # Both queued builds can start within 300s on the running builds' workers
+    assert workers_needed([100, 200], [600, 600], 300, 5) == 2
+    # The second queued build would wait 600s for a worker
+    assert workers_needed([], [600, 600], 300, 5) == 2
+    assert workers_needed([], [600, 600, 600, 600], 300, 3) == 3
+    assert workers_needed([900], [600], 300, 5) == 2
+
+
+class TestPredictiveAutoscaler:
+    def autoscaler(self, config, builds, arrival_rate=0):
+        autoscaler = PredictiveAutoscaler(config)
+        autoscaler.now = mock.Mock(return_value=NOW)
+        autoscaler.get_builds = mock.Mock(return_value=builds)
+        autoscaler.get_expected_duration = mock.Mock(return_value=1000)
+        autoscaler.get_arrival_rate = mock.Mock(return_value=arrival_rate)
+        return autoscaler
+
+    @mock.patch("django_rq.get_queue", mock.Mock())
+    def test_measure(self, non_scaler_config):
+        builds = [
+            (1, NOW - timedelta(seconds=900)),
+            (1, None),
+            (1, None),
+        ]
+        autoscaler = self.autoscaler(non_scaler_config, builds)
+
+        autoscaler.measure()
+
+        assert autoscaler.active_builds == 3
+        # One queued build can wait for the running build to finish
+        assert autoscaler.target_workers == 2
+
+    @mock.patch("django_rq.get_queue", mock.Mock())
+    def test_measure__expected_arrivals(self, non_scaler_config):
+        autoscaler = self.autoscaler(non_scaler_config, [], arrival_rate=1 / 60)
+
+        autoscaler.measure()
+
+        assert autoscaler.active_builds == 0
+        assert autoscaler.target_workers == 2
+
+    @mock.patch("django_rq.get_queue", mock.Mock())
+    @responses.activate
+    def test_heroku_scale__keeps_idle_workers(self, scaler_config):
+        responses.add(
+            "PATCH",
+            "https://api.heroku.com/apps/test-app/formation/worker",
+            status=200,
+            json={},
+        )
+        autoscaler = PredictiveHerokuAutoscaler(scaler_config)
+        autoscaler.active_builds = 0
+        autoscaler.target_workers = 1
+        autoscaler.count_workers = mock.Mock(return_value=3)
+
+        autoscaler.scale()
+
+        assert json.loads(responses.calls[0].request.body) == {"quantity": 1}
+
+
 class TestAutoscalerConfig:
     def test_get_autoscaler(self):
         """In test context autoscaler is set to metaci.build.autoscaling.LocalAutoscaler"""
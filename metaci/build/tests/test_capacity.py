@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from django_redis import get_redis_connection
+
+from metaci.build import capacity
+from metaci.cumulusci.devhubs import ActiveScratchOrgLimits
+
+
+@pytest.fixture(autouse=True)
+def redis():
+    redis = get_redis_connection("default")
+    keys = [
+        key.format(hub)
+        for key in (capacity.MAX_KEY, capacity.ACTIVE_KEY, capacity.PENDING_KEY)
+        for hub in ("hub", "other")
+    ]
+    redis.delete(*keys)
+    yield redis
+    redis.delete(*keys)
+
+
+def test_reserve__not_reconciled():
+    assert capacity.reserve("hub", 1, 0) is None
+
+
+def test_reserve():
+    capacity.reconcile("hub", ActiveScratchOrgLimits(remaining=3, max=10), 3600)
+
+    assert capacity.reserve("hub", 1, 2)
+    assert capacity.reserve("hub", 1, 2)
+    assert capacity.reserve("hub", 2, 2)
+    assert not capacity.reserve("hub", 3, 2)
+
+
+def test_org_created_and_deleted(redis):
+    capacity.reconcile("hub", ActiveScratchOrgLimits(remaining=1, max=10), 3600)
+    assert capacity.reserve("hub", 1, 1)
+
+    capacity.org_created("hub", 1)
+    assert int(redis.get(capacity.ACTIVE_KEY.format("hub"))) == 10
+    assert capacity.release(1, ["other", "hub"]) is None
+    assert not capacity.reserve("hub", 2, 1)
+
+    capacity.org_deleted("hub")
+    assert capacity.reserve("hub", 2, 1)
+
+
+def test_release():
+    capacity.reconcile("hub", ActiveScratchOrgLimits(remaining=1, max=10), 3600)
+    assert capacity.reserve("hub", 1, 1)
+    assert not capacity.reserve("hub", 2, 1)
+
+    assert capacity.release(1, ["other", "hub"]) == "hub"
+    assert capacity.reserve("hub", 2, 1)
+
+
+def test_reconcile__drops_stale_reservations(redis):
+    redis.hset(capacity.PENDING_KEY.format("hub"), 1, time.time() - 7200)
+    redis.hset(capacity.PENDING_KEY.format("hub"), 2, time.time())
+
+    available = capacity.reconcile(
+        "hub", ActiveScratchOrgLimits(remaining=5, max=10), 3600
+    )
+
+    assert available == 4
+    assert redis.hkeys(capacity.PENDING_KEY.format("hub")) == [b"2"]
+
+
+def test_reconcile__renews_waiting_reservations(redis):
+    redis.hset(capacity.PENDING_KEY.format("hub"), 1, time.time() - 7200)
+    redis.hset(capacity.PENDING_KEY.format("hub"), 2, time.time() - 7200)
+
+    available = capacity.reconcile(
+        "hub", ActiveScratchOrgLimits(remaining=5, max=10), 3600, waiting={1}
+    )
+
+    assert available == 4
+    reserved = redis.hget(capacity.PENDING_KEY.format("hub"), 1)
+    assert time.time() - float(reserved) < 60
+    assert not redis.hexists(capacity.PENDING_KEY.format("hub"), 2)
+
+
+def test_get_headroom_and_reserved_hub():
+    assert capacity.get_headroom("hub") is None
+
+    capacity.reconcile("hub", ActiveScratchOrgLimits(remaining=3, max=10), 3600)
+    capacity.reserve("hub", 1, 0)
+
+    assert capacity.get_headroom("hub") == 2
+    assert capacity.get_reserved_hub(1, ["other", "hub"]) == "hub"
+    assert capacity.get_reserved_hub(2, ["other", "hub"]) is None
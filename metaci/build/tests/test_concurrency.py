@@ -0,0 +1,87 @@
+from unittest import mock
+
+import pytest
+from django_redis import get_redis_connection
+
+from metaci.build import concurrency, locks
+from metaci.build.tasks import dispatch_build, release_concurrency_slots
+from metaci.conftest import BuildFactory
+
+PLAN = "concurrency:plan-test"
+BRANCH = "concurrency:planrepo-test:branch-test"
+
+
+@pytest.fixture(autouse=True)
+def redis():
+    redis = get_redis_connection("default")
+    yield redis
+    for pattern in ("metaci:concurrency:*", "metaci:waiters:concurrency:*"):
+        for key in redis.scan_iter(pattern):
+            redis.delete(key)
+
+
+def test_acquire():
+    assert concurrency.acquire(1, [(PLAN, 2), (BRANCH, 1)])
+    assert not concurrency.acquire(2, [(PLAN, 2), (BRANCH, 1)])
+    # A build that can't get every slot gets none of them
+    assert concurrency.get_holders(PLAN) == [1]
+
+    assert concurrency.acquire(2, [(PLAN, 2)])
+    assert concurrency.acquire(2, [(PLAN, 2)])
+    assert not concurrency.acquire(3, [(PLAN, 2)])
+    assert concurrency.acquire(3, [])
+
+
+def test_release():
+    concurrency.acquire(1, [(PLAN, 1)])
+
+    assert concurrency.release(1, [PLAN, BRANCH]) == [PLAN]
+    assert concurrency.get_holders(PLAN) == []
+
+
+@pytest.mark.django_db
+def test_prune():
+    finished = BuildFactory(status="success")
+    running = BuildFactory(status="running")
+    concurrency.acquire(finished.id, [(PLAN, 5)])
+    concurrency.acquire(running.id, [(PLAN, 5)])
+
+    assert concurrency.prune(PLAN) == [finished.id]
+    assert concurrency.get_holders(PLAN) == [running.id]
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.dispatch_queued_build")
+@mock.patch("metaci.build.tasks.release_scratch_org_reservation")
+@mock.patch("metaci.build.tasks.release_org_lock")
+def test_dispatch_build__over_limit(release_org_lock, release_reservation, dispatch):
+    running = BuildFactory(status="running", planrepo__plan__concurrency_limit=1)
+    build = BuildFactory(status="queued", planrepo=running.planrepo)
+    assert dispatch_build(running)
+
+    assert dispatch_build(build, "lock") is None
+
+    build.refresh_from_db()
+    assert build.status == "waiting"
+    release_org_lock.assert_called_once_with("lock", f"build-{build.id}")
+    resource = f"concurrency:plan-{build.plan_id}"
+    assert locks.get_waiters(resource) == [build.id]
+
+    with mock.patch("metaci.build.tasks.check_queued_build.delay") as check:
+        release_concurrency_slots(running)
+    check.assert_called_once_with(build.id)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.dispatch_queued_build")
+def test_dispatch_build__woken_build_keeps_slot(dispatch):
+    woken = BuildFactory(status="waiting", planrepo__plan__concurrency_limit=1)
+    build = BuildFactory(status="queued", planrepo=woken.planrepo)
+    assert dispatch_build(woken)
+
+    # The woken build is still waiting for a worker, not finished
+    with mock.patch("metaci.build.tasks.park_build") as park_build:
+        assert dispatch_build(build) is None
+    park_build.assert_called_once_with(build, None)
+    resource = f"concurrency:plan-{build.plan_id}"
+    assert concurrency.get_holders(resource) == [woken.id]
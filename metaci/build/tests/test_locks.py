@@ -0,0 +1,115 @@
+import pickle
+import time
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from metaci.build import locks
+
+LOCK_ID = "metaci-org-lock-test"
+
+
+@pytest.fixture(autouse=True)
+def redis():
+    redis = get_redis_connection("default")
+    keys = [LOCK_ID, locks.RESERVATION_KEY.format(LOCK_ID)]
+    keys.append(locks.WAITERS_KEY.format(LOCK_ID))
+    keys.append(cache.make_key(LOCK_ID))
+    redis.delete(*keys)
+    yield redis
+    redis.delete(*keys)
+
+
+def waiter(build_id, queued):
+    return mock.Mock(
+        id=build_id, **{"get_time_queue.return_value.timestamp.return_value": queued}
+    )
+
+
+def test_acquire_and_release():
+    assert locks.acquire(LOCK_ID, "build-1", 1, timeout=100)
+    assert not locks.acquire(LOCK_ID, "build-2", 2, timeout=100)
+    assert locks.get_holder(LOCK_ID) == "build-1"
+    assert 0 < locks.get_ttl(LOCK_ID) <= 100
+
+    locks.release(LOCK_ID, "build-2")
+    assert locks.get_holder(LOCK_ID) == "build-1"
+
+    locks.release(LOCK_ID, "build-1")
+    assert locks.get_holder(LOCK_ID) is None
+
+
+def test_acquire__manual_lock_does_not_expire():
+    assert locks.acquire(LOCK_ID, "manually locked")
+    assert locks.get_ttl(LOCK_ID) is None
+
+
+def test_renew():
+    locks.acquire(LOCK_ID, "build-1", 1, timeout=1000)
+
+    assert locks.renew(LOCK_ID, "build-1", 10)
+    assert locks.get_ttl(LOCK_ID) <= 10
+    assert not locks.renew(LOCK_ID, "build-2", 10)
+
+
+def test_legacy_lock(redis):
+    # As set through the Django cache before locks used their own keys
+    redis.set(cache.make_key(LOCK_ID), pickle.dumps("build-1"), ex=100)
+    locks.add_waiter(LOCK_ID, waiter(2, 200))
+
+    assert not locks.acquire(LOCK_ID, "build-2", 2, timeout=100)
+    assert locks.reserve_if_free(LOCK_ID) is None
+    assert locks.get_holder(LOCK_ID) == "build-1"
+    assert 0 < locks.get_ttl(LOCK_ID) <= 100
+
+    assert locks.release(LOCK_ID, "build-1") == 2
+    assert locks.acquire(LOCK_ID, "build-2", 2, timeout=100)
+
+
+def test_legacy_lock__renew(redis):
+    redis.set(cache.make_key(LOCK_ID), pickle.dumps("build-1"), ex=100)
+
+    assert not locks.renew(LOCK_ID, "build-2", 10)
+    assert locks.renew(LOCK_ID, "build-1", 10)
+    assert not redis.exists(cache.make_key(LOCK_ID))
+    assert locks.get_holder(LOCK_ID) == "build-1"
+    assert locks.get_ttl(LOCK_ID) <= 10
+
+
+def test_release__reserves_for_waiters_in_order():
+    locks.acquire(LOCK_ID, "build-1", 1, timeout=100)
+    locks.add_waiter(LOCK_ID, waiter(3, 300))
+    locks.add_waiter(LOCK_ID, waiter(2, 200))
+
+    assert locks.release(LOCK_ID, "build-1") == 2
+    assert not locks.acquire(LOCK_ID, "build-4", 4, timeout=100)
+    assert not locks.acquire(LOCK_ID, "build-3", 3, timeout=100)
+
+    assert locks.pass_reservation(LOCK_ID, 2) == 3
+    assert locks.acquire(LOCK_ID, "build-3", 3, timeout=100)
+    assert locks.get_reservation(LOCK_ID) is None
+    assert locks.get_waiters(LOCK_ID) == []
+
+
+def test_reserve_if_free(redis):
+    locks.add_waiter(LOCK_ID, waiter(2, 200))
+    locks.acquire(LOCK_ID, "build-1", 1, timeout=100)
+    assert locks.reserve_if_free(LOCK_ID) is None
+
+    redis.delete(LOCK_ID)
+    assert locks.reserve_if_free(LOCK_ID) == 2
+    assert locks.reserve_if_free(LOCK_ID) is None
+
+
+def test_lease_heartbeat():
+    locks.acquire(LOCK_ID, "build-1", 1, timeout=1000)
+
+    with locks.LeaseHeartbeat(LOCK_ID, "build-1", lease=2):
+        assert locks.get_ttl(LOCK_ID) <= 2
+        time.sleep(2.5)
+        assert locks.get_holder(LOCK_ID) == "build-1"
+
+    time.sleep(2.5)
+    assert locks.get_holder(LOCK_ID) is None
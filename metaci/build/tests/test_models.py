@@ -1,5 +1,6 @@
 import datetime
 import os
+import re
 from pathlib import Path
 from unittest import mock
 
@@ -7,6 +8,7 @@ import pytest
 from cumulusci.core.config import OrgConfig
 
 from metaci.build.models import Build
+from metaci.build.utils import format_log, format_log_fragment, hash_log
 from metaci.conftest import (
     BranchFactory,
     BuildFactory,
@@ -17,6 +19,7 @@ from metaci.conftest import (
     RepositoryFactory,
     ScratchOrgInstanceFactory,
 )
+from metaci.cumulusci.logger import init_logger
 from metaci.release.models import ChangeCaseTemplate, Release
 
 
@@ -58,6 +61,7 @@ class TestBuild:
         def archive(format, zip_content, ref):
             with open(Path(__file__).parent / "testproject.zip", "rb") as f:
                 zip_content.write(f.read())
+            return True
 
         mock_api = mock.Mock()
         mock_api.archive.side_effect = archive
@@ -75,9 +79,105 @@ class TestBuild:
         finally:
             detach_logger(build)
 
-        assert build.status == "success", build.log
-        assert "Build flow test completed successfully" in build.log
-        assert "running test flow" in build.flows.get().log
+        assert build.status == "success", build.get_log()
+        assert "Build flow test completed successfully" in build.get_log()
+        assert "running test flow" in build.flows.get().get_log()
+        phases = [record["phase"] for record in build.phase_timings]
+        assert phases == ["queue", "checkout", "project_config", "org", "flow:test"]
+        assert [record["phase"] for record in build.flows.get().phase_timings] == [
+            "flow",
+            "load_test_results",
+        ]
+
+    @mock.patch("metaci.repository.models.Repository.get_github_api")
+    @mock.patch("metaci.build.models.init_logger")
+    @mock.patch("metaci.build.models.Build._get_org_config")
+    def test_checkout_and_get_org__scratch(
+        self, get_org_config, build_init_logger, get_gh_api
+    ):
+        def archive(format, zip_content, ref):
+            with open(Path(__file__).parent / "testproject.zip", "rb") as f:
+                zip_content.write(f.read())
+            return True
+
+        get_gh_api.return_value.archive.side_effect = archive
+        build = BuildFactory()
+        build.org.scratch = True
+        build.org.save()
+        build.logger = init_logger(build)
+        org_config = mock.Mock(org=build.org, org_instance=None)
+        get_org_config.return_value = org_config
+
+        try:
+            project_config, result = build.checkout_and_get_org()
+        finally:
+            os.chdir(build.root_dir)
+            build.delete_build_dir()
+            build.flush_log(force=True)
+            detach_logger(build)
+
+        assert result is org_config
+        assert project_config.repo_root == build.build_dir
+        get_org_config.assert_called_once_with(project_config)
+        # The org is created in another thread, which leaves the logger alone
+        build_init_logger.assert_not_called()
+        assert "Overlapping extraction with org creation saved" in build.get_log()
+        phases = [record["phase"] for record in build.phase_timings]
+        assert phases == ["checkout", "project_config", "org"]
+        assert Build.objects.get(id=build.id).phase_timings == build.phase_timings
+
+    @mock.patch("metaci.repository.models.Repository.get_github_api")
+    @mock.patch("metaci.build.models.extract_zipball")
+    @mock.patch("metaci.build.models.Build.delete_org")
+    @mock.patch("metaci.build.models.Build._get_org_config")
+    def test_checkout_and_get_org__extract_failed(
+        self, get_org_config, delete_org, extract_zipball, get_gh_api
+    ):
+        def archive(format, zip_content, ref):
+            with open(Path(__file__).parent / "testproject.zip", "rb") as f:
+                zip_content.write(f.read())
+            return True
+
+        get_gh_api.return_value.archive.side_effect = archive
+        extract_zipball.side_effect = [None, OSError("disk full")]
+        build = BuildFactory()
+        build.org.scratch = True
+        build.org.save()
+        build.logger = init_logger(build)
+        build.get_project_config = mock.Mock()
+        get_org_config.return_value = mock.Mock(org=build.org, org_instance=None)
+
+        try:
+            with pytest.raises(OSError):
+                build.checkout_and_get_org()
+        finally:
+            os.chdir(build.root_dir)
+            detach_logger(build)
+
+        delete_org.assert_called_once_with(get_org_config.return_value)
+
+    def test_timed_phase(self):
+        build = BuildFactory()
+        with build.timed_phase("checkout"):
+            with build.timed_phase("checkout"):
+                pass
+
+        build.start_phase("lock_wait")
+        build.end_phase("org")
+
+        build = Build.objects.get(id=build.id)
+        checkout, lock_wait = build.phase_timings
+        assert checkout["phase"] == "checkout"
+        assert checkout["duration"] >= 0
+        assert lock_wait["end"] is None
+
+    def test_timed_phase__error(self):
+        build = BuildFactory()
+        with pytest.raises(ValueError):
+            with build.timed_phase("org"):
+                raise ValueError
+
+        assert build.phase_timings[0]["duration"] is not None
 
     def test_delete_org(self):
         build = BuildFactory()
@@ -145,6 +245,140 @@ class TestBuild:
         truncated_commit = build.get_commit()
         assert f"{commit_sha[:8]}" == truncated_commit
 
+    def test_append_log(self):
+        build = BuildFactory(log="legacy\n")
+        build.append_log("one\n")
+        build.append_log("two\n")
+
+        assert build.log_chunks.count() == 2
+        assert list(build.log_chunks.values_list("sequence", flat=True)) == [1, 2]
+        assert Build.objects.get(id=build.id).get_log() == "legacy\none\ntwo\n"
+
+    def test_append_log__other_writer(self):
+        build = BuildFactory(log="")
+        other = Build.objects.get(id=build.id)
+        build.append_log("one\n")
+        other.append_log("two\n")
+        build.append_log("three\n")
+
+        chunks = build.log_chunks.order_by("sequence")
+        assert list(chunks.values_list("sequence", "offset", "line")) == [
+            (1, 0, 0),
+            (2, 4, 1),
+            (3, 8, 2),
+        ]
+        assert build.get_log() == "one\ntwo\nthree\n"
+
+    def test_append_log__position_from_last_chunk(self):
+        build = BuildFactory(log="\x1b[31mhead\n")
+        build.append_log("tail")
+        build = Build.objects.get(id=build.id)
+        with mock.patch.object(Build, "get_log") as get_log:
+            build.append_log(" more\n")
+        get_log.assert_not_called()
+
+        chunk = build.log_chunks.get(sequence=2)
+        assert (chunk.offset, chunk.line, chunk.ansi_state) == (14, 1, "31")
+        assert chunk.html == format_log_fragment(" more\n", "31", 1, True)
+
+    def test_append_log__empty(self):
+        build = BuildFactory()
+        build.append_log("")
+        assert not build.log_chunks.exists()
+
+    def test_compact_log(self):
+        build = BuildFactory(log="legacy\n")
+        build.append_log("one\n")
+        build.compact_log()
+        build.append_log("two\n")
+
+        build = Build.objects.get(id=build.id)
+        assert build.log == "legacy\none\n"
+        assert build.log_chunks.get().sequence == 1
+        assert build.get_log() == "legacy\none\ntwo\n"
+
+    def test_replace_log(self):
+        build = BuildFactory(log="head\n")
+        build.append_log("tail\n")
+        build.replace_log("Waiting")
+        assert build.get_log_html() == format_log("Waiting")
+        build.append_log("\nrunning\n")
+
+        build = Build.objects.get(id=build.id)
+        assert build.get_log() == "Waiting\nrunning\n"
+        assert build.read_log(7) == ("\nrunning\n", 16)
+
+    def test_read_log(self):
+        build = BuildFactory(log="0123")
+        build.append_log("456")
+        build.append_log("789")
+
+        assert build.read_log(0) == ("0123456789", 10)
+        assert build.read_log(2) == ("23456789", 10)
+        assert build.read_log(5) == ("56789", 10)
+        assert build.read_log(10) == ("", 10)
+
+        build.compact_log()
+        assert build.read_log(5) == ("56789", 10)
+        assert build.read_log(20)[1] == 10
+
+    def test_append_log__renders_html(self):
+        build = BuildFactory(log="\x1b[31mhead\n")
+        build.append_log("tail\n")
+
+        chunk = build.log_chunks.get()
+        assert chunk.html == format_log_fragment("tail\n", "31", 1)
+
+    def test_get_log_html__no_writes(self):
+        build = BuildFactory(log="head\n")
+        build.append_log("tail\n")
+        build = Build.objects.get(id=build.id)
+        with mock.patch(
+            "metaci.build.models.format_log_fragment", wraps=format_log_fragment
+        ) as fragment:
+            html = build.get_log_html()
+            assert fragment.call_count == 1
+            assert "tail" in html
+
+        build = Build.objects.get(id=build.id)
+        assert build.log_html is None
+        assert build.get_log_html() == html
+
+    def test_get_log_html__line_ids(self):
+        build = BuildFactory(log="one\ntw")
+        build.append_log("o\nthree\n")
+        build.append_log("four")
+        html = build.get_log_html()
+
+        ids = re.findall(r'id="(line-\d+)"', html)
+        assert ids == ["line-0", "line-1", "line-2", "line-3"]
+        build.compact_log()
+        assert build.get_log_html() == html
+
+    def test_get_log_html__log_changed(self):
+        build = BuildFactory(log="old")
+        build.append_log("\n")
+        build.compact_log()
+        build.log = "new"
+        build.save()
+        assert "new" in Build.objects.get(id=build.id).get_log_html()
+
+    def test_compact_log__renders_html(self):
+        build = BuildFactory(log="head\n")
+        build.append_log("tail\n")
+        build.compact_log()
+
+        build = Build.objects.get(id=build.id)
+        assert build.log_html_hash == hash_log("head\ntail\n")
+        with mock.patch("metaci.build.models.format_log_fragment") as fragment:
+            assert "tail" in build.get_log_html()
+            fragment.assert_not_called()
+
+    def test_get_log_tail(self):
+        build = BuildFactory(log="")
+        build.append_log("\n".join(str(i) for i in range(50)))
+        assert build.get_log_tail(3) == "47\n48\n49"
+
 
 @pytest.mark.django_db
 class TestBuildFlow:
@@ -2,11 +2,27 @@
 import json
 from unittest import mock
 
+import pytest
 import responses
 from django.test import TestCase
+from django_redis import get_redis_connection
 
-from metaci.build.tasks import check_queued_build
+from metaci.build import locks
+from metaci.build.models import Build
+from metaci.build.tasks import (
+    SCRATCH_ORG_CAPACITY,
+    WAITERS_KEY,
+    ActiveScratchOrgLimits,
+    check_queued_build,
+    lock_org,
+    reconcile_scratch_org_capacity,
+    release_org_lock,
+    run_build,
+    supersede_builds,
+    wake_waiters,
+)
 from metaci.conftest import (
+    BranchFactory,
     BuildFactory,
     OrgFactory,
     PlanFactory,
@@ -118,3 +134,230 @@ class TestLongRunningBuild(TestCase):
         check_queued_build(build.id)
 
         assert fake_lock_org.was_called
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.reset_database_connection", lambda: ...)
+class TestSupersedeBuilds:
+    def make_build(self, planrepo, branch, **kwargs):
+        kwargs.setdefault("build_type", "auto")
+        return BuildFactory(
+            planrepo=planrepo,
+            plan=planrepo.plan,
+            repo=planrepo.repo,
+            branch=branch,
+            **kwargs,
+        )
+
+    @mock.patch("metaci.build.tasks.set_github_statuses")
+    def test_supersede_builds(self, set_github_statuses, settings):
+        settings.GITHUB_STATUS_UPDATES_ENABLED = True
+        planrepo = PlanRepositoryFactory()
+        branch = BranchFactory(repo=planrepo.repo)
+        queued = self.make_build(planrepo, branch, status="queued", commit="a")
+        waiting = self.make_build(planrepo, branch, status="waiting", commit="b")
+        running = self.make_build(planrepo, branch, status="running", commit="b")
+        manual = self.make_build(
+            planrepo, branch, status="queued", commit="b", build_type="manual"
+        )
+        other_branch = self.make_build(
+            planrepo, BranchFactory(repo=planrepo.repo), status="queued", commit="b"
+        )
+        planrepo.plan.supersede_outdated_builds = True
+        planrepo.plan.save()
+
+        newest = self.make_build(planrepo, branch, status="queued", commit="c")
+
+        canceled = Build.objects.filter(status="canceled")
+        assert set(canceled.values_list("id", flat=True)) == {queued.id, waiting.id}
+        assert "superseded by build" in Build.objects.get(id=queued.id).get_log()
+        set_github_statuses.delay.assert_called_once()
+        for build in (running, manual, other_branch, newest):
+            build.refresh_from_db()
+            assert build.status != "canceled"
+
+    def test_supersede_builds__same_commit(self):
+        planrepo = PlanRepositoryFactory()
+        branch = BranchFactory(repo=planrepo.repo)
+        queued = self.make_build(planrepo, branch, status="queued", commit="a")
+        newest = self.make_build(planrepo, branch, status="queued", commit="a")
+
+        assert supersede_builds(newest) == []
+        queued.refresh_from_db()
+        assert queued.status == "queued"
+
+    @mock.patch("metaci.build.models.Build.run")
+    @mock.patch("metaci.build.tasks.release_org_lock")
+    def test_run_build__canceled(self, release_org_lock, run):
+        build = BuildFactory(status="canceled")
+
+        assert run_build(build.id, "lock") == "canceled"
+        run.assert_not_called()
+        release_org_lock.assert_called_once_with("lock", f"build-{build.id}")
+
+    @mock.patch("metaci.build.tasks.dispatch_build")
+    def test_check_queued_build__canceled(self, dispatch_build):
+        build = BuildFactory(status="canceled")
+
+        assert check_queued_build(build.id) == "Build was canceled"
+        dispatch_build.assert_not_called()
+
+
+@pytest.fixture
+def redis():
+    redis = get_redis_connection("default")
+    yield redis
+    patterns = (
+        "metaci:waiters:*",
+        "metaci:lock-*",
+        "metaci-org-lock-*",
+        "metaci:scratch-capacity:*",
+    )
+    for pattern in patterns:
+        for key in redis.scan_iter(pattern):
+            redis.delete(key)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.reset_database_connection", lambda: ...)
+@mock.patch("metaci.build.tasks.schedule_org_lock_check", mock.Mock())
+class TestWaiters:
+    @pytest.fixture(autouse=True)
+    def check_delay(self):
+        with mock.patch("metaci.build.tasks.check_queued_build.delay") as delay:
+            yield delay
+
+    def test_check_queued_build__registers_lock_waiter(self, redis):
+        org = OrgFactory(scratch=False)
+        build = BuildFactory(org=org, status="queued")
+        locks.acquire(org.lock_id, "build-0")
+
+        check_queued_build(build.id)
+
+        assert org.lock_waiters == [build.id]
+        build.refresh_from_db()
+        assert build.status == "waiting"
+
+    @mock.patch("metaci.build.tasks.scratch_org_limits")
+    def test_check_queued_build__registers_capacity_waiter(
+        self, scratch_org_limits, redis, settings
+    ):
+        settings.SCRATCH_ORG_RESERVE = 10
+        scratch_org_limits.return_value = ActiveScratchOrgLimits(remaining=5, max=100)
+        build = BuildFactory(org=OrgFactory(scratch=True), status="queued")
+
+        check_queued_build(build.id)
+
+        build.refresh_from_db()
+        assert build.status == "waiting"
+        assert locks.get_waiters(SCRATCH_ORG_CAPACITY) == [build.id]
+
+    def test_wake_waiters(self, redis, check_delay):
+        finished = BuildFactory(status="success")
+        first = BuildFactory(status="waiting")
+        second = BuildFactory(status="waiting")
+        redis.zadd(
+            WAITERS_KEY.format("capacity"), {finished.id: 1, first.id: 2, second.id: 3}
+        )
+
+        assert wake_waiters("capacity") == [first.id]
+
+        check_delay.assert_called_once_with(first.id)
+        assert locks.get_waiters("capacity") == [second.id]
+
+    def test_release_org_lock(self, redis, check_delay):
+        finished = BuildFactory(status="success")
+        waiting = BuildFactory(status="waiting")
+        redis.zadd(
+            WAITERS_KEY.format("metaci-org-lock-0"), {finished.id: 1, waiting.id: 2}
+        )
+        locks.acquire("metaci-org-lock-0", "build-0")
+
+        release_org_lock("metaci-org-lock-0", "build-0")
+
+        assert locks.get_holder("metaci-org-lock-0") is None
+        assert locks.get_reservation("metaci-org-lock-0") == waiting.id
+        check_delay.assert_called_once_with(waiting.id)
+
+    def test_lock_org__reserved(self, redis):
+        org = OrgFactory(scratch=False)
+        first = BuildFactory(org=org, status="waiting")
+        second = BuildFactory(org=org, status="queued")
+        locks.add_waiter(org.lock_id, first)
+        locks.reserve_if_free(org.lock_id)
+
+        assert not lock_org(org, second.id, 100)
+        assert lock_org(org, first.id, 100)
+        assert org.lock_holder == f"build-{first.id}"
+        assert org.lock_waiters == []
+
+    @mock.patch("metaci.build.tasks.dispatch_build")
+    def test_check_queued_build__leases_free_pool_org(self, dispatch_build, redis):
+        build = BuildFactory(status="queued", org=None, planrepo__plan__org="pool")
+        busy = OrgFactory(name="a", repo=build.repo, pool_name="pool")
+        free = OrgFactory(name="b", repo=build.repo, pool_name="pool")
+        locks.acquire(busy.lock_id, "build-0")
+
+        check_queued_build(build.id)
+
+        build.refresh_from_db()
+        assert build.org == free
+        assert free.lock_holder == f"build-{build.id}"
+        dispatch_build.assert_called_once_with(build, free.lock_id)
+
+    @mock.patch("metaci.build.tasks.dispatch_build")
+    def test_check_queued_build__waits_for_pool(self, dispatch_build, redis):
+        build = BuildFactory(status="queued", org=None, planrepo__plan__org="pool")
+        orgs = [
+            OrgFactory(name=name, repo=build.repo, pool_name="pool")
+            for name in ("a", "b")
+        ]
+        for org in orgs:
+            locks.acquire(org.lock_id, "build-0")
+
+        check_queued_build(build.id)
+
+        build.refresh_from_db()
+        assert build.status == "waiting"
+        assert [org.lock_waiters for org in orgs] == [[build.id], [build.id]]
+
+        # Once the build leases one org, it stops waiting for the other
+        build.set_status("waiting")
+        build.save()
+        release_org_lock(orgs[1].lock_id, "build-0")
+        check_queued_build(build.id)
+
+        dispatch_build.assert_called_once_with(build, orgs[1].lock_id)
+        assert orgs[0].lock_waiters == []
+
+    @mock.patch("metaci.build.tasks.scratch_org_limits")
+    def test_check_queued_build__reserves_capacity(
+        self, scratch_org_limits, redis, settings
+    ):
+        settings.SCRATCH_ORG_RESERVE = 1
+        scratch_org_limits.return_value = ActiveScratchOrgLimits(remaining=2, max=10)
+        org = OrgFactory(scratch=True)
+        builds = [BuildFactory(org=org, status="queued") for _ in range(3)]
+
+        with mock.patch("metaci.build.tasks.dispatch_build") as dispatch_build:
+            for build in builds:
+                check_queued_build(build.id)
+
+        assert dispatch_build.call_count == 2
+        assert locks.get_waiters(SCRATCH_ORG_CAPACITY) == [builds[2].id]
+        scratch_org_limits.assert_called_once()
+
+    @mock.patch("metaci.build.tasks.scratch_org_limits")
+    def test_reconcile_scratch_org_capacity(
+        self, scratch_org_limits, redis, settings, check_delay
+    ):
+        settings.SCRATCH_ORG_RESERVE = 1
+        scratch_org_limits.return_value = ActiveScratchOrgLimits(remaining=2, max=10)
+        waiting = [BuildFactory(status="waiting") for _ in range(3)]
+        for build in waiting:
+            locks.add_waiter(SCRATCH_ORG_CAPACITY, build)
+
+        reconcile_scratch_org_capacity()
+
+        assert check_delay.call_count == 2
+        assert locks.get_waiters(SCRATCH_ORG_CAPACITY) == [waiting[2].id]
@@ -0,0 +1,160 @@
+from unittest import mock
+
+import pytest
+from django_redis import get_redis_connection
+
+from metaci.build import scheduler
+from metaci.build.tasks import dispatch_build
+from metaci.conftest import BuildFactory
+
+POOLS = {"default": ("app", 2), "high": ("app", 2)}
+
+
+def entry(build_id, repo=1, plan=1, queue="default", weight=1, submitted=0):
+    return {
+        "build": build_id,
+        "repo": repo,
+        "plan": plan,
+        "queue": queue,
+        "weight": weight,
+        "submitted": submitted,
+    }
+
+
+def released(pending, running=(), pools=POOLS, now=0, **kwargs):
+    pending = {e["build"]: e for e in pending}
+    running = {e["build"]: e for e in running}
+    releases = scheduler.plan_releases(pending, running, pools, now, **kwargs)
+    return [e["build"] for e in releases]
+
+
+def test_get_pools(settings):
+    settings.AUTOSCALERS = {
+        "app": {"max_workers": 3, "queues": ["default", "medium", "high"]}
+    }
+
+    pools = scheduler.get_pools()
+
+    assert pools["default"] == pools["high"] == ("app", 3)
+    # The robot queue has its own workers
+    assert pools["robot"] == ("robot", 1)
+
+
+def test_plan_releases__fills_free_slots():
+    pending = [entry(1, submitted=1), entry(2, submitted=2), entry(3, submitted=3)]
+
+    assert released(pending) == [1, 2]
+    assert released(pending, running=[entry(9)]) == [1]
+
+
+def test_plan_releases__shares_between_repos():
+    pending = [
+        entry(1, repo=1, submitted=1),
+        entry(2, repo=1, submitted=2),
+        entry(3, repo=2, submitted=3),
+    ]
+
+    assert released(pending) == [1, 3]
+    assert released(pending, limit_slots=False) == [1, 3, 2]
+
+
+def test_plan_releases__weights():
+    pending = [
+        entry(1, repo=1, submitted=1),
+        entry(2, repo=2, weight=2, submitted=2),
+        entry(3, repo=2, weight=2, submitted=3),
+    ]
+    running = [entry(8, repo=1), entry(9, repo=2)]
+    pools = {"default": ("app", 4)}
+
+    assert released(pending, running, pools) == [2, 1]
+
+
+def test_plan_releases__high_queue_first():
+    pending = [entry(1, submitted=1), entry(2, queue="high", submitted=2)]
+
+    assert released(pending, limit_slots=False) == [2, 1]
+
+
+def test_plan_releases__aging(settings):
+    settings.METACI_SCHEDULER_AGING = 600
+    running = [entry(9, repo=1)]
+    pools = {"default": ("app", 2)}
+    newer = entry(2, repo=2, submitted=1140)
+
+    # Waiting 1200s makes up for the build repo 1 is already running
+    waited = entry(1, repo=1, submitted=0)
+    assert released([waited, newer], running, pools, now=1200) == [1]
+    not_waited = entry(1, repo=1, submitted=900)
+    assert released([not_waited, newer], running, pools, now=1200) == [2]
+
+
+def test_plan_releases__limits(settings):
+    settings.METACI_SCHEDULER_REPO_LIMIT = 1
+    settings.METACI_SCHEDULER_PLAN_LIMIT = 1
+    pending = [
+        entry(1, repo=1, plan=1),
+        entry(2, repo=1, plan=2),
+        entry(3, repo=2, plan=1),
+        entry(4, repo=2, plan=2),
+    ]
+    pools = {}
+
+    assert released(pending, pools=pools) == [1, 4]
+
+
+def test_plan_releases__unpooled_queue():
+    pending = [entry(i, queue="robot") for i in range(5)]
+
+    assert len(released(pending)) == 5
+
+
+@pytest.fixture
+def redis():
+    redis = get_redis_connection("default")
+    yield redis
+    redis.delete(scheduler.PENDING_KEY, scheduler.RUNNING_KEY)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.scheduler.django_rq.get_queue")
+def test_submit_and_pump(get_queue, redis, settings):
+    settings.AUTOSCALERS = {"app": {"max_workers": 1, "queues": ["default"]}}
+    first = BuildFactory(status="queued", planrepo__plan__queue="default")
+    second = BuildFactory(status="queued", planrepo__plan__queue="default")
+    job_id = scheduler.submit(first, "lock")
+    scheduler.submit(second)
+
+    assert scheduler.pump() == [first.id]
+    assert scheduler.get_queue_position(second) == (1, None)
+    get_queue.return_value.enqueue.assert_called_once_with(
+        "metaci.build.tasks.run_build",
+        first.id,
+        "lock",
+        job_id=job_id,
+        job_timeout=first.plan.build_timeout,
+    )
+
+    first.set_status("success")
+    first.save()
+    scheduler.finish(first.id)
+
+    assert scheduler.get_queue_position(second) is None
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.autoscale")
+@mock.patch("metaci.build.scheduler.django_rq.get_queue")
+def test_dispatch_build__waiting(get_queue, autoscale, redis, settings):
+    settings.AUTOSCALERS = {"app": {"max_workers": 1, "queues": ["default"]}}
+    waited = BuildFactory(status="waiting", planrepo__plan__queue="default")
+    other = BuildFactory(status="queued", planrepo__plan__queue="default")
+
+    dispatch_build(waited)
+    scheduler.submit(other)
+
+    # The released build still holds the only slot
+    assert scheduler.pump() == []
+    waited.refresh_from_db()
+    assert waited.status == "queued"
+    assert get_queue.return_value.enqueue.call_count == 1
@@ -0,0 +1,109 @@
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from watson.models import SearchEntry
+
+from metaci.build import search
+from metaci.conftest import BuildFactory
+
+
+class FakeRedis:
+    def __init__(self):
+        self.sets = {}
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(
+            member.encode() if isinstance(member, str) else member for member in members
+        )
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop() for _ in range(min(count, len(members)))]
+
+
+def is_indexed(build):
+    return SearchEntry.objects.filter(
+        content_type__model="build", object_id_int=build.pk
+    ).exists()
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with mock.patch("metaci.build.search.get_redis_connection", return_value=redis):
+        yield redis
+
+
+@pytest.fixture
+def scheduler():
+    with mock.patch("django_rq.get_scheduler") as get_scheduler:
+        yield get_scheduler.return_value
+
+
+@pytest.mark.django_db
+class TestDeferredIndexing:
+    def test_save__queues_on_status_change(self, fake_redis, scheduler):
+        build = BuildFactory(status="queued")
+        pending = fake_redis.sets[search.SEARCH_INDEX_PENDING_KEY]
+        assert f"build.Build:{build.pk}".encode() in pending
+
+        fake_redis.sets.clear()
+        build.save()
+        assert not fake_redis.sets
+
+        build.status = "running"
+        build.save()
+        assert fake_redis.sets[search.SEARCH_INDEX_PENDING_KEY]
+
+    def test_save__schedules_one_job(self, fake_redis, scheduler):
+        search.cache.delete(search.SEARCH_INDEX_SCHEDULED_KEY)
+        BuildFactory()
+        BuildFactory()
+
+        scheduler.enqueue_in.assert_called_once()
+
+    def test_save__does_not_index_inline(self, fake_redis, scheduler):
+        build = BuildFactory(status="queued")
+
+        assert not is_indexed(build)
+
+    def test_save__redis_unavailable(self, scheduler):
+        with mock.patch(
+            "metaci.build.search.get_redis_connection", side_effect=ConnectionError
+        ):
+            build = BuildFactory(status="queued")
+
+        assert is_indexed(build)
+
+    def test_update_search_index(self, fake_redis, scheduler):
+        build = BuildFactory(status="queued")
+
+        result = search.update_search_index()
+
+        assert result == "Updated search index for 1 objects"
+        assert is_indexed(build)
+        assert not fake_redis.sets[search.SEARCH_INDEX_PENDING_KEY]
+
+    def test_update_search_index__error(self, fake_redis, scheduler):
+        build = BuildFactory(status="queued")
+        search.cache.delete(search.SEARCH_INDEX_SCHEDULED_KEY)
+
+        with mock.patch(
+            "metaci.build.search.update_objects_index", side_effect=RuntimeError
+        ):
+            with pytest.raises(RuntimeError):
+                search.update_search_index()
+
+        pending = fake_redis.sets[search.SEARCH_INDEX_PENDING_KEY]
+        assert pending == {f"build.Build:{build.pk}".encode()}
+        scheduler.enqueue_in.assert_called()
+
+
+@pytest.mark.django_db
+def test_index_builds(fake_redis, scheduler):
+    build = BuildFactory(status="success")
+
+    call_command("index_builds", days=1)
+
+    assert is_indexed(build)
@@ -0,0 +1,107 @@
+import io
+
+import pytest
+
+from metaci.build.autoscaling import (
+    HerokuAutoscaler,
+    LocalAutoscaler,
+    NonAutoscaler,
+    PredictiveHerokuAutoscaler,
+)
+from metaci.build.simulation import (
+    Simulation,
+    TraceBuild,
+    load_trace,
+    percentile,
+    save_trace,
+)
+
+CONFIG = {
+    "app_name": "test-app",
+    "worker_type": "worker",
+    "max_workers": 2,
+    "worker_reserve": 1,
+    "queues": ["default", "medium", "high"],
+}
+
+# Two builds queued together, then a high-priority build behind a
+# default one while both workers are busy
+TRACE = [
+    TraceBuild(plan_id=1, queue="default", queued_at=0, duration=600),
+    TraceBuild(plan_id=1, queue="default", queued_at=0, duration=600),
+    TraceBuild(plan_id=1, queue="default", queued_at=60, duration=600),
+    TraceBuild(plan_id=2, queue="high", queued_at=120, duration=300),
+]
+
+
+def test_percentile():
+    assert percentile([], 50) == 0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
+
+
+def test_trace_round_trip():
+    f = io.StringIO()
+    save_trace(TRACE[::-1], f)
+    f.seek(0)
+
+    assert load_trace(f) == sorted(TRACE, key=lambda build: build.queued_at)
+
+
+def test_fixed_workers():
+    report = Simulation(NonAutoscaler, CONFIG, TRACE, workers=2).run()
+
+    assert report.builds == 4
+    assert report.unfinished == 0
+    # The high-priority build takes the first free worker
+    assert report.wait_max == 600 - 60
+    assert report.peak_workers == 2
+    assert report.worker_minutes == pytest.approx(2 * (600 + 600) / 60)
+
+
+def test_no_workers():
+    report = Simulation(NonAutoscaler, CONFIG, TRACE, timeout=3600).run()
+
+    assert report.unfinished == 4
+    assert report.worker_minutes == 0
+    # Builds that never start wait until the end of the simulation
+    assert report.wait_p50 >= 3600
+    assert report.wait_max >= 120 + 3600
+    fixed = Simulation(NonAutoscaler, CONFIG, TRACE, workers=2).run()
+    assert report.wait_max > fixed.wait_max
+
+
+def test_heroku_autoscaler():
+    report = Simulation(HerokuAutoscaler, CONFIG, TRACE, startup_time=120).run()
+
+    assert report.unfinished == 0
+    assert report.interrupted == 0
+    # One worker is reserved for high-priority builds, so the second
+    # worker is only started once the high-priority build is queued
+    assert report.wait_p50 == 120 + 120
+    assert report.wait_max == 840 - 60
+    assert report.peak_workers == 2
+
+
+def test_heroku_autoscaler__dyno_limit():
+    report = Simulation(HerokuAutoscaler, CONFIG, TRACE, dyno_limit=1).run()
+
+    assert report.unfinished == 0
+    assert report.peak_workers == 1
+
+
+def test_local_autoscaler():
+    report = Simulation(LocalAutoscaler, CONFIG, TRACE, startup_time=0).run()
+
+    assert report.unfinished == 0
+    assert report.wait_p50 == 0
+    # Burst workers stop once the queues are empty
+    assert report.worker_minutes < 2 * 1200 / 60
+
+
+def test_predictive_autoscaler():
+    report = Simulation(PredictiveHerokuAutoscaler, CONFIG, TRACE).run()
+
+    assert report.unfinished == 0
+    assert report.interrupted == 0
+    assert report.peak_workers == 2
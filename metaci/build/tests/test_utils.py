@@ -0,0 +1,56 @@
+from metaci.build.utils import (
+    LogPosition,
+    format_log_fragment,
+    get_ansi_state,
+    summarize_phase_timings,
+)
+
+
+def test_summarize_phase_timings():
+    summary = summarize_phase_timings(
+        [
+            [
+                {"phase": "checkout", "duration": 3},
+                {"phase": "org", "duration": 120},
+            ],
+            [
+                {"phase": "checkout", "duration": 1},
+                {"phase": "org", "duration": None},
+            ],
+            [],
+        ]
+    )
+
+    assert summary == {
+        "checkout": {"count": 2, "mean": 2, "median": 2, "p90": 3, "max": 3},
+        "org": {"count": 1, "mean": 120, "median": 120, "p90": 120, "max": 120},
+    }
+
+
+def test_get_ansi_state():
+    assert get_ansi_state("plain") == ""
+    assert get_ansi_state("\x1b[1m\x1b[31mred") == "1;31"
+    assert get_ansi_state("\x1b[31mred\x1b[0m") == ""
+    assert get_ansi_state("\x1b[38;5;0mblack", "1") == "1;38;5;0"
+    assert get_ansi_state("\x1b[31m", "31") == "31"
+
+
+def test_format_log_fragment__ansi_state():
+    assert format_log_fragment("red", "31") == format_log_fragment("\x1b[31mred")
+
+
+def test_format_log_fragment__line_ids():
+    assert format_log_fragment("one\ntwo\n") == "one\ntwo\n"
+    assert format_log_fragment("one\ntwo\n", line=3) == (
+        '<span id="line-3">one</span>\n<span id="line-4">two</span>\n'
+    )
+    assert format_log_fragment("o\ntwo", line=3, mid_line=True) == (
+        'o\n<span id="line-4">two</span>'
+    )
+
+
+def test_log_position():
+    position = LogPosition().advance("\x1b[31mone\ntw")
+    assert position == LogPosition("31", 1, True)
+    assert position.advance("o\n") == LogPosition("31", 2, False)
+    assert position.advance("") == position
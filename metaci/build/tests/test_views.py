@@ -1,7 +1,10 @@
+from unittest import mock
+
 import pytest
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 
+from metaci.build.utils import format_log_fragment
 from metaci.fixtures.factories import RebuildFactory
 
 
@@ -141,6 +144,110 @@ class TestBuildViews:
 
         assert response.status_code == 403
 
+    def test_build_log_stream(self, client, superuser, data):
+        data["build"].status = "success"
+        data["build"].log = "head\n"
+        data["build"].save()
+        data["build"].append_log("tail\n")
+        client.force_login(superuser)
+        url = reverse("build_log_stream", kwargs={"build_id": data["build"].id})
+        response = client.get(url, {"offset": 2})
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "html": format_log_fragment("ad\ntail\n"),
+            "offset": 10,
+            "ansi_state": "",
+            "reset": False,
+            "status": "success",
+            "complete": True,
+        }
+
+    def test_build_log_stream__nothing_new(self, client, superuser, data, settings):
+        settings.METACI_LOG_STREAM_TIMEOUT = 0
+        data["build"].status = "running"
+        data["build"].save()
+        data["build"].append_log("output\n")
+        client.force_login(superuser)
+        url = reverse("build_log_stream", kwargs={"build_id": data["build"].id})
+        response = client.get(url, {"offset": 7, "ansi_state": "31"})
+
+        assert response.json()["html"] == ""
+        assert response.json()["offset"] == 7
+        assert response.json()["ansi_state"] == "31"
+        assert not response.json()["complete"]
+
+    def test_build_log_stream__reset(self, client, superuser, data):
+        data["build"].status = "error"
+        data["build"].log = "new log"
+        data["build"].save()
+        client.force_login(superuser)
+        url = reverse("build_log_stream", kwargs={"build_id": data["build"].id})
+        response = client.get(url, {"offset": 100, "ansi_state": "31"})
+
+        assert response.json()["reset"]
+        assert response.json()["html"] == format_log_fragment("new log")
+
+    def test_build_log_stream__waits_for_output(
+        self, client, superuser, data, settings
+    ):
+        settings.METACI_LOG_STREAM_TIMEOUT = 60
+        build = data["build"]
+        build.status = "running"
+        build.save()
+
+        def get_message(timeout):
+            build.append_log("new\n")
+            return {"type": "message", "channel": build.log_channel, "data": b"1"}
+
+        client.force_login(superuser)
+        url = reverse("build_log_stream", kwargs={"build_id": build.id})
+        with mock.patch("metaci.build.views.get_redis_connection") as redis:
+            pubsub = redis.return_value.pubsub.return_value
+            pubsub.get_message.side_effect = get_message
+            response = client.get(url, {"offset": 0})
+
+        pubsub.subscribe.assert_called_once_with(build.log_channel)
+        assert pubsub.get_message.call_count == 1
+        assert response.json()["html"] == format_log_fragment("new\n")
+        assert response.json()["offset"] == 4
+
+    def test_build_log_stream__ansi_state(self, client, superuser, data):
+        data["build"].status = "running"
+        data["build"].save()
+        data["build"].append_log("\x1b[31mred\n")
+        client.force_login(superuser)
+        url = reverse("build_log_stream", kwargs={"build_id": data["build"].id})
+        first = client.get(url).json()
+        data["build"].append_log("still red\x1b[0m\n")
+        second = client.get(
+            url, {"offset": first["offset"], "ansi_state": first["ansi_state"]}
+        ).json()
+
+        assert first["ansi_state"] == "31"
+        assert second["html"] == format_log_fragment("still red\x1b[0m\n", "31")
+        assert second["ansi_state"] == ""
+
+    def test_build_log_stream__permission_denied(self, client, user, data):
+        client.force_login(user)
+        url = reverse("build_log_stream", kwargs={"build_id": data["build"].id})
+        response = client.get(url)
+
+        assert response.status_code == 403
+
+    def test_build_flow_log_stream(self, client, superuser, data):
+        data["buildflow"].status = "success"
+        data["buildflow"].save()
+        data["buildflow"].append_log("flow output\n")
+        client.force_login(superuser)
+        url = reverse(
+            "build_flow_log_stream",
+            kwargs={"build_id": data["build"].id, "flow_id": data["buildflow"].id},
+        )
+        response = client.get(url)
+
+        assert response.json()["log"] == "flow output\n"
+
     def test_build_search(self, client, superuser, data):
         client.force_login(superuser)
         url = reverse("build_search")
@@ -0,0 +1,131 @@
+import json
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+
+from metaci.build import warm
+from metaci.build.autoscaling import WarmOneOffBuilder
+from metaci.conftest import BuildFactory
+
+ITEM = json.dumps(["1", "lock"]).encode()
+
+
+def test_preimport():
+    with mock.patch.object(warm, "WARM_MODULES", ("json", "not_a_module")):
+        assert warm.preimport() >= 0
+
+
+@mock.patch("metaci.build.warm.get_redis_connection")
+def test_warm_one_off_builder(get_redis_connection):
+    result = WarmOneOffBuilder({}).one_off_build(1, None)
+
+    assert result == "build-server-1"
+    get_redis_connection.return_value.lpush.assert_called_once_with(
+        warm.WARM_BUILD_QUEUE_KEY, json.dumps(["1", None])
+    )
+
+
+class TestWarmBuildServer:
+    @mock.patch("metaci.build.warm.get_redis_connection")
+    def test_poll(self, get_redis_connection):
+        get_redis_connection.return_value.brpoplpush.return_value = ITEM
+        server = warm.WarmBuildServer(name="build_server.1")
+        server.fork_build = mock.Mock(return_value=123)
+
+        server.poll()
+
+        get_redis_connection.return_value.brpoplpush.assert_called_once_with(
+            warm.WARM_BUILD_QUEUE_KEY,
+            "metaci:warm-builds:processing:build_server.1",
+            server.poll_timeout,
+        )
+        server.fork_build.assert_called_once_with("1", "lock")
+        assert server.children == {123: ITEM}
+
+    @mock.patch("metaci.build.warm.get_redis_connection")
+    def test_poll__empty(self, get_redis_connection):
+        get_redis_connection.return_value.brpoplpush.return_value = None
+        server = warm.WarmBuildServer()
+        server.fork_build = mock.Mock()
+
+        server.poll()
+
+        server.fork_build.assert_not_called()
+
+    @mock.patch("time.sleep")
+    @mock.patch("os.waitpid", return_value=(0, 0))
+    @mock.patch("metaci.build.warm.get_redis_connection")
+    def test_poll__at_capacity(self, get_redis_connection, waitpid, sleep):
+        server = warm.WarmBuildServer(max_builds=1)
+        server.children = {123: ITEM}
+
+        server.poll()
+
+        get_redis_connection.return_value.brpoplpush.assert_not_called()
+
+    def test_max_builds__default(self, settings):
+        settings.METACI_BUILD_SERVER_MAX_BUILDS = 2
+
+        assert warm.WarmBuildServer().max_builds == 2
+
+    @mock.patch("metaci.build.warm.get_redis_connection")
+    @mock.patch(
+        "os.waitpid", side_effect=[(123, 0), (456, warm.REQUEUE_STATUS << 8), (0, 0)]
+    )
+    def test_reap(self, waitpid, get_redis_connection):
+        redis = get_redis_connection.return_value
+        server = warm.WarmBuildServer(name="server")
+        server.children = {123: b"done", 456: b"aborted", 789: b"running"}
+
+        server.reap()
+
+        assert server.children == {789: b"running"}
+        redis.lrem.assert_called_once_with(server.processing_key, 1, b"done")
+        pipe = redis.pipeline.return_value.__enter__.return_value
+        pipe.rpush.assert_called_once_with(warm.WARM_BUILD_QUEUE_KEY, b"aborted")
+        pipe.lrem.assert_called_once_with(server.processing_key, 1, b"aborted")
+
+    @pytest.mark.django_db
+    @mock.patch("metaci.build.warm.get_redis_connection")
+    def test_recover(self, get_redis_connection):
+        running = BuildFactory(status="running")
+        finished = BuildFactory(status="success")
+        items = [json.dumps([str(build.id), None]) for build in (running, finished)]
+        redis = get_redis_connection.return_value
+        redis.lrange.return_value = items
+        server = warm.WarmBuildServer(name="server")
+        server.requeue = mock.Mock()
+
+        server.recover()
+
+        server.requeue.assert_called_once_with(items[0])
+        redis.lrem.assert_called_once_with(server.processing_key, 1, items[1])
+
+    def test_stop(self):
+        server = warm.WarmBuildServer()
+
+        server.stop(15, None)
+
+        assert server.stopping
+
+
+@mock.patch("metaci.build.warm.preimport")
+@mock.patch("subprocess.run")
+def test_benchmark_startup(run, preimport):
+    result = warm.benchmark_startup(runs=1)
+
+    run.assert_called_once()
+    assert result["cold"] >= 0
+    assert result["warm"] >= 0
+
+
+@mock.patch(
+    "metaci.build.management.commands.benchmark_build_startup.benchmark_startup",
+    return_value={"cold": 3.0, "warm": 0.01},
+)
+def test_benchmark_build_startup_command(benchmark_startup, capsys):
+    call_command("benchmark_build_startup", runs=2)
+
+    benchmark_startup.assert_called_once_with(2)
+    assert "Cold process startup: 3.000s" in capsys.readouterr().out
@@ -0,0 +1,132 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from unittest import mock
+
+import pytest
+
+from metaci.build.exceptions import BuildError
+from metaci.build.zipballs import (
+    DownloadProgress,
+    evict_zipballs,
+    extract_zipball,
+    get_zipball_path,
+    open_zipball,
+)
+
+SHA = "a" * 40
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(settings, tmp_path):
+    settings.METACI_ZIPBALL_CACHE_DIR = str(tmp_path)
+    settings.METACI_ZIPBALL_CACHE_MAX_SIZE_MB = 1
+    return tmp_path
+
+
+@pytest.fixture
+def repo():
+    def archive(format, f, ref):
+        f.write(f"zipball of {ref}".encode())
+        return True
+
+    repo = mock.Mock(owner="SFDO-Tooling")
+    repo.name = "MetaCI"
+    repo.get_github_api.return_value.archive.side_effect = archive
+    return repo
+
+
+def test_open_zipball__cached(repo):
+    logger = mock.Mock()
+    with open_zipball(repo, SHA, logger) as f:
+        assert f.read() == f"zipball of {SHA}".encode()
+    with open_zipball(repo, SHA, logger) as f:
+        assert f.read() == f"zipball of {SHA}".encode()
+
+    assert repo.get_github_api.return_value.archive.call_count == 1
+    assert os.path.exists(get_zipball_path(repo, SHA))
+
+
+def test_open_zipball__not_a_sha(repo, cache_dir):
+    with open_zipball(repo, "main", mock.Mock()) as f:
+        assert f.read() == b"zipball of main"
+
+    assert not list(cache_dir.glob("*.zip"))
+
+
+def test_open_zipball__download_failed(repo, cache_dir):
+    repo.get_github_api.return_value.archive.side_effect = None
+    repo.get_github_api.return_value.archive.return_value = False
+
+    with pytest.raises(BuildError):
+        open_zipball(repo, SHA, mock.Mock())
+
+    assert [p.name for p in cache_dir.iterdir() if not p.name.startswith(".")] == []
+
+
+def test_open_zipball__concurrent_downloads_shared(repo):
+    archive = repo.get_github_api.return_value.archive
+
+    def slow_archive(format, f, ref):
+        time.sleep(0.2)
+        f.write(b"zipball")
+        return True
+
+    archive.side_effect = slow_archive
+    results = []
+
+    def build():
+        with open_zipball(repo, SHA, mock.Mock()) as f:
+            results.append(f.read())
+
+    threads = [threading.Thread(target=build) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"zipball"] * 3
+    assert archive.call_count == 1
+
+
+def test_evict_zipballs(cache_dir):
+    for i, name in enumerate(["old", "recent", "kept"]):
+        path = cache_dir / f"{name}.zip"
+        path.write_bytes(b"x" * 400 * 1024)
+        os.utime(path, (i, i))
+
+    evict_zipballs(keep=str(cache_dir / "kept.zip"))
+
+    assert sorted(p.name for p in cache_dir.glob("*.zip")) == [
+        "kept.zip",
+        "recent.zip",
+    ]
+
+
+def test_download_progress():
+    f = io.BytesIO()
+    logger = mock.Mock()
+    with mock.patch("metaci.build.zipballs.PROGRESS_LOG_BYTES", 1024):
+        progress = DownloadProgress(f, logger)
+        for _ in range(5):
+            progress.write(b"x" * 512)
+
+    assert progress.size == 2560
+    assert len(f.getvalue()) == 2560
+    assert logger.info.call_count == 2
+
+
+def test_extract_zipball(tmp_path):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, "w") as zip_file:
+        zip_file.writestr("repo-sha/", "")
+        zip_file.writestr("repo-sha/cumulusci.yml", "project: {}")
+        zip_file.writestr("repo-sha/src/package.xml", "<Package/>")
+    logger = mock.Mock()
+
+    extract_zipball(f, tmp_path, logger)
+
+    assert (tmp_path / "repo-sha" / "src" / "package.xml").read_text() == "<Package/>"
+    logger.info.assert_called_with("-- Extracted 2 files (21\xa0bytes)")
@@ -18,6 +18,16 @@ urlpatterns = [
         views.build_rebuild,
         name="build_rebuild",
     ),
+    re_path(
+        r"^(?P<build_id>\d+)/log$",
+        views.build_log_stream,
+        name="build_log_stream",
+    ),
+    re_path(
+        r"^(?P<build_id>\d+)/flows/(?P<flow_id>\d+)/log$",
+        views.build_flow_log_stream,
+        name="build_flow_log_stream",
+    ),
     re_path(
         r"^(?P<build_id>\d+)(?:/rebuilds/(?P<rebuild_id>[\d]+|original))?/flows$",
         views.build_detail_flows,
@@ -1,13 +1,20 @@
+import hashlib
+import math
+import re
+import statistics
 import subprocess
+import typing as T
+from collections import defaultdict
+from functools import lru_cache
 
 from ansi2html import Ansi2HTMLConverter
 from cumulusci.core.exceptions import CommandException
 from django.apps import apps
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db.models import Q
 
+SGR_RE = re.compile(r"\x1b\[([\d;]*)m")
+
 
 def paginate(build_list, request):
     page = request.GET.get("page")
@@ -57,12 +64,101 @@ def view_queryset(request, query=None, status=None, filterset_class=None):
         return builds
 
 
+def get_log_converter():
+    return Ansi2HTMLConverter(dark_bg=False, scheme="solarized")
+
+
+@lru_cache(maxsize=None)
+def get_log_headers():
+    return get_log_converter().produce_headers()
+
+
+def hash_log(log):
+    return hashlib.sha256(log.encode()).hexdigest()
+
+
 def format_log(log):
-    conv = Ansi2HTMLConverter(dark_bg=False, scheme="solarized", markup_lines=True)
-    headers = conv.produce_headers()
-    content = conv.convert(log, full=False)
-    content = f'<pre class="ansi2html-content">{content}</pre>'
-    return headers + content
+    return wrap_log_html(format_log_fragment(log, line=0))
+
+
+class LogPosition(T.NamedTuple):
+    """Where a piece of log output starts, as format_log_fragment needs it."""
+
+    ansi_state: str = ""
+    line: int = 0
+    mid_line: bool = False
+
+    def advance(self, log):
+        """Return the position at the end of some log output starting here."""
+        if not log:
+            return self
+        return LogPosition(
+            get_ansi_state(log, self.ansi_state),
+            self.line + log.count("\n"),
+            not log.endswith("\n"),
+        )
+
+
+def format_log_fragment(log, ansi_state="", line=None, mid_line=False):
+    """Convert a piece of log output to HTML to append to a rendered log.
+
+    ``ansi_state`` is the SGR state in effect at the start of the piece, as
+    returned by ``get_ansi_state`` for the output before it, so that colors
+    carry over from one piece to the next.
+
+    If ``line`` is given, each line is marked up as ``<span id="line-N">``,
+    numbered from ``line``, the number of lines before the piece. If the
+    piece starts partway through a line (``mid_line``), that line was marked
+    up with the piece before it, so the ids stay unique across pieces.
+    """
+    if ansi_state:
+        log = f"\x1b[{ansi_state}m{log}"
+    html = get_log_converter().convert(log, full=False)
+    if line is None:
+        return html
+    lines = html.split("\n")
+    for i, text in enumerate(lines):
+        # The empty line after a trailing newline belongs to the next piece
+        if (i == 0 and mid_line) or (i == len(lines) - 1 and not text):
+            continue
+        lines[i] = f'<span id="line-{line + i}">{text}</span>'
+    return "\n".join(lines)
+
+
+def get_ansi_state(log, ansi_state=""):
+    """Return the SGR parameters still in effect at the end of some log output.
+
+    ``ansi_state`` is the state at the start of the output. The result is
+    a string like ``"1;31"``, or ``""`` if all attributes have been reset.
+    """
+    codes = ansi_state.split(";") if ansi_state else []
+    for match in SGR_RE.finditer(log):
+        params = match.group(1).split(";")
+        i = 0
+        while i < len(params):
+            # 38 and 48 take their color as 2 or 4 more parameters
+            if params[i] in ("38", "48") and i + 1 < len(params):
+                length = 3 if params[i + 1] == "5" else 5
+                _add_sgr_code(codes, ";".join(params[i : i + length]))
+                i += length
+                continue
+            if params[i] in ("", "0"):
+                codes = []
+            else:
+                _add_sgr_code(codes, params[i])
+            i += 1
+    return ";".join(codes)
+
+
+def _add_sgr_code(codes, code):
+    if code in codes:
+        codes.remove(code)
+    codes.append(code)
+
+
+def wrap_log_html(content):
+    """Wrap converted log HTML in the styles and markup of a full log."""
+    return get_log_headers() + f'<pre class="ansi2html-content">{content}</pre>'
 
 
 def run_command(command, env=None, cwd=None):
@@ -86,3 +182,27 @@ def run_command(command, env=None, cwd=None):
     if p.returncode:
         message = f"Return code: {p.returncode}\nstderr: {p.stderr}"
         raise CommandException(message)
+
+
+def summarize_phase_timings(phase_timings):
+    """Aggregate the phase timing records of many builds or flows by phase.
+
+    Returns durations in seconds as ``{phase: {count, mean, median, p90, max}}``.
+    """
+    durations = defaultdict(list)
+    for timings in phase_timings:
+        for record in timings:
+            if record.get("duration") is not None:
+                durations[record["phase"]].append(record["duration"])
+
+    summary = {}
+    for phase, values in sorted(durations.items()):
+        values.sort()
+        summary[phase] = {
+            "count": len(values),
+            "mean": round(statistics.mean(values), 3),
+            "median": round(statistics.median(values), 3),
+            "p90": values[math.ceil(0.9 * len(values)) - 1],
+            "max": values[-1],
+        }
+    return summary
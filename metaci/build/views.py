@@ -1,16 +1,28 @@
+import time
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth.decorators import permission_required
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
+from django_redis import get_redis_connection
 from watson import search as watson
 
+from metaci.build import scheduler
 from metaci.build.filters import BuildFilter
 from metaci.build.forms import QATestingForm
-from metaci.build.models import Build, Rebuild
-from metaci.build.utils import view_queryset
+from metaci.build.models import Build, BuildFlow, Rebuild
+from metaci.build.utils import (
+    format_log,
+    format_log_fragment,
+    get_ansi_state,
+    view_queryset,
+)
+
+LIVE_LOG_STATUSES = ("queued", "waiting", "running")
 
 
 def build_list(request):
@@ -60,6 +72,16 @@ def build_detail_base(request, build_id, rebuild_id):
                 list(flow.test_results.filter(outcome__in=["Fail", "CompileFail"]))
             )
 
+    live_flows = [flow.id for flow in flows if flow.status in LIVE_LOG_STATUSES]
+
+    queue_position = queue_eta = None
+    if build.get_status() == "queued":
+        position = scheduler.get_queue_position(build)
+        if position:
+            queue_position, wait = position
+            if wait is not None:
+                queue_eta = timezone.now() + timedelta(seconds=wait)
+
     obj_perms = {
         "rebuild_builds": request.user.has_perm("plan.rebuild_builds", build.planrepo),
         "org_login": request.user.has_perm("plan.org_login", build.planrepo),
@@ -76,6 +98,11 @@ def build_detail_base(request, build_id, rebuild_id):
             "flows": flows,
             "tests": tests,
             "obj_perms": obj_perms,
+            "live_log": build.get_status() in LIVE_LOG_STATUSES,
+            "live_flows": live_flows,
+            "queue_position": queue_position,
+            "queue_eta": queue_eta,
+            "empty_log_html": format_log(""),
         },
     )
 
@@ -156,10 +183,7 @@ def build_rebuild(request, build_id):
     rebuild = Rebuild(build=build, user=request.user, status="queued")
     rebuild.save()
 
-    if not build.log:
-        build.log = ""
-
-    build.log += (
+    build.append_log(
         f"\n=== Build restarted at {timezone.now()} by {request.user.username} ===\n"
     )
     build.current_rebuild = rebuild
@@ -179,3 +203,99 @@ def build_search(request):
     context = {"query": q, "search_entry_list": results}
 
     return render(request, "build/search.html", context=context)
+
+
+def _get_log_status(obj):
+    """Fetch the current status of a build or build flow from the database."""
+    if isinstance(obj, Build):
+        row = (
+            Build.objects.filter(pk=obj.pk)
+            .values("status", "current_rebuild__status")
+            .get()
+        )
+        return row["current_rebuild__status"] or row["status"]
+    return BuildFlow.objects.filter(pk=obj.pk).values_list("status", flat=True).get()
+
+
+def _read_new_log(obj, offset):
+    """Return ``(text, end, status)`` once there is log output after offset.
+
+    If there is none yet and the log is live, this waits for the log to
+    change for up to METACI_LOG_STREAM_TIMEOUT seconds. Appending to the
+    log publishes to its Redis channel, so the log is only read again when
+    it has changed.
+    """
+    pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+    # Subscribe before reading, so that no change is missed in between
+    pubsub.subscribe(obj.log_channel)
+    try:
+        text, end = obj.read_log(offset)
+        status = _get_log_status(obj)
+        deadline = time.monotonic() + settings.METACI_LOG_STREAM_TIMEOUT
+        while not text and end >= offset and status in LIVE_LOG_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if pubsub.get_message(timeout=remaining) is None:
+                continue
+            text, end = obj.read_log(offset)
+            status = _get_log_status(obj)
+        return text, end, status
+    finally:
+        pubsub.close()
+
+
+def _log_stream_response(request, obj):
+    """Return any log output after an offset, and the current status, as JSON.
+
+    The client passes the offset of the log it has already seen as the
+    ``offset`` query parameter, and the ``ansi_state`` returned with it.
+    The response is held until there is new output or the log is complete,
+    up to a timeout, and the client requests again until it is complete.
+    """
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        offset = 0
+    ansi_state = request.GET.get("ansi_state", "")
+
+    text, end, status = _read_new_log(obj, offset)
+    reset = end < offset
+    if reset:
+        # The log was replaced (e.g. by a rebuild); start over.
+        text, end = obj.read_log(0)
+        ansi_state = ""
+    return JsonResponse(
+        {
+            "html": format_log_fragment(text, ansi_state) if text else "",
+            "offset": end,
+            "ansi_state": get_ansi_state(text, ansi_state),
+            "reset": reset,
+            "status": status,
+            "complete": status not in LIVE_LOG_STATUSES,
+        }
+    )
+
+
+@transaction.non_atomic_requests
+def build_log_stream(request, build_id):
+    build = get_object_or_404(Build.objects.defer("log", "log_html"), id=build_id)
+
+    if not request.user.has_perm("plan.view_builds", build.planrepo):
+        raise PermissionDenied("You are not authorized to view this build")
+
+    return _log_stream_response(request, build)
+
+
+@transaction.non_atomic_requests
+def build_flow_log_stream(request, build_id, flow_id):
+    build_flow = get_object_or_404(
+        BuildFlow.objects.defer("log", "log_html").select_related("build__planrepo"),
+        build_id=build_id,
+        id=flow_id,
+    )
+
+    if not request.user.has_perm("plan.view_builds", build_flow.build.planrepo):
+        raise PermissionDenied("You are not authorized to view this build")
+
+    return _log_stream_response(request, build_flow)
@@ -0,0 +1,218 @@
+"""Warm build processes.
+
+Starting a build process from scratch pays for Django setup and for
+importing CumulusCI, Robot Framework and simple_salesforce before the
+build can begin. A warm process imports those modules once, then forks
+a child for each build, which starts with everything already imported.
+
+A build taken from the queue is moved to the server's own processing
+list in the same Redis command, and stays there until its child is done
+with it, so a build isn't lost if the server dies before it is forked. A
+restarted server queues the builds left on its list again. When the dyno
+is shutting down, children abort their builds the way rq's work horses do,
+and the builds are queued again to run from the start.
+"""
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django import db
+from django.conf import settings
+from django_redis import get_redis_connection
+from rq.exceptions import ShutDownImminentException
+
+from metaci.build.exceptions import RequeueJob
+
+logger = logging.getLogger(__name__)
+
+WARM_BUILD_QUEUE_KEY = "metaci:warm-builds"
+PROCESSING_KEY = "metaci:warm-builds:processing:{}"
+# Exit status of a child whose build should be queued again
+REQUEUE_STATUS = 3
+
+# Modules imported while running a build that are slow to import
+WARM_MODULES = (
+    "cumulusci.core.flowrunner",
+    "cumulusci.core.keychain",
+    "cumulusci.salesforce_api.metadata",
+    "cumulusci.tasks.salesforce",
+    "cumulusci.tasks.robotframework",
+    "robot",
+    "simple_salesforce",
+    "metaci.build.flows",
+    "metaci.build.models",
+    "metaci.testresults.robot_importer",
+)
+
+
+def preimport():
+    """Import the modules builds need, so that processes forked later start warm.
+
+    Returns the time it took in seconds.
+    """
+    start = time.monotonic()
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Could not preimport {name}: {e}")
+    return time.monotonic() - start
+
+
+def queue_warm_build(build_id, lock_id):
+    """Hand a build to the warm build server."""
+    # Builds are taken from the right, so the queue is first-in first-out
+    get_redis_connection("default").lpush(
+        WARM_BUILD_QUEUE_KEY, json.dumps([str(build_id), lock_id])
+    )
+
+
+class WarmBuildServer(object):
+    """Runs builds queued by queue_warm_build in children forked from a warm parent.
+
+    At most max_builds builds run at once, METACI_BUILD_SERVER_MAX_BUILDS
+    by default. Each server needs a name of its own, which is the Heroku
+    dyno name or else the host name, and which it keeps when restarted.
+    """
+
+    def __init__(self, max_builds=None, poll_timeout=5, name=None):
+        self.max_builds = max_builds or settings.METACI_BUILD_SERVER_MAX_BUILDS
+        self.poll_timeout = poll_timeout
+        self.name = name or os.environ.get("DYNO") or socket.gethostname()
+        self.processing_key = PROCESSING_KEY.format(self.name)
+        # The queue item of each child's build, by pid
+        self.children = {}
+        self.stopping = False
+
+    def serve(self):
+        elapsed = preimport()
+        logger.info(f"Build server imported build modules in {elapsed:.1f}s")
+        self.recover()
+        signal.signal(signal.SIGTERM, self.stop)
+        while not self.stopping:
+            self.poll()
+        # Children get SIGTERM too, and requeue their builds
+        while self.children:
+            time.sleep(1)
+            self.reap()
+
+    def stop(self, signum, frame):
+        logger.info("Build server is shutting down")
+        self.stopping = True
+
+    def recover(self):
+        """Queue again the builds a previous run of this server left unfinished."""
+        from metaci.build.models import Build
+
+        redis = get_redis_connection("default")
+        for item in redis.lrange(self.processing_key, 0, -1):
+            build_id, _ = json.loads(item)
+            build = Build.objects.filter(id=build_id).first()
+            if build and build.get_status() in ("queued", "running"):
+                logger.info(f"Queueing unfinished build {build_id} again")
+                self.requeue(item)
+            else:
+                redis.lrem(self.processing_key, 1, item)
+
+    def requeue(self, item):
+        redis = get_redis_connection("default")
+        with redis.pipeline() as pipe:
+            # At the right end, so it is the next build taken
+            pipe.rpush(WARM_BUILD_QUEUE_KEY, item)
+            pipe.lrem(self.processing_key, 1, item)
+            pipe.execute()
+
+    def poll(self):
+        """Start the next queued build, if there is capacity for it."""
+        self.reap()
+        if len(self.children) >= self.max_builds:
+            time.sleep(1)
+            return
+        item = get_redis_connection("default").brpoplpush(
+            WARM_BUILD_QUEUE_KEY, self.processing_key, self.poll_timeout
+        )
+        if item:
+            build_id, lock_id = json.loads(item)
+            self.children[self.fork_build(build_id, lock_id)] = item
+
+    def reap(self):
+        for pid, item in list(self.children.items()):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if not done:
+                continue
+            del self.children[pid]
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == REQUEUE_STATUS:
+                self.requeue(item)
+            else:
+                get_redis_connection("default").lrem(self.processing_key, 1, item)
+
+    def fork_build(self, build_id, lock_id):
+        # The child must not share the parent's database connections.
+        db.connections.close_all()
+        pid = os.fork()
+        if pid:
+            logger.info(f"Running build {build_id} in process {pid}")
+            return pid
+
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, _raise_shutdown_imminent)
+            from metaci.build.tasks import run_build
+
+            run_build(build_id, lock_id)
+        except RequeueJob:
+            logger.info(f"Build {build_id} was aborted and will be queued again")
+            status = REQUEUE_STATUS
+        except BaseException:
+            logger.exception(f"Build {build_id} failed")
+            status = 1
+        finally:
+            # Exit without running the parent's cleanup handlers
+            os._exit(status)
+
+
+def _raise_shutdown_imminent(signum, frame):
+    # As rq's HerokuWorker does in its work horses; run_build then
+    # logs that the build was aborted and raises RequeueJob
+    raise ShutDownImminentException("shut down imminent (signal: SIGTERM)")
+
+
+def benchmark_startup(runs=3):
+    """Compare how long a cold process and a warm fork take to be ready to build.
+
+    Returns mean durations in seconds as ``{"cold": ..., "warm": ...}``.
+    """
+    cold = []
+    for _ in range(runs):
+        start = time.monotonic()
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from metaci.build.warm import preimport; preimport()",
+            ],
+            check=True,
+        )
+        cold.append(time.monotonic() - start)
+
+    preimport()
+    db.connections.close_all()
+    warm = []
+    for _ in range(runs):
+        start = time.monotonic()
+        pid = os.fork()
+        if not pid:
+            preimport()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        warm.append(time.monotonic() - start)
+
+    return {"cold": statistics.mean(cold), "warm": statistics.mean(warm)}
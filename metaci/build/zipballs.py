@@ -0,0 +1,171 @@
+"""On-disk cache of repository zipballs.
+
+A single push often triggers builds of several plans for the same commit.
+Zipballs are cached per worker keyed by repository and commit sha, so
+those builds share one download from GitHub. The cache is shared between
+the build processes on a worker using file locks, and the least recently
+used archives are evicted when it grows beyond its size limit.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+
+from metaci.build.exceptions import BuildError
+
+# Only full commit shas are immutable; anything else (branch names,
+# abbreviated shas) is downloaded without caching.
+COMMIT_SHA_RE = re.compile(r"[0-9a-f]{40}")
+LOCK_STRIPES = 64
+PROGRESS_LOG_BYTES = 10 * 1024 * 1024
+
+
+def get_cache_dir():
+    cache_dir = settings.METACI_ZIPBALL_CACHE_DIR or os.path.join(
+        tempfile.gettempdir(), "metaci-zipballs"
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_zipball_path(repo, commit):
+    return os.path.join(get_cache_dir(), f"{repo.owner}-{repo.name}-{commit}.zip")
+
+
+@contextmanager
+def _lock(lock_name):
+    """Hold an exclusive lock shared by all processes using the cache."""
+    with open(os.path.join(get_cache_dir(), f".lock-{lock_name}"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _zipball_lock(path):
+    # Locks are striped over a fixed set of files
+    # so that lock files never need to be cleaned up.
+    stripe = int(hashlib.sha1(path.encode()).hexdigest(), 16) % LOCK_STRIPES
+    return _lock(stripe)
+
+
+class DownloadProgress:
+    """Wrap a file to log progress as a download is written to it."""
+
+    def __init__(self, f, logger):
+        self.f = f
+        self.name = getattr(f, "name", None)
+        self.logger = logger
+        self.size = 0
+        self.next_log_size = PROGRESS_LOG_BYTES
+
+    def write(self, data):
+        self.f.write(data)
+        self.size += len(data)
+        if self.size >= self.next_log_size:
+            self.logger.info(f"-- Downloaded {filesizeformat(self.size)}")
+            self.next_log_size += PROGRESS_LOG_BYTES
+
+
+def download_zipball(repo, commit, f, logger):
+    """Stream the zipball of a repository at a commit to a file object."""
+    gh = repo.get_github_api()
+    progress = DownloadProgress(f, logger)
+    if not gh.archive("zipball", progress, ref=commit):
+        raise BuildError(f"Could not download zipball of {repo} at {commit}")
+    logger.info(f"-- Downloaded zipball ({filesizeformat(progress.size)})")
+
+
+def open_zipball(repo, commit, logger):
+    """Return an open file containing the zipball of a repository at a commit.
+
+    The zipball is downloaded from GitHub unless it is already cached.
+    If another build is downloading the same zipball, this waits for it.
+    """
+    if not COMMIT_SHA_RE.fullmatch(commit):
+        f = tempfile.TemporaryFile()
+        download_zipball(repo, commit, f, logger)
+        f.seek(0)
+        return f
+
+    path = get_zipball_path(repo, commit)
+    with _zipball_lock(path):
+        if os.path.exists(path):
+            logger.info(f"-- Using cached zipball {path}")
+            # Mark as recently used
+            os.utime(path)
+        else:
+            logger.info(f"-- Downloading zipball of {repo} at {commit}")
+            with tempfile.NamedTemporaryFile(
+                dir=get_cache_dir(), suffix=".part", delete=False
+            ) as f:
+                try:
+                    download_zipball(repo, commit, f, logger)
+                except Exception:
+                    os.unlink(f.name)
+                    raise
+            os.replace(f.name, path)
+        # Once open, the file stays readable even if it is evicted.
+        f = open(path, "rb")
+
+    evict_zipballs(keep=path)
+    return f
+
+
+def evict_zipballs(keep=None):
+    """Delete the least recently used zipballs until the cache fits its size limit."""
+    max_size = settings.METACI_ZIPBALL_CACHE_MAX_SIZE_MB * 1024 * 1024
+    cache_dir = get_cache_dir()
+    with _lock("evict"):
+        zipballs = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".zip"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                zipballs.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in zipballs)
+        for _, size, path in sorted(zipballs):
+            if total_size <= max_size:
+                break
+            if path == keep:
+                continue
+            with _zipball_lock(path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+
+
+def list_zipball(f):
+    """Return the names of the entries in a zipball."""
+    with zipfile.ZipFile(f) as zip_file:
+        return zip_file.namelist()
+
+
+def extract_zipball(f, path, logger, members=None):
+    """Extract a zipball and log how many files it contained.
+
+    If members is given, only those entries are extracted.
+    """
+    if members is not None:
+        members = set(members)
+    with zipfile.ZipFile(f) as zip_file:
+        infos = [
+            info
+            for info in zip_file.infolist()
+            if members is None or info.filename in members
+        ]
+        zip_file.extractall(path, infos)
+    files = [info for info in infos if not info.is_dir()]
+    size = sum(info.file_size for info in files)
+    logger.info(f"-- Extracted {len(files)} files ({filesizeformat(size)})")
@@ -5,8 +5,23 @@ from metaci.cumulusci.models import Org, ScratchOrgInstance, Service
 
 @admin.register(Org)
 class OrgAdmin(admin.ModelAdmin):
-    list_display = ("name", "repo", "scratch")
-    list_filter = ("name", "scratch", "repo")
+    list_display = (
+        "name",
+        "repo",
+        "scratch",
+        "pool_size",
+        "pool_name",
+        "lock_holder",
+        "lock_waiters",
+        "utilization",
+    )
+    list_filter = ("name", "scratch", "pool_name", "repo")
+    readonly_fields = ("lock_holder", "lock_expires_in", "lock_waiters", "utilization")
+
+    @admin.display(description="Utilization (24h)")
+    def utilization(self, obj):
+        if not obj.scratch:
+            return f"{obj.get_utilization():.0%}"
 
 
 @admin.register(Service)
@@ -22,9 +37,10 @@ class ScratchOrgInstanceAdmin(admin.ModelAdmin):
         "sf_org_id",
         "username",
         "org_note",
+        "pooled",
         "deleted",
         "time_created",
         "time_deleted",
     )
-    list_filter = ("deleted", "org")
+    list_filter = ("deleted", "pooled", "org")
     raw_id_fields = ("build",)
@@ -0,0 +1,172 @@
+"""Dev Hubs that scratch orgs are created on.
+
+Each Dev Hub has its own limit on active scratch orgs, so spreading
+scratch orgs over several hubs raises how many builds can run at once.
+Hubs are configured in the METACI_DEV_HUBS setting as a list like::
+
+    [{"name": "hub-2", "username": "admin@hub2.example.com"}]
+
+Each hub may set its own "client_id" and "key" for JWT authentication;
+otherwise the SFDX_CLIENT_ID and SFDX_HUB_KEY settings are used. If no
+hubs are configured, the hub in SFDX_HUB_USERNAME is the only one.
+
+A hub may also set "class" to use another implementation, such as
+LocalDevHub, which stands in for a real Dev Hub in tests.
+"""
+import os
+import subprocess
+import tempfile
+from collections import namedtuple
+
+from cumulusci.core.utils import import_global
+from cumulusci.oauth.salesforce import jwt_session
+from django.conf import settings
+
+from metaci.build import capacity
+from metaci.cumulusci.models import ScratchOrgInstance, sf_session
+
+DEFAULT_DEV_HUB = "default"
+
+ActiveScratchOrgLimits = namedtuple("ActiveScratchOrgLimits", ["remaining", "max"])
+
+
+class DevHub:
+    """A Dev Hub org, accessed with JWT authentication."""
+
+    # Hubs that sfdx has been authorized to use in this process
+    _authorized = set()
+
+    def __init__(self, name, username=None, client_id=None, key=None):
+        self.name = name
+        self.username = username or settings.SFDX_HUB_USERNAME
+        self.client_id = client_id or settings.SFDX_CLIENT_ID
+        self.key = key or settings.SFDX_HUB_KEY
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
+
+    def get_session(self):
+        return sf_session(jwt_session(self.client_id, self.key, self.username))
+
+    def limits(self):
+        limits = self.get_session().limits()["ActiveScratchOrgs"]
+        return ActiveScratchOrgLimits(remaining=limits["Remaining"], max=limits["Max"])
+
+    def delete_scratch_org(self, sf_org_id):
+        """Delete a scratch org from the hub.
+
+        Returns False if the org didn't exist.
+        """
+        sf = self.get_session()
+        asos = sf.query(
+            f"SELECT ID FROM ActiveScratchOrg WHERE ScratchOrg='{sf_org_id}'"
+        )
+        if not asos["totalSize"]:
+            return False
+        sf.ActiveScratchOrg.delete(asos["records"][0]["Id"])
+        return True
+
+    def get_sfdx_username(self):
+        """Return the username sfdx should create scratch orgs with.
+
+        None means sfdx's default Dev Hub, which is the hub in SFDX_HUB_USERNAME.
+        """
+        if self.username == settings.SFDX_HUB_USERNAME:
+            return None
+        if self.username not in self._authorized:
+            self.authorize_sfdx()
+            self._authorized.add(self.username)
+        return self.username
+
+    def authorize_scratch_org(self, username, instance_url):
+        """Let sfdx use a scratch org created on this hub by another process."""
+        self.authorize_sfdx(username, instance_url)
+
+    def authorize_sfdx(self, username=None, instance_url=None):
+        with tempfile.NamedTemporaryFile("w", suffix=".key", delete=False) as f:
+            f.write(self.key)
+        args = [
+            "sfdx",
+            "force:auth:jwt:grant",
+            "-u",
+            username or self.username,
+            "-f",
+            f.name,
+            "-i",
+            self.client_id,
+        ]
+        if instance_url:
+            args += ["-r", instance_url]
+        try:
+            subprocess.run(args, check=True, capture_output=True)
+        finally:
+            os.unlink(f.name)
+
+
+class LocalDevHub(DevHub):
+    """A stand-in for a Dev Hub, which counts the scratch orgs MetaCI has on it.
+
+    It can't create scratch orgs, so builds using it must not create them.
+    """
+
+    def __init__(self, name, max_orgs=100, **kwargs):
+        super().__init__(name, **kwargs)
+        self.max_orgs = max_orgs
+
+    def limits(self):
+        active = ScratchOrgInstance.objects.filter(
+            dev_hub=self.name, deleted=False
+        ).count()
+        return ActiveScratchOrgLimits(
+            remaining=self.max_orgs - active, max=self.max_orgs
+        )
+
+    def delete_scratch_org(self, sf_org_id):
+        return True
+
+    def get_sfdx_username(self):
+        return self.username
+
+    def authorize_scratch_org(self, username, instance_url):
+        pass
+
+
+def get_dev_hubs():
+    configs = settings.METACI_DEV_HUBS or [{"name": DEFAULT_DEV_HUB}]
+    hubs = []
+    for config in configs:
+        config = dict(config)
+        hub_class = import_global(
+            config.pop("class", "metaci.cumulusci.devhubs.DevHub")
+        )
+        hubs.append(hub_class(**config))
+    return hubs
+
+
+def get_dev_hub(name=None):
+    """Return the Dev Hub with a name.
+
+    Scratch orgs created before hubs were configured have no hub name;
+    they are on the first configured hub.
+    """
+    hubs = get_dev_hubs()
+    for hub in hubs:
+        if hub.name == name:
+            return hub
+    if name is None:
+        return hubs[0]
+    raise KeyError(f"Dev Hub {name} is not configured")
+
+
+def get_dev_hub_for_build(build_id):
+    """Return the Dev Hub to create a build's scratch org on.
+
+    That is the hub the build reserved capacity on,
+    or else the hub with the most room.
+    """
+    hubs = get_dev_hubs()
+    reserved = capacity.get_reserved_hub(build_id, [hub.name for hub in hubs])
+    for hub in hubs:
+        if hub.name == reserved:
+            return hub
+    return max(hubs, key=lambda hub: capacity.get_headroom(hub.name) or 0)
@@ -1,12 +1,19 @@
+import logging
+
 from cumulusci.core.config import OrgConfig, ScratchOrgConfig, ServiceConfig
-from cumulusci.core.exceptions import ServiceNotConfigured
+from cumulusci.core.exceptions import OrgNotFound, ServiceNotConfigured
 from cumulusci.core.keychain import BaseProjectKeychain
 from django.conf import settings
 from django.utils import timezone
 
-from metaci.cumulusci.logger import init_logger
+from metaci.build import capacity
+from metaci.cumulusci import pool
+from metaci.cumulusci.devhubs import get_dev_hub, get_dev_hub_for_build
 from metaci.cumulusci.models import Org, ScratchOrgInstance, Service
 
+# Build.get_org sets this up to write to the build's log
+logger = logging.getLogger("cumulusci")
+
 
 class MetaCIProjectKeychain(BaseProjectKeychain):
     def __init__(self, project_config, key, build):
@@ -45,10 +52,19 @@ class MetaCIProjectKeychain(BaseProjectKeychain):
         raise NotImplementedError("set_default_org is not supported in this keychain")
 
     def get_org(self, org_name):
-        org = Org.objects.get(repo=self.build.repo, name=org_name)
+        org = self._get_org_model(org_name)
         org_config = org.json
 
+        if org.scratch and org.pool_size:
+            config = self._claim_pooled_org(org)
+            if config is not None:
+                return config
+
         if org.scratch:
+            dev_hub = get_dev_hub_for_build(self.build.id)
+            devhub_username = dev_hub.get_sfdx_username()
+            if devhub_username:
+                org_config = {**org_config, "devhub": devhub_username}
             config = ScratchOrgConfig(org_config, org.name, keychain=self)
         else:
             config = OrgConfig(org_config, org.name, keychain=self)
@@ -59,18 +75,59 @@ class MetaCIProjectKeychain(BaseProjectKeychain):
 
         # Initialize the scratch org instance
         if org.scratch:
-            config = self._init_scratch_org(config)
+            config = self._init_scratch_org(config, dev_hub)
+
+        return config
+
+    def _get_org_model(self, org_name):
+        """Find the org with a name, or else the org in the pool with that name
+        that the build holds the lock on.
+
+        check_queued_build leases an org from the pool and records it as the
+        build's org before the build runs, and run_build renews and releases
+        that lease, so any other org in the pool can't be used safely.
+        """
+        try:
+            return Org.objects.get(repo=self.build.repo, name=org_name)
+        except Org.DoesNotExist:
+            orgs = list(Org.objects.for_org_name(self.build.repo, org_name))
+            if not orgs:
+                raise
+        if self.build.org in orgs:
+            return self.build.org
+        raise OrgNotFound(f"The build has not leased an org from the pool {org_name}")
+
+    def _claim_pooled_org(self, org):
+        """Use a ready org from the org's pool, if it has one
+        created from the same definition as this build's."""
+        from metaci.build.tasks import release_scratch_org_reservation
 
+        try:
+            definition_hash = pool.read_definition_hash(org)
+        except OSError:
+            return None
+        instance = pool.claim_org(org, self.build, definition_hash)
+        if instance is None:
+            return None
+
+        logger.info(f"Using scratch org {instance} from the pool")
+        get_dev_hub(instance.dev_hub).authorize_scratch_org(
+            instance.username, instance.json.get("instance_url")
+        )
+        config = ScratchOrgConfig(
+            instance.get_org_config().config, org.name, keychain=self
+        )
+        config.org = org
+        config.org_instance = instance
+        # The pool org already counts against the Dev Hub
+        release_scratch_org_reservation(self.build.id)
         return config
 
-    def _init_scratch_org(self, org_config):
+    def _init_scratch_org(self, org_config, dev_hub):
         if not org_config.scratch:
             # Only run against scratch orgs
             return
 
-        # Set up the logger to output to the build.log field
-        init_logger(self.build)
-
         # Create the scratch org and get its info
         info = org_config.scratch_info
 
@@ -79,6 +136,7 @@ class MetaCIProjectKeychain(BaseProjectKeychain):
             org=org_config.org,
             build=self.build,
             sf_org_id=info["org_id"],
+            dev_hub=dev_hub.name,
             username=info["username"],
             json=org_config.config,
             expiration_date=timezone.make_aware(org_config.expires, timezone.utc),
@@ -86,6 +144,7 @@ class MetaCIProjectKeychain(BaseProjectKeychain):
         )
         instance.save()
         org_config.org_instance = instance
+        capacity.org_created(dev_hub.name, self.build.id)
 
         return org_config
 
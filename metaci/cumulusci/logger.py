@@ -4,35 +4,45 @@
 
 import datetime
 import logging
+import threading
 
 import coloredlogs
 from django.utils import timezone
 
 from metaci.cumulusci.exceptions import LoggerException
 
+# Shared by all streams, since several streams may append to the same model.
+LOG_STREAM_LOCK = threading.RLock()
+
 
 class LogStream(object):
-    """File-like interface to Django model."""
+    """File-like interface to Django model.
+
+    Output is buffered and appended to the model's log as a new chunk
+    at most once a second, so a flush never rewrites the existing log.
+    It may be written from several threads.
+    """
 
     def __init__(self, model):
-        if not hasattr(model, "log"):
-            raise LoggerException('Model does not have "log" attribute.')
+        if not hasattr(model, "append_log"):
+            raise LoggerException('Model does not have "append_log" method.')
         self.model = model
         self.buffer = ""
         self.last_save_time = timezone.now()
 
     def flush(self, force=False):
-        if self.model.log is None:
-            self.model.log = u""
-        self.model.log += self.buffer
-        self.buffer = ""
         now = timezone.now()
-        if force or now - self.last_save_time > datetime.timedelta(seconds=1):
-            self.model.save()
-            self.last_save_time = now
+        with LOG_STREAM_LOCK:
+            if not self.buffer:
+                return
+            if force or now - self.last_save_time > datetime.timedelta(seconds=1):
+                self.model.append_log(self.buffer)
+                self.buffer = ""
+                self.last_save_time = now
 
     def write(self, s):
-        self.buffer += s
+        with LOG_STREAM_LOCK:
+            self.buffer += s
 
 
 class LogHandler(logging.StreamHandler):
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cumulusci", "0015_json_encoder"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scratchorginstance",
+            name="dev_hub",
+            field=models.CharField(
+                blank=True,
+                help_text="The Dev Hub the org was created on.",
+                max_length=255,
+                null=True,
+            ),
+        ),
+    ]
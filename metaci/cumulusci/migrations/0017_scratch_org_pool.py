@@ -0,0 +1,39 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cumulusci", "0016_scratchorginstance_dev_hub"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="org",
+            name="pool_size",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="For scratch orgs, the most orgs to keep created ahead of builds. The pool shrinks when there are fewer builds.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="scratchorginstance",
+            name="pool_definition",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the org definition a pooled org was created from.",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="scratchorginstance",
+            name="pooled",
+            field=models.BooleanField(
+                default=False,
+                help_text="The org is in a pool, ready for a build to claim.",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cumulusci", "0017_scratch_org_pool"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="org",
+            name="pool_name",
+            field=models.CharField(
+                blank=True,
+                help_text="For persistent orgs, the name of a pool of interchangeable orgs. Builds of plans with this org name run on whichever org in the pool is free.",
+                max_length=255,
+                null=True,
+            ),
+        ),
+    ]
@@ -1,8 +1,9 @@
+from datetime import timedelta
+
 from cumulusci.core.config import OrgConfig, ScratchOrgConfig
 from cumulusci.oauth.salesforce import jwt_session
 from django.apps import apps
 from django.conf import settings
-from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.http import Http404
@@ -12,6 +13,8 @@ from django.utils.dateparse import parse_datetime
 from simple_salesforce import Salesforce as SimpleSalesforce
 from simple_salesforce.exceptions import SalesforceError
 
+from metaci.build import locks
+
 from ..fields import EncryptedJSONField
 
 
@@ -36,11 +39,27 @@ class OrgQuerySet(models.QuerySet):
         q = models.Q()
         for plan_org in planrepos:
             q.add(
-                models.Q(name=plan_org["plan__org"], repo_id=plan_org["repo"]),
+                models.Q(name=plan_org["plan__org"], repo_id=plan_org["repo"])
+                | models.Q(
+                    pool_name=plan_org["plan__org"],
+                    scratch=False,
+                    repo_id=plan_org["repo"],
+                ),
                 models.Q.OR,
             )
         return self.filter(q)
 
+    def for_org_name(self, repo, name):
+        """Return the orgs a build of a plan with an org name may use.
+
+        That is the org with the name, or the persistent orgs in a pool
+        with the name, which are interchangeable.
+        """
+        return self.filter(
+            models.Q(name=name) | models.Q(pool_name=name, scratch=False),
+            repo=repo,
+        ).order_by("name")
+
     def get_for_user_or_404(self, user, query, perms=None):
         try:
             return self.for_user(user, perms).get(**query)
@@ -61,6 +80,18 @@ class Org(models.Model):
     repo = models.ForeignKey(
         "repository.Repository", related_name="orgs", on_delete=models.CASCADE
     )
+    pool_size = models.PositiveIntegerField(
+        default=0,
+        help_text="For scratch orgs, the most orgs to keep created ahead of builds. "
+        "The pool shrinks when there are fewer builds.",
+    )
+    pool_name = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="For persistent orgs, the name of a pool of interchangeable orgs. "
+        "Builds of plans with this org name run on whichever org in the pool is free.",
+    )
 
     objects = OrgQuerySet.as_manager()
 
@@ -84,15 +115,56 @@ class Org(models.Model):
     @property
     def is_locked(self):
         if not self.scratch:
-            return True if cache.get(self.lock_id) else False
+            return True if self.lock_holder else False
+
+    @property
+    def lock_holder(self):
+        if not self.scratch:
+            return locks.get_holder(self.lock_id)
+
+    @property
+    def lock_expires_in(self):
+        """Seconds until the lock's lease runs out, if the org is locked."""
+        if not self.scratch:
+            return locks.get_ttl(self.lock_id)
+
+    @property
+    def lock_waiters(self):
+        """Ids of the builds waiting for the lock, in order."""
+        if not self.scratch:
+            return locks.get_waiters(self.lock_id)
+
+    def get_utilization(self, hours=24):
+        """Return the fraction of the last hours that builds were running on the org."""
+        now = timezone.now()
+        since = now - timedelta(hours=hours)
+        busy = timedelta()
+        for model, org_field in (
+            ("build.Build", "org"),
+            ("build.Rebuild", "build__org"),
+        ):
+            runs = (
+                apps.get_model(model)
+                .objects.filter(**{org_field: self, "time_start__lt": now})
+                .filter(
+                    models.Q(time_end__gt=since)
+                    | models.Q(time_end__isnull=True, status="running")
+                )
+                .values_list("time_start", "time_end")
+            )
+            for time_start, time_end in runs:
+                busy += min(time_end or now, now) - max(time_start, since)
+        return min(busy / (now - since), 1.0)
 
     def lock(self):
         if not self.scratch:
-            cache.add(self.lock_id, "manually locked", timeout=None)
+            locks.acquire(self.lock_id, "manually locked")
 
     def unlock(self):
         if not self.scratch:
-            cache.delete(self.lock_id)
+            from metaci.build.tasks import release_org_lock
+
+            release_org_lock(self.lock_id)
 
 
 class ActiveOrgManager(models.Manager):
@@ -129,6 +201,21 @@ class ScratchOrgInstance(models.Model):
     org_note = models.CharField(max_length=255, default="", blank=True, null=True)
     username = models.CharField(max_length=255)
     sf_org_id = models.CharField(max_length=32)
+    dev_hub = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="The Dev Hub the org was created on.",
+    )
+    pooled = models.BooleanField(
+        default=False, help_text="The org is in a pool, ready for a build to claim."
+    )
+    pool_definition = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Hash of the org definition a pooled org was created from.",
+    )
     deleted = models.BooleanField(default=False)
     delete_error = models.TextField(null=True, blank=True)
     json = EncryptedJSONField(encoder=DjangoJSONEncoder)
@@ -170,36 +257,39 @@ class ScratchOrgInstance(models.Model):
         return ScratchOrgConfig(org_config, self.org.name)
 
     def get_jwt_based_session(self):
+        """Log in to the org with the connected app of the Dev Hub it is on.
+
+        Raises KeyError if that Dev Hub is no longer configured.
+        """
+        from metaci.cumulusci.devhubs import get_dev_hub
+
+        dev_hub = get_dev_hub(self.dev_hub)
         config = self.json
         return jwt_session(
-            settings.SFDX_CLIENT_ID,
-            settings.SFDX_HUB_KEY,
+            dev_hub.client_id,
+            dev_hub.key,
             self.username,
             url=config.get("instance_url") or settings.SF_SANDBOX_LOGIN_URL,
             auth_url=settings.SF_SANDBOX_LOGIN_URL,
         )
 
     def delete_org(self, org_config=None):
+        from metaci.build.tasks import release_scratch_org_capacity
+        from metaci.cumulusci.devhubs import get_dev_hub
+
         if org_config is None:
             org_config = self.get_org_config()
 
         try:
-            # connect to SFDX Hub
-            sfjwt = jwt_session(
-                settings.SFDX_CLIENT_ID,
-                settings.SFDX_HUB_KEY,
-                settings.SFDX_HUB_USERNAME,
-            )
-            sf = sf_session(sfjwt)
-            # query ActiveScratchOrg via OrgId
-            asos = sf.query(
-                f"SELECT ID FROM ActiveScratchOrg WHERE ScratchOrg='{self.sf_org_id}'"
-            )
-            if asos["totalSize"] > 0:
-                aso = asos["records"][0]["Id"]
-                # delete ActiveScratchOrg
-                sf.ActiveScratchOrg.delete(aso)
-            else:
+            dev_hub = get_dev_hub(self.dev_hub)
+        except KeyError as e:
+            # The hub was removed from METACI_DEV_HUBS
+            self.delete_error = e.args[0]
+            self.save()
+            return
+
+        try:
+            if not dev_hub.delete_scratch_org(self.sf_org_id):
                 self.delete_error = "Org did not exist when deleted."
         except SalesforceError as e:
             self.delete_error = str(e)
@@ -211,6 +301,8 @@ class ScratchOrgInstance(models.Model):
         self.deleted = True
         self.save()
 
+        release_scratch_org_capacity(dev_hub)
+
 
 class Service(models.Model):
     name = models.CharField(max_length=255)
@@ -0,0 +1,199 @@
+"""Pools of scratch orgs created ahead of builds.
+
+Creating a scratch org takes minutes, so for orgs with a pool_size,
+scratch orgs are created from the org definition on the repository's
+default branch before builds need them. A build whose org definition
+matches claims a ready org from the pool instead of creating one;
+otherwise it creates its org as usual.
+
+A pool is only filled to the number of builds expected to need an org
+in the time it takes to fill it, based on recent builds, so it shrinks
+when there are fewer builds. Pooled orgs that would expire too soon,
+were created from an outdated definition or are no longer needed are
+deleted like any other scratch org.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from cumulusci.core.config import ScratchOrgConfig
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from metaci.build import capacity
+from metaci.build.zipballs import extract_zipball, list_zipball, open_zipball
+from metaci.cumulusci.models import ScratchOrgInstance
+
+logger = logging.getLogger(__name__)
+
+CREATING_KEY = "metaci:scratch-org-pool:{}:creating"
+# Creations that haven't finished in this long are assumed to have died
+CREATION_TIMEOUT = 7200
+POOLED_ORG_NOTE = "Pooled"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def get_definition_hash(org, definition):
+    """Hash an org's config together with the contents of its definition file."""
+    digest = hashlib.sha256(json.dumps(org.json, sort_keys=True).encode())
+    digest.update(definition)
+    return digest.hexdigest()
+
+
+def read_definition_hash(org):
+    """Hash the org definition in the current directory (a build's checkout)."""
+    with open(org.json["config_file"], "rb") as f:
+        return get_definition_hash(org, f.read())
+
+
+def get_default_definition(org):
+    """Return the head commit of the repository's default branch
+    and the hash of the org definition at that commit."""
+    gh_repo = org.repo.get_github_api()
+    commit = gh_repo.branch(gh_repo.default_branch).commit.sha
+    contents = gh_repo.file_contents(org.json["config_file"], ref=commit)
+    return commit, get_definition_hash(org, contents.decoded)
+
+
+def get_min_expiration():
+    """Pooled orgs must be usable until at least this time to be claimed."""
+    return timezone.now() + timedelta(
+        seconds=settings.METACI_SCRATCH_ORG_POOL_MIN_LIFETIME
+    )
+
+
+def ready_orgs(org):
+    return ScratchOrgInstance.objects.filter(org=org, pooled=True, deleted=False)
+
+
+def claim_org(org, build, definition_hash):
+    """Take a ready org matching a definition out of the pool for a build.
+
+    Returns None if there is none. Orgs that expire soonest are claimed first.
+    """
+    with transaction.atomic():
+        instance = (
+            ready_orgs(org)
+            .filter(
+                pool_definition=definition_hash,
+                expiration_date__gt=get_min_expiration(),
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("expiration_date")
+            .first()
+        )
+        if instance is None:
+            return None
+        instance.pooled = False
+        instance.build = build
+        instance.org_note = build.org_note
+        instance.save()
+    return instance
+
+
+def get_target_size(org):
+    """Return how many ready orgs an org's pool should have.
+
+    That is the number of builds of the org expected to start while
+    a pool org is being created, at the rate builds were queued recently,
+    up to the org's pool_size.
+    """
+    if not org.pool_size:
+        return 0
+    Build = apps.get_model("build", "Build")
+    window = settings.METACI_SCRATCH_ORG_POOL_DEMAND_WINDOW
+    demand = Build.objects.filter(
+        repo_id=org.repo_id,
+        plan__org=org.name,
+        time_queue__gte=timezone.now() - timedelta(seconds=window),
+    ).count()
+    expected = math.ceil(demand * settings.METACI_SCRATCH_ORG_POOL_LEAD_TIME / window)
+    return min(org.pool_size, expected)
+
+
+def get_surplus_orgs(org, definition_hash, target_size):
+    """Return the ready orgs that should be recycled, and how many remain.
+
+    Orgs are recycled if they would expire too soon to be claimed,
+    were created from another definition, or are more than the pool needs.
+    """
+    orgs = ready_orgs(org)
+    usable = orgs.filter(
+        pool_definition=definition_hash, expiration_date__gt=get_min_expiration()
+    ).order_by("-expiration_date")
+    keep = list(usable.values_list("id", flat=True)[:target_size])
+    surplus = list(orgs.exclude(id__in=keep).values_list("id", flat=True))
+    return surplus, len(keep)
+
+
+def start_creation(org, token):
+    _redis().zadd(CREATING_KEY.format(org.id), {token: time.time()})
+
+
+def finish_creation(org, token):
+    _redis().zrem(CREATING_KEY.format(org.id), token)
+
+
+def count_creations(org):
+    """Return how many pool orgs are being created for an org."""
+    key = CREATING_KEY.format(org.id)
+    redis = _redis()
+    redis.zremrangebyscore(key, 0, time.time() - CREATION_TIMEOUT)
+    return redis.zcard(key)
+
+
+def create_org(org, commit, definition_hash, dev_hub, token):
+    """Create a ready org in an org's pool from the definition at a commit.
+
+    token is the id capacity was reserved on the Dev Hub with.
+    """
+    root_dir = os.getcwd()
+    build_dir = tempfile.mkdtemp()
+    try:
+        zip_content = open_zipball(org.repo, commit, logger)
+        with zip_content:
+            names = list_zipball(zip_content)
+            # assume the zipfile has a single child dir with the repo
+            root = names[0].split("/")[0]
+            setup_files = [
+                f"{root}/{name}"
+                for name in ("sfdx-project.json", org.json["config_file"])
+            ]
+            extract_zipball(zip_content, build_dir, logger, members=setup_files)
+        os.chdir(os.path.join(build_dir, root))
+
+        org_config = dict(org.json)
+        devhub_username = dev_hub.get_sfdx_username()
+        if devhub_username:
+            org_config["devhub"] = devhub_username
+        config = ScratchOrgConfig(org_config, org.name)
+        info = config.scratch_info
+    finally:
+        os.chdir(root_dir)
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    instance = ScratchOrgInstance.objects.create(
+        org=org,
+        sf_org_id=info["org_id"],
+        dev_hub=dev_hub.name,
+        username=info["username"],
+        json=config.config,
+        expiration_date=timezone.make_aware(config.expires, timezone.utc),
+        org_note=POOLED_ORG_NOTE,
+        pooled=True,
+        pool_definition=definition_hash,
+    )
+    capacity.org_created(dev_hub.name, token)
+    return instance
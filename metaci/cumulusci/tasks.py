@@ -1,8 +1,13 @@
+import uuid
+
 from django import db
+from django.db.models import Q
 from django.utils import timezone
 from django_rq import job
 
-from metaci.cumulusci.models import ScratchOrgInstance
+from metaci.cumulusci import pool
+from metaci.cumulusci.devhubs import get_dev_hub
+from metaci.cumulusci.models import Org, ScratchOrgInstance
 
 
 @job("short")
@@ -19,3 +24,86 @@ def prune_orgs():
         deleted=True, time_deleted=timezone.now(), delete_error="Org is expired."
     )
     return f"pruned {count} orgs"
+
+
+@job("short")
+def fill_scratch_org_pools():
+    """An RQ task to keep the scratch org pools at their target sizes.
+
+    Surplus ready orgs are deleted, and pool orgs are created
+    in the background to make up any shortfall.
+    """
+    db.connection.close()
+    results = []
+    orgs = Org.objects.filter(
+        Q(pool_size__gt=0) | Q(instances__pooled=True, instances__deleted=False),
+        scratch=True,
+    ).distinct()
+    for org in orgs:
+        try:
+            results.append(f"{org}: {fill_scratch_org_pool(org)}")
+        except Exception as e:
+            results.append(f"{org}: failed: {e}")
+    return "; ".join(results) or "No scratch org pools"
+
+
+def fill_scratch_org_pool(org):
+    from metaci.build.tasks import delete_scratch_org
+
+    target_size = pool.get_target_size(org)
+    if target_size:
+        commit, definition_hash = pool.get_default_definition(org)
+    else:
+        commit = definition_hash = None
+    surplus, ready = pool.get_surplus_orgs(org, definition_hash, target_size)
+
+    recycled = 0
+    for instance_id in surplus:
+        # Only recycle orgs that no build has claimed in the meantime
+        if ScratchOrgInstance.objects.filter(id=instance_id, pooled=True).update(
+            pooled=False
+        ):
+            delete_scratch_org.delay(instance_id)
+            recycled += 1
+
+    creating = pool.count_creations(org)
+    created = max(0, target_size - ready - creating)
+    for _ in range(created):
+        token = f"pool-{org.id}-{uuid.uuid4().hex}"
+        pool.start_creation(org, token)
+        create_pool_org.delay(org.id, commit, definition_hash, token)
+
+    return (
+        f"{ready} of {target_size} orgs ready, {creating} being created; "
+        f"creating {created}, recycled {recycled}"
+    )
+
+
+@job("pool")
+def create_pool_org(org_id, commit, definition_hash, token):
+    """An RQ task to create a ready org in an org's pool.
+
+    It runs on its own queue, so that pool orgs are not created on the
+    build workers, which the scheduler hands out to builds.
+
+    token identifies this creation until it is finished, and is also
+    the id Dev Hub capacity is reserved with.
+    """
+    from metaci.build.tasks import release_scratch_org_reservation, reserve_scratch_org
+
+    db.connection.close()
+    org = Org.objects.get(id=org_id)
+    try:
+        hub_name = reserve_scratch_org(token)
+        if hub_name is None:
+            return "No Dev Hub has room for a pool org"
+        try:
+            instance = pool.create_org(
+                org, commit, definition_hash, get_dev_hub(hub_name), token
+            )
+        finally:
+            # No-op if the org was created
+            release_scratch_org_reservation(token)
+    finally:
+        pool.finish_creation(org, token)
+    return f"Created pool org {instance} for {org}"
@@ -0,0 +1,125 @@
+from unittest import mock
+
+import pytest
+
+from metaci.conftest import ScratchOrgInstanceFactory
+from metaci.cumulusci.devhubs import (
+    DevHub,
+    LocalDevHub,
+    get_dev_hub,
+    get_dev_hub_for_build,
+    get_dev_hubs,
+)
+
+HUBS = [
+    {"name": "one", "class": "metaci.cumulusci.devhubs.LocalDevHub", "max_orgs": 2},
+    {"name": "two", "class": "metaci.cumulusci.devhubs.LocalDevHub", "max_orgs": 5},
+]
+
+
+def test_get_dev_hubs__default(settings):
+    settings.METACI_DEV_HUBS = []
+    settings.SFDX_HUB_USERNAME = "hub@example.com"
+
+    (hub,) = get_dev_hubs()
+
+    assert isinstance(hub, DevHub)
+    assert hub.name == "default"
+    assert hub.username == "hub@example.com"
+    assert hub.get_sfdx_username() is None
+
+
+def test_get_dev_hub(settings):
+    settings.METACI_DEV_HUBS = HUBS
+
+    assert get_dev_hub("two").name == "two"
+    assert get_dev_hub(None).name == "one"
+    with pytest.raises(KeyError):
+        get_dev_hub("three")
+
+
+@mock.patch("metaci.cumulusci.devhubs.subprocess.run")
+def test_get_sfdx_username__authorizes_other_hubs(run, settings):
+    settings.SFDX_HUB_USERNAME = "hub@example.com"
+    hub = DevHub("other", username="other@example.com", client_id="id", key="key")
+
+    assert hub.get_sfdx_username() == "other@example.com"
+    assert hub.get_sfdx_username() == "other@example.com"
+
+    run.assert_called_once()
+    assert run.call_args[0][0][:4] == [
+        "sfdx",
+        "force:auth:jwt:grant",
+        "-u",
+        "other@example.com",
+    ]
+
+
+@pytest.mark.django_db
+def test_local_dev_hub__limits():
+    ScratchOrgInstanceFactory(dev_hub="local")
+    ScratchOrgInstanceFactory(dev_hub="local", deleted=True)
+    ScratchOrgInstanceFactory(dev_hub="other")
+
+    limits = LocalDevHub("local", max_orgs=3).limits()
+
+    assert limits.remaining == 2
+    assert limits.max == 3
+
+
+@mock.patch("metaci.cumulusci.devhubs.capacity")
+def test_get_dev_hub_for_build(capacity, settings):
+    settings.METACI_DEV_HUBS = HUBS
+    capacity.get_reserved_hub.return_value = "one"
+
+    assert get_dev_hub_for_build(1).name == "one"
+
+    capacity.get_reserved_hub.return_value = None
+    capacity.get_headroom.side_effect = lambda hub: {"one": 2, "two": 4}[hub]
+
+    assert get_dev_hub_for_build(1).name == "two"
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.release_scratch_org_capacity")
+def test_scratch_org_instance__delete_org(release_scratch_org_capacity, settings):
+    settings.METACI_DEV_HUBS = HUBS
+    instance = ScratchOrgInstanceFactory(dev_hub="two")
+
+    with mock.patch.object(
+        LocalDevHub, "delete_scratch_org", return_value=True
+    ) as delete_scratch_org:
+        instance.delete_org(org_config=mock.Mock())
+
+    delete_scratch_org.assert_called_once_with(instance.sf_org_id)
+    assert instance.deleted
+    assert release_scratch_org_capacity.call_args[0][0].name == "two"
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.release_scratch_org_capacity")
+def test_scratch_org_instance__delete_org__hub_not_configured(
+    release_scratch_org_capacity, settings
+):
+    settings.METACI_DEV_HUBS = HUBS
+    instance = ScratchOrgInstanceFactory(dev_hub="removed")
+
+    instance.delete_org(org_config=mock.Mock())
+
+    instance.refresh_from_db()
+    assert not instance.deleted
+    assert instance.delete_error == "Dev Hub removed is not configured"
+    release_scratch_org_capacity.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.cumulusci.models.jwt_session")
+def test_scratch_org_instance__get_jwt_based_session(jwt_session, settings):
+    settings.METACI_DEV_HUBS = [
+        {"name": "two", "username": "hub@example.com", "client_id": "id", "key": "key"}
+    ]
+    instance = ScratchOrgInstanceFactory(dev_hub="two")
+
+    instance.get_jwt_based_session()
+
+    assert jwt_session.call_args[0] == ("id", "key", instance.username)
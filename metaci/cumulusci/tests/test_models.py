@@ -0,0 +1,70 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from cumulusci.core.exceptions import OrgNotFound
+from django.utils import timezone
+from guardian.shortcuts import assign_perm
+
+from metaci.conftest import (
+    BuildFactory,
+    OrgFactory,
+    PlanRepositoryFactory,
+    RepositoryFactory,
+)
+from metaci.cumulusci.keychain import MetaCIProjectKeychain
+from metaci.cumulusci.models import Org
+
+
+@pytest.mark.django_db
+def test_for_org_name():
+    repo = RepositoryFactory()
+    single = OrgFactory(repo=repo, name="single")
+    members = [OrgFactory(repo=repo, name=name, pool_name="pool") for name in "ba"]
+    OrgFactory(repo=repo, name="scratch", pool_name="pool", scratch=True)
+    OrgFactory(name="other", pool_name="pool")
+
+    assert list(Org.objects.for_org_name(repo, "single")) == [single]
+    assert list(Org.objects.for_org_name(repo, "pool")) == members[::-1]
+
+
+@pytest.mark.django_db
+def test_for_user__pool(user):
+    planrepo = PlanRepositoryFactory(plan__org="pool")
+    assign_perm("plan.org_login", user, planrepo)
+    member = OrgFactory(repo=planrepo.repo, name="a", pool_name="pool")
+    OrgFactory(repo=planrepo.repo, name="b")
+    OrgFactory(name="c", pool_name="pool")
+
+    assert list(Org.objects.for_user(user)) == [member]
+
+
+@pytest.mark.django_db
+@mock.patch.object(MetaCIProjectKeychain, "_load_keychain", mock.Mock())
+def test_keychain_get_org__pool():
+    build = BuildFactory(planrepo__plan__org="pool")
+    leased, other = [
+        OrgFactory(repo=build.repo, name=name, pool_name="pool") for name in "ab"
+    ]
+    keychain = MetaCIProjectKeychain(mock.Mock(), None, build)
+
+    with pytest.raises(OrgNotFound):
+        keychain._get_org_model("pool")
+
+    build.org = leased
+    assert keychain._get_org_model("pool") == leased
+
+
+@pytest.mark.django_db
+def test_get_utilization():
+    now = timezone.now()
+    org = OrgFactory()
+    BuildFactory(
+        org=org,
+        status="success",
+        time_start=now - timedelta(hours=30),
+        time_end=now - timedelta(hours=21),
+    )
+    BuildFactory(org=org, status="running", time_start=now - timedelta(hours=3))
+
+    assert org.get_utilization() == pytest.approx(0.25, abs=0.01)
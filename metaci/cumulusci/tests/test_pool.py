@@ -0,0 +1,122 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from metaci.conftest import BuildFactory, OrgFactory, ScratchOrgInstanceFactory
+from metaci.cumulusci import pool
+from metaci.cumulusci.keychain import MetaCIProjectKeychain
+from metaci.cumulusci.tasks import fill_scratch_org_pool
+
+ORG_JSON = {"config_file": "orgs/dev.json"}
+
+
+def pooled_org(org, definition_hash="def", hours=20, **kwargs):
+    return ScratchOrgInstanceFactory(
+        org=org,
+        pooled=True,
+        pool_definition=definition_hash,
+        dev_hub="local",
+        username="pooled@example.com",
+        expiration_date=timezone.now() + timedelta(hours=hours),
+        **kwargs,
+    )
+
+
+@pytest.mark.django_db
+def test_claim_org():
+    org = OrgFactory(scratch=True, pool_size=2)
+    later = pooled_org(org, hours=20)
+    sooner = pooled_org(org, hours=10)
+    pooled_org(org, hours=1)  # expires too soon
+    pooled_org(org, definition_hash="other")
+    build = BuildFactory(status="running", org_note="note")
+
+    assert pool.claim_org(org, build, "def") == sooner
+    assert pool.claim_org(org, build, "def") == later
+    assert pool.claim_org(org, build, "def") is None
+
+    sooner.refresh_from_db()
+    assert not sooner.pooled
+    assert sooner.build == build
+    assert sooner.org_note == "note"
+
+
+@pytest.mark.django_db
+def test_get_target_size(settings):
+    settings.METACI_SCRATCH_ORG_POOL_DEMAND_WINDOW = 3600
+    settings.METACI_SCRATCH_ORG_POOL_LEAD_TIME = 900
+    build = BuildFactory(status="queued", planrepo__plan__org="dev")
+    org = OrgFactory(repo=build.repo, name="dev", scratch=True, pool_size=2)
+
+    assert pool.get_target_size(org) == 1
+
+    for _ in range(8):
+        BuildFactory(status="queued", planrepo=build.planrepo)
+    assert pool.get_target_size(org) == 2
+
+    org.pool_size = 0
+    assert pool.get_target_size(org) == 0
+
+
+@pytest.mark.django_db
+def test_get_surplus_orgs():
+    org = OrgFactory(scratch=True, pool_size=2)
+    stale = pooled_org(org, definition_hash="old")
+    expiring = pooled_org(org, hours=1)
+    newest = pooled_org(org, hours=20)
+    excess = pooled_org(org, hours=10)
+
+    surplus, ready = pool.get_surplus_orgs(org, "def", 1)
+
+    assert set(surplus) == {stale.id, expiring.id, excess.id}
+    assert ready == 1
+    assert newest.id not in surplus
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.cumulusci.tasks.create_pool_org")
+@mock.patch("metaci.build.tasks.delete_scratch_org")
+@mock.patch("metaci.cumulusci.tasks.pool")
+def test_fill_scratch_org_pool(pool_mock, delete_scratch_org, create_pool_org):
+    org = OrgFactory(scratch=True, pool_size=4)
+    recycled = pooled_org(org)
+    pool_mock.get_target_size.return_value = 4
+    pool_mock.get_default_definition.return_value = ("abc123", "def")
+    pool_mock.get_surplus_orgs.return_value = ([recycled.id], 1)
+    pool_mock.count_creations.return_value = 1
+
+    result = fill_scratch_org_pool(org)
+
+    assert result == "1 of 4 orgs ready, 1 being created; creating 2, recycled 1"
+    recycled.refresh_from_db()
+    assert not recycled.pooled
+    delete_scratch_org.delay.assert_called_once_with(recycled.id)
+    assert create_pool_org.delay.call_count == 2
+    assert pool_mock.start_creation.call_count == 2
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.tasks.release_scratch_org_reservation")
+@mock.patch.object(MetaCIProjectKeychain, "_load_keychain", mock.Mock())
+def test_keychain_get_org__claims_pooled_org(release, tmp_path, monkeypatch):
+    build = BuildFactory(status="running", planrepo__plan__org="dev")
+    org = OrgFactory(repo=build.repo, name="dev", scratch=True, pool_size=1)
+    org.json = ORG_JSON
+    org.save()
+    (tmp_path / "orgs").mkdir()
+    (tmp_path / "orgs" / "dev.json").write_bytes(b"{}")
+    monkeypatch.chdir(tmp_path)
+    instance = pooled_org(
+        org,
+        definition_hash=pool.get_definition_hash(org, b"{}"),
+        json={**ORG_JSON, "date_created": "2026-01-01T00:00:00"},
+    )
+
+    keychain = MetaCIProjectKeychain(mock.Mock(), None, build)
+    org_config = keychain.get_org("dev")
+
+    assert org_config.org_instance == instance
+    assert org_config.keychain is keychain
+    release.assert_called_once_with(build.id)
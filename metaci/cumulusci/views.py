@@ -24,6 +24,8 @@ def org_detail(request, org_id):
 
     context = {"builds": builds, "org": org, "instances": instances}
     context["can_log_in"] = org.scratch or settings.METACI_ALLOW_PERSISTENT_ORG_LOGIN
+    if not org.scratch:
+        context["utilization"] = f"{org.get_utilization():.0%}"
     return render(request, "cumulusci/org_detail.html", context=context)
 
 
@@ -89,7 +91,10 @@ def org_login(request, org_id, instance_id=None):
             raise Http404("Cannot log in: the org instance is already deleted")
 
         # Log into the scratch org
-        session = instance.get_jwt_based_session()
+        try:
+            session = instance.get_jwt_based_session()
+        except KeyError:
+            raise Http404("Cannot log in: the org's Dev Hub is no longer configured")
         return HttpResponseRedirect(
             urljoin(
                 str(session["instance_url"]),
@@ -5,7 +5,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
 
-from metaci.build.models import BuildFlow
+from metaci.build.models import BuildFlow, BuildLogChunk
 from metaci.testresults.models import TestResult, TestResultAsset
 
 
@@ -42,7 +42,8 @@ class Command(BaseCommand):
                 self.stdout.write(
                     f"Clearing {count} build flow logs from over a year ago..."
                 )
-                build_flows.update(log="")
+                build_flows.update(log="", log_html=None, log_html_hash=None)
+                BuildLogChunk.objects.filter(build_flow__in=build_flows).delete()
             self.stdout.write("Done.\n")
 
         # test result assets
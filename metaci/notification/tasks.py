@@ -91,10 +91,9 @@ def send_notification_message(build_id, user_id):
     user = User.objects.get(id=user_id)
 
     try:
-        log_lines = build.flows.order_by("-date_end")[0].log.split("\n")
+        log_lines = build.flows.order_by("-date_end")[0].get_log_tail(25)
     except:
-        log_lines = build.log.split("\n")
-    log_lines = "\n".join(log_lines[-25:])
+        log_lines = build.get_log_tail(25)
 
     template_txt = get_template("build/email.txt")
     template_html = get_template("build/email.html")
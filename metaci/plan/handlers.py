@@ -1,7 +1,10 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from metaci.build.signals import build_complete
-from metaci.plan.models import PlanRepositoryTrigger
+from metaci.plan import triggers
+from metaci.plan.models import Plan, PlanRepository, PlanRepositoryTrigger
 
 
 @receiver(build_complete)
@@ -17,10 +20,20 @@ def trigger_dependent_builds(sender, **kwargs):
         try:
             trigger.fire(build)
         except Exception as e:
-            build.log += (
+            build.append_log(
                 f"Could not trigger plan {trigger.target_plan_repo} ({trigger.branch} branch): "
                 f"{e.__class__.__name__} {str(e)}"
             )
-            build.save()
             # Intentionally swallow the exception,
             # so that we don't error the trigger build or block other triggers.
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+@receiver(post_save, sender=PlanRepository)
+@receiver(post_delete, sender=PlanRepository)
+def invalidate_trigger_index(sender, **kwargs):
+    triggers.index.clear()
+    # Other processes are told once the change is committed,
+    # or they could reload the old plans
+    transaction.on_commit(triggers.invalidate)
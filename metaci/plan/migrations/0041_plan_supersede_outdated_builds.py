@@ -0,0 +1,21 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plan", "0040_plan_commit_status_regex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="supersede_outdated_builds",
+            field=models.BooleanField(
+                default=False,
+                help_text="If set, a new automatic build of this plan cancels queued or waiting automatic builds of older commits on the same branch.",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plan", "0041_plan_supersede_outdated_builds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="concurrency_limit",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="The most builds of this plan that may run at once. Builds over the limit wait for one to finish.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="planrepository",
+            name="branch_concurrency_limit",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="The most builds of this plan on one branch of this repository that may run at once. Builds over the limit wait for one to finish.",
+                null=True,
+            ),
+        ),
+    ]
@@ -1,5 +1,3 @@
-import re
-
 import yaml
 from django.apps import apps
 from django.core.exceptions import ValidationError
@@ -9,6 +7,7 @@ from django.urls import reverse
 from guardian.shortcuts import get_objects_for_user
 
 from metaci.build.models import Build
+from metaci.plan.triggers import PlanTrigger
 from metaci.repository.models import Branch, Repository
 
 TRIGGER_TYPES = (
@@ -113,6 +112,11 @@ class Plan(models.Model):
     active = models.BooleanField(default=True)
     keep_org_on_error = models.BooleanField(default=False)
     keep_org_on_fail = models.BooleanField(default=False)
+    supersede_outdated_builds = models.BooleanField(
+        default=False,
+        help_text="If set, a new automatic build of this plan cancels queued or "
+        "waiting automatic builds of older commits on the same branch.",
+    )
     dashboard = models.CharField(
         max_length=8, choices=DASHBOARD_CHOICES, default=None, null=True, blank=True
     )
@@ -122,6 +126,12 @@ class Plan(models.Model):
         null=True, blank=True, validators=[validate_yaml_field]
     )
     build_timeout = models.IntegerField(default=8 * 60 * 60)
+    concurrency_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="The most builds of this plan that may run at once. "
+        "Builds over the limit wait for one to finish.",
+    )
 
     objects = PlanQuerySet.as_manager()
 
@@ -152,79 +162,8 @@ class Plan(models.Model):
         for repo in self.repos.all():
             yield repo
 
-    def _check_ref_regex(self, payload):
-        if not payload["ref"].startswith("refs/heads/"):
-            return False
-        branch = payload["ref"][11:]
-
-        # Check the branch against regex
-        return re.match(self.regex, branch)
-
-    def _check_status_event_branch_regex(self, payload):
-        return any(
-            re.match(self.regex, branch["name"])
-            for branch in payload.get("branches", [])
-        )
-
     def check_github_event(self, event, payload):
-        run_build = False
-        commit = None
-        commit_message = None
-
-        if event == "push":
-            # Handle commit events
-            if self.trigger == "commit" and self.regex:
-                # Check if the event was triggered by a commit
-                if not self._check_ref_regex(payload):
-                    return run_build, commit, commit_message
-
-                run_build = True
-                commit = payload["after"]
-                if commit == "0000000000000000000000000000000000000000":
-                    run_build = False
-                    commit = None
-                    return run_build, commit, commit_message
-
-                for commit_info in payload.get("commits", []):
-                    if commit_info["id"] == commit:
-                        commit_message = commit_info["message"]
-                        break
-
-                # Skip build if commit message contains [ci skip]
-                if commit_message and "[ci skip]" in commit_message:
-                    run_build = False
-                    commit = None
-
-            # Handle tag events
-            elif self.trigger == "tag" and self.regex:
-                # Check if the event was triggered by a tag
-                if not payload["ref"].startswith("refs/tags/"):
-                    return run_build, commit, commit_message
-                tag = payload["ref"][10:]
-
-                # Check the tag against regex
-                if not re.match(self.regex, tag):
-                    return run_build, commit, commit_message
-
-                run_build = True
-                commit = payload["head_commit"]["id"]
-
-        elif (
-            event == "status"
-            and self.trigger == "status"
-            and payload["state"] == "success"
-        ):
-            if not re.match(self.commit_status_regex, payload["context"]):
-                return run_build, commit, commit_message
-
-            # If we also have a branch regex filter, run it.
-            if self.regex and not self._check_status_event_branch_regex(payload):
-                return run_build, commit, commit_message
-
-            run_build = True
-            commit = payload["sha"]
-
-        return run_build, commit, commit_message
+        return PlanTrigger(self).check(event, payload)
 
 
 SCHEDULE_CHOICES = (
@@ -257,6 +196,12 @@ class PlanRepository(models.Model):
     plan = models.ForeignKey(Plan, on_delete=models.CASCADE)
     repo = models.ForeignKey(Repository, on_delete=models.CASCADE)
     active = models.BooleanField(default=True)
+    branch_concurrency_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="The most builds of this plan on one branch of this repository "
+        "that may run at once. Builds over the limit wait for one to finish.",
+    )
 
     objects = PlanRepositoryQuerySet.as_manager()
 
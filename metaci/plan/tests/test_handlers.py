@@ -88,7 +88,7 @@ class PlanHandlerTestCase(TestCase):
         build_complete.send(sender="sender", build=self.build, status="success")
         assert (
             "Could not trigger plan [TestOwner/TriggeredRepo] Target Plan (main branch)"
-            in self.build.log
+            in self.build.get_log()
         )
         # confirm trigger was not successful
         with pytest.raises(ObjectDoesNotExist):
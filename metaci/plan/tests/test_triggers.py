@@ -0,0 +1,91 @@
+from unittest import mock
+
+import pytest
+
+from metaci.conftest import PlanRepositoryFactory
+from metaci.plan import triggers
+
+PUSH = {"ref": "refs/heads/feature/test", "after": "abc123"}
+
+
+@pytest.fixture
+def planrepo():
+    triggers.index.clear()
+    return PlanRepositoryFactory(
+        plan__trigger="commit", plan__regex="feature/.*", repo__github_id=1234
+    )
+
+
+@pytest.mark.django_db
+def test_match(planrepo, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        [(trigger, commit, message)] = triggers.match(1234, "push", PUSH)
+        assert not triggers.match(1234, "push", {**PUSH, "ref": "refs/heads/main"})
+        assert not triggers.match(1234, "status", {"state": "pending"})
+
+    assert trigger.planrepo_id == planrepo.id
+    assert commit == "abc123"
+
+
+@pytest.mark.django_db
+def test_match__invalidated_on_save(planrepo):
+    assert triggers.match(1234, "push", PUSH)
+
+    planrepo.active = False
+    planrepo.save()
+    assert not triggers.match(1234, "push", PUSH)
+
+    planrepo.active = True
+    planrepo.save()
+    planrepo.plan.regex = "main"
+    planrepo.plan.save()
+    assert not triggers.match(1234, "push", PUSH)
+
+
+@mock.patch("metaci.plan.triggers.cache")
+def test_get_triggers__version_changed(cache):
+    index = triggers.TriggerIndex()
+    index.version = "a"
+    index.triggers[1234] = ["cached"]
+    cache.get.return_value = "a"
+    assert index.get_triggers(1234) == ["cached"]
+
+    # Another process invalidated the index
+    cache.get.return_value = "b"
+    with mock.patch.object(index, "_load", return_value=[]):
+        assert index.get_triggers(1234) == []
+
+
+@mock.patch("metaci.plan.triggers.cache")
+def test_get_triggers__version_evicted(cache):
+    index = triggers.TriggerIndex()
+    index.version = "a"
+    index.triggers[1234] = ["cached"]
+    cache.get.side_effect = [None, "c"]
+
+    with mock.patch.object(index, "_load", return_value=[]):
+        assert index.get_triggers(1234) == []
+    cache.add.assert_called_once()
+    assert index.version == "c"
+
+
+@mock.patch("metaci.plan.triggers.cache")
+def test_get_triggers__cache_unavailable(cache):
+    index = triggers.TriggerIndex()
+    index.version = "a"
+    index.triggers[1234] = ["cached"]
+    cache.get.return_value = None
+
+    with mock.patch.object(index, "_load", return_value=[]) as load:
+        assert index.get_triggers(1234) == []
+        assert index.get_triggers(1234) == []
+    assert load.call_count == 2
+
+
+@mock.patch("metaci.plan.triggers.cache")
+def test_invalidate(cache):
+    triggers.invalidate()
+    triggers.invalidate()
+
+    first, second = [call.args[1] for call in cache.set.call_args_list]
+    assert first != second
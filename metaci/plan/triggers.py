@@ -0,0 +1,157 @@
+"""Matching GitHub events to the plans they trigger.
+
+GitHub sends an event for every push and commit status of a repository,
+including the statuses MetaCI sets itself, and most of them trigger
+nothing. So the commit, tag and status triggers of each repository's
+active plans are kept in an in-process index, with their regexes
+compiled, and events are matched against it without a database query.
+
+Saving or deleting a Plan or PlanRepository invalidates the index in
+every process, by setting a new random version token in the cache. If the
+token is evicted, a new one is set, so no process keeps an index older
+than the token it sees; if the cache is unavailable, nothing is cached.
+"""
+import re
+import uuid
+
+from django.apps import apps
+from django.core.cache import cache
+
+VERSION_KEY = "metaci:plan-triggers:version"
+EVENT_TRIGGERS = ("commit", "tag", "status")
+NULL_COMMIT = "0000000000000000000000000000000000000000"
+
+
+class PlanTrigger(object):
+    """A plan's trigger, with its regexes compiled."""
+
+    def __init__(self, plan, planrepo_id=None):
+        self.plan_id = plan.id
+        self.planrepo_id = planrepo_id
+        self.trigger = plan.trigger
+        self.regex = re.compile(plan.regex) if plan.regex else None
+        self.commit_status_regex = (
+            re.compile(plan.commit_status_regex) if plan.commit_status_regex else None
+        )
+
+    def check(self, event, payload):
+        """Return (run build, commit, commit message) for a GitHub event."""
+        if event == "push":
+            if self.trigger == "commit" and self.regex:
+                return self._check_commit(payload)
+            elif self.trigger == "tag" and self.regex:
+                return self._check_tag(payload)
+        elif (
+            event == "status"
+            and self.trigger == "status"
+            and payload["state"] == "success"
+        ):
+            return self._check_status(payload)
+        return False, None, None
+
+    def _check_commit(self, payload):
+        ref = payload["ref"]
+        if not ref.startswith("refs/heads/") or not self.regex.match(ref[11:]):
+            return False, None, None
+        commit = payload["after"]
+        if commit == NULL_COMMIT:
+            return False, None, None
+
+        commit_message = None
+        for commit_info in payload.get("commits", []):
+            if commit_info["id"] == commit:
+                commit_message = commit_info["message"]
+                break
+
+        # Skip build if commit message contains [ci skip]
+        if commit_message and "[ci skip]" in commit_message:
+            return False, None, commit_message
+        return True, commit, commit_message
+
+    def _check_tag(self, payload):
+        ref = payload["ref"]
+        if not ref.startswith("refs/tags/") or not self.regex.match(ref[10:]):
+            return False, None, None
+        return True, payload["head_commit"]["id"], None
+
+    def _check_status(self, payload):
+        if self.commit_status_regex is None or not self.commit_status_regex.match(
+            payload["context"]
+        ):
+            return False, None, None
+        # If we also have a branch regex filter, run it.
+        if self.regex and not any(
+            self.regex.match(branch["name"]) for branch in payload.get("branches", [])
+        ):
+            return False, None, None
+        return True, payload["sha"], None
+
+
+class TriggerIndex(object):
+    """The event triggers of each repository's active plans, by GitHub id."""
+
+    def __init__(self):
+        self.version = None
+        self.triggers = {}
+
+    def clear(self):
+        self.triggers = {}
+
+    def get_triggers(self, github_id):
+        version = _get_version()
+        if version is None:
+            # Changes can't be detected without the cache
+            self.clear()
+            self.version = None
+            return self._load(github_id)
+        if version != self.version:
+            self.clear()
+            self.version = version
+        if github_id not in self.triggers:
+            self.triggers[github_id] = self._load(github_id)
+        return self.triggers[github_id]
+
+    def _load(self, github_id):
+        PlanRepository = apps.get_model("plan", "PlanRepository")
+        planrepos = (
+            PlanRepository.objects.should_run()
+            .filter(repo__github_id=github_id, plan__trigger__in=EVENT_TRIGGERS)
+            .select_related("plan")
+            .order_by("id")
+        )
+        return [PlanTrigger(planrepo.plan, planrepo.id) for planrepo in planrepos]
+
+
+index = TriggerIndex()
+
+
+def match(github_id, event, payload):
+    """Return the plans a GitHub event triggers in a repository.
+
+    Returns (trigger, commit, commit message) for each.
+    """
+    matches = []
+    for trigger in index.get_triggers(github_id):
+        run_build, commit, commit_message = trigger.check(event, payload)
+        if run_build:
+            matches.append((trigger, commit, commit_message))
+    return matches
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _get_version():
+    """Return the current version token, or None if the cache is unavailable."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Never set, or evicted
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every process reload its index."""
+    cache.set(VERSION_KEY, _new_version(), timeout=None)
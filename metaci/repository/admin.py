@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from metaci.plan.models import PlanRepository
-from metaci.repository.models import Branch, Repository
+from metaci.repository.models import Branch, Repository, WebhookDelivery
 
 
 @admin.register(Branch)
@@ -15,5 +15,12 @@ class PlanRepositoryInline(admin.TabularInline):
 
 @admin.register(Repository)
 class RepositoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "owner")
+    list_display = ("name", "owner", "build_weight")
     inlines = [PlanRepositoryInline]
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("guid", "repo", "event", "status", "received", "processing_time")
+    list_filter = ("status", "event", "repo")
+    search_fields = ("guid",)
@@ -0,0 +1,194 @@
+"""Process-wide cache of GitHub API clients.
+
+Logging in to GitHub and fetching a repository costs at least one API
+call, plus a GitHub app installation token when MetaCI runs as an app.
+Instead of doing that on every call, each process keeps the client and
+repository object it made for each repository:
+
+- The repository object, and so its metadata such as default_branch,
+  is fetched again once it is METACI_GITHUB_REPO_TTL seconds old.
+- The client, and its session's pooled connections, is reused until its
+  app installation token is about to expire, and then logs in again.
+
+This cache is per process, so it only helps long-lived processes such as
+the web server. rq workers, and the warm build server, run each job in a
+process forked for it, whose cache starts empty and is discarded when
+the job ends; there the Redis response cache below is what saves
+GitHub API calls.
+
+Clients also share a cache of small JSON GET responses in Redis, keyed
+by URL and stored with their ETag. A repeated request is sent with If-None-Match,
+and if GitHub answers 304 Not Modified, which doesn't count against the
+rate limit, the cached response is used. get_cache_stats() reports the
+cache's hits and misses and the rate limit left.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+import typing as T
+from datetime import datetime, timedelta, timezone
+
+from cumulusci.core.github import get_github_api_for_repo
+from django.conf import settings
+from django_redis import get_redis_connection
+from github3.session import GitHubSession
+
+from metaci.cumulusci.keychain import GitHubSettingsKeychain
+
+# Log in again this long before an app installation token expires
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+RESPONSE_KEY = "metaci:github-cache:{}"
+# Larger responses aren't cached, to keep them out of the Redis
+# that also holds the rq queues and locks
+MAX_ENTRY_SIZE = 256 * 1024
+STATS_KEY = "metaci:github-cache:stats"
+# Headers of a cached response that a 304 response doesn't repeat
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+RATE_LIMIT_HEADERS = {
+    "X-RateLimit-Limit": "rate_limit",
+    "X-RateLimit-Remaining": "rate_limit_remaining",
+    "X-RateLimit-Reset": "rate_limit_reset",
+}
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+class ConditionalRequestSession(GitHubSession):
+    """A github3 session that revalidates repeated GET requests by ETag."""
+
+    def request(self, method, url, *args, **kwargs):
+        # Downloads such as zipballs are streamed, and never cached
+        if method.upper() != "GET" or kwargs.get("stream"):
+            return super().request(method, url, *args, **kwargs)
+
+        headers = dict(kwargs.get("headers") or {})
+        key = _response_key(
+            url, kwargs.get("params"), headers.get("Accept", self.headers.get("Accept"))
+        )
+        redis = _redis()
+        cached = redis.get(key)
+        if cached:
+            cached = json.loads(cached)
+            headers["If-None-Match"] = cached["etag"]
+            kwargs["headers"] = headers
+
+        response = super().request(method, url, *args, **kwargs)
+        _record_rate_limit(response)
+        if cached and response.status_code == 304:
+            redis.hincrby(STATS_KEY, "hits")
+            return _cached_response(response, cached)
+
+        redis.hincrby(STATS_KEY, "misses")
+        if _cacheable(response):
+            etag = response.headers["ETag"]
+            entry = {
+                "etag": etag,
+                "headers": {
+                    name: response.headers[name]
+                    for name in CACHED_HEADERS
+                    if name in response.headers
+                },
+                "content": base64.b64encode(response.content).decode(),
+            }
+            redis.set(key, json.dumps(entry), ex=settings.METACI_GITHUB_CACHE_TTL)
+        return response
+
+
+def _cacheable(response):
+    """Only small JSON API responses are cached."""
+    return (
+        response.status_code == 200
+        and not response.history
+        and "ETag" in response.headers
+        and response.headers.get("Content-Type", "").startswith("application/json")
+        and int(response.headers.get("Content-Length", 0)) <= MAX_ENTRY_SIZE
+        and len(response.content) <= MAX_ENTRY_SIZE
+    )
+
+
+def _response_key(url, params, accept):
+    request = json.dumps([url, sorted((params or {}).items()), accept])
+    return RESPONSE_KEY.format(hashlib.sha1(request.encode()).hexdigest())
+
+
+def _cached_response(response, cached):
+    response.status_code = 200
+    response.reason = "OK"
+    response.headers.update(cached["headers"])
+    response._content = base64.b64decode(cached["content"])
+    return response
+
+
+def _record_rate_limit(response):
+    limits = {
+        field: response.headers[header]
+        for header, field in RATE_LIMIT_HEADERS.items()
+        if header in response.headers
+    }
+    if limits:
+        _redis().hset(STATS_KEY, mapping=limits)
+
+
+def get_cache_stats():
+    """Return the response cache's hits and misses, and the rate limit
+    GitHub last reported."""
+    stats = {
+        field.decode(): int(value)
+        for field, value in _redis().hgetall(STATS_KEY).items()
+    }
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+    requests = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / requests if requests else None
+    return stats
+
+
+class CachedRepository(T.NamedTuple):
+    gh: T.Any
+    repo: T.Any
+    fetched: float
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _token_expiring(gh):
+    expires_at = getattr(gh.session.auth, "expires_at", None)
+    if expires_at is None:
+        return False
+    return expires_at - TOKEN_EXPIRY_MARGIN < datetime.now(timezone.utc)
+
+
+def get_github_repo(repo):
+    """Return the github3 repository of a Repository.
+
+    The client and repository are reused for later calls in this process
+    (but not in processes forked from it afterwards).
+    """
+    with _lock:
+        cached = _cache.get(repo.url)
+    now = time.monotonic()
+    if cached and not _token_expiring(cached.gh):
+        if now - cached.fetched < settings.METACI_GITHUB_REPO_TTL:
+            return cached.repo
+        gh = cached.gh
+    else:
+        session = ConditionalRequestSession(
+            default_read_timeout=30, default_connect_timeout=30
+        )
+        gh = get_github_api_for_repo(GitHubSettingsKeychain(), repo.url, session)
+    gh_repo = gh.repository(repo.owner, repo.name)
+    with _lock:
+        _cache[repo.url] = CachedRepository(gh, gh_repo, now)
+    return gh_repo
+
+
+def clear():
+    """Forget every cached client."""
+    with _lock:
+        _cache.clear()
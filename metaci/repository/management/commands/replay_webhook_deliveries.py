@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from metaci.repository.models import WEBHOOK_DELIVERY_STATUSES, WebhookDelivery
+from metaci.repository.tasks import process_webhook_deliveries, process_webhook_delivery
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays stored GitHub webhook deliveries. "
+        "Replaying a delivery that was processed will create its builds again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "guids", nargs="*", type=str, help="GUIDs of deliveries to replay."
+        )
+        parser.add_argument("--repo", type=str, help="Only replay owner/name's.")
+        parser.add_argument(
+            "--status",
+            choices=[status for status, _ in WEBHOOK_DELIVERY_STATUSES],
+            help="Only replay deliveries with this status. "
+            "Defaults to failed, unless GUIDs are given.",
+        )
+        parser.add_argument("--event", type=str, help="Only replay this event.")
+        parser.add_argument("--limit", type=int, help="Replay at most this many.")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Process the deliveries in this process, and time them, "
+            "instead of queueing them for a worker.",
+        )
+
+    def handle(self, guids, *args, **options):
+        deliveries = WebhookDelivery.objects.select_related("repo")
+        if guids:
+            deliveries = deliveries.filter(guid__in=guids)
+        status = options["status"] or (None if guids else "failed")
+        if status:
+            deliveries = deliveries.filter(status=status)
+        if options["repo"]:
+            owner, name = options["repo"].split("/")
+            deliveries = deliveries.filter(repo__owner=owner, repo__name=name)
+        if options["event"]:
+            deliveries = deliveries.filter(event=options["event"])
+        deliveries = list(deliveries[: options["limit"]])
+
+        if options["sync"]:
+            start = time.monotonic()
+            for delivery in deliveries:
+                process_webhook_delivery(delivery)
+                self.stdout.write(
+                    f"{delivery}: {delivery.status} in "
+                    f"{delivery.processing_time.total_seconds():.3f}s"
+                )
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                f"Replayed {len(deliveries)} deliveries in {elapsed:.3f}s"
+            )
+        else:
+            WebhookDelivery.objects.filter(
+                id__in=[delivery.id for delivery in deliveries]
+            ).update(status="received", started=None, processed=None, error="")
+            for repo_id in {delivery.repo_id for delivery in deliveries}:
+                process_webhook_deliveries.delay(repo_id)
+            self.stdout.write(f"Queued {len(deliveries)} deliveries to replay")
@@ -0,0 +1,41 @@
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+
+from metaci.conftest import RepositoryFactory
+from metaci.repository.models import WebhookDelivery
+
+
+@pytest.fixture
+def deliveries():
+    repo = RepositoryFactory()
+    return [
+        WebhookDelivery.objects.create(
+            repo=repo, guid=str(n), event="push", payload={}, status=status
+        )
+        for n, status in enumerate(["processed", "failed", "failed"])
+    ]
+
+
+@pytest.mark.django_db
+@mock.patch(
+    "metaci.repository.management.commands.replay_webhook_deliveries.process_webhook_deliveries.delay"
+)
+def test_replay_webhook_deliveries(process, deliveries):
+    call_command("replay_webhook_deliveries")
+
+    statuses = WebhookDelivery.objects.values_list("status", flat=True)
+    assert list(statuses) == ["processed", "received", "received"]
+    process.assert_called_once_with(deliveries[0].repo_id)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.repository.views.handle_github_webhook")
+def test_replay_webhook_deliveries__sync(handle, deliveries):
+    call_command("replay_webhook_deliveries", "0", sync=True)
+
+    handle.assert_called_once_with("push", {}, deliveries[0].repo)
+    delivery = WebhookDelivery.objects.get(guid="0")
+    assert delivery.status == "processed"
+    assert delivery.processing_time is not None
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.13 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0011_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="build_weight",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="This repository's share of the workers, relative to other repositories, when builds of several repositories are waiting.",
+            ),
+        ),
+    ]
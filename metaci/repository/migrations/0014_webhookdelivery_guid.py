@@ -0,0 +1,59 @@
+# Generated by Django 3.2.13 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+def set_processed_status(apps, schema_editor):
+    WebhookDelivery = apps.get_model("repository", "WebhookDelivery")
+    WebhookDelivery.objects.filter(processed__isnull=False).update(status="processed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0013_webhookdelivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookdelivery",
+            name="error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="webhookdelivery",
+            name="guid",
+            field=models.CharField(
+                blank=True,
+                help_text="The X-GitHub-Delivery header, which GitHub repeats when it redelivers a webhook.",
+                max_length=64,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookdelivery",
+            name="started",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="webhookdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("received", "Received"),
+                    ("processed", "Processed"),
+                    ("failed", "Failed"),
+                ],
+                default="received",
+                max_length=16,
+            ),
+        ),
+        migrations.RunPython(set_processed_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="webhookdelivery",
+            index=models.Index(
+                fields=["repo", "status"], name="repository__repo_id_90f5e4_idx"
+            ),
+        ),
+    ]
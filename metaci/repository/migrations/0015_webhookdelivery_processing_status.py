@@ -0,0 +1,27 @@
+# Generated by Django 3.2.13 on 2026-10-18 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0014_webhookdelivery_guid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="webhookdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("received", "Received"),
+                    ("processing", "Processing"),
+                    ("processed", "Processed"),
+                    ("failed", "Failed"),
+                ],
+                default="received",
+                max_length=16,
+            ),
+        ),
+    ]
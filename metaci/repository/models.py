@@ -1,6 +1,5 @@
 import github3.exceptions
 from cumulusci.core.exceptions import GithubException
-from cumulusci.core.github import get_github_api_for_repo
 from django.apps import apps
 from django.db import models
 from django.http import Http404
@@ -8,7 +7,7 @@ from django.urls import reverse
 from model_utils.managers import SoftDeletableManager
 from model_utils.models import SoftDeletableModel
 
-from metaci.cumulusci.keychain import GitHubSettingsKeychain
+from metaci.repository.github import get_github_repo
 
 
 class RepositoryQuerySet(models.QuerySet):
@@ -37,6 +36,11 @@ class Repository(models.Model):
     release_tag_regex = models.CharField(max_length=255, blank=True, null=True)
     default_implementation_steps = models.JSONField(null=True, blank=True, default=list)
     metadata = models.JSONField(null=True, blank=True, default=dict)
+    build_weight = models.PositiveIntegerField(
+        default=1,
+        help_text="This repository's share of the workers, relative to other "
+        "repositories, when builds of several repositories are waiting.",
+    )
 
     objects = RepositoryQuerySet.as_manager()
 
@@ -51,9 +55,7 @@ class Repository(models.Model):
         return f"{self.owner}/{self.name}"
 
     def get_github_api(self):
-        gh = get_github_api_for_repo(GitHubSettingsKeychain(), self.url)
-        repo = gh.repository(self.owner, self.name)
-        return repo
+        return get_github_repo(self)
 
     @property
     def latest_release(self):
@@ -105,3 +107,49 @@ class Branch(SoftDeletableModel):
         except (github3.exceptions.NotFoundError, GithubException):
             branch = None
         return branch
+
+
+WEBHOOK_DELIVERY_STATUSES = (
+    ("received", "Received"),
+    ("processing", "Processing"),
+    ("processed", "Processed"),
+    ("failed", "Failed"),
+)
+
+
+class WebhookDelivery(models.Model):
+    """A GitHub webhook delivery, stored to be processed outside the request."""
+
+    repo = models.ForeignKey(
+        Repository, related_name="webhook_deliveries", on_delete=models.CASCADE
+    )
+    guid = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="The X-GitHub-Delivery header, which GitHub repeats when it "
+        "redelivers a webhook.",
+    )
+    event = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=16, choices=WEBHOOK_DELIVERY_STATUSES, default="received"
+    )
+    error = models.TextField(blank=True)
+    received = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name_plural = "webhook deliveries"
+        indexes = [models.Index(fields=["repo", "status"])]
+
+    def __str__(self):
+        return f"{self.repo}: {self.event} {self.guid or self.id}"
+
+    @property
+    def processing_time(self):
+        if self.started and self.processed:
+            return self.processed - self.started
@@ -1,7 +1,27 @@
+import logging
+import traceback
+from datetime import timedelta
+
 from django import db
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
 from django_rq import job
 
-from metaci.repository.models import Branch
+from metaci.repository.models import Branch, WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_LOCK_KEY = "metaci:webhooks:repo-{}"
+# Seconds the lock on a repository's deliveries is held for,
+# renewed before each delivery is processed
+WEBHOOK_LOCK_TIMEOUT = 300
+# Deliveries still processing after this long were left by a job that died
+WEBHOOK_PROCESSING_TIMEOUT = timedelta(minutes=10)
+
+
+def _redis():
+    return get_redis_connection("default")
 
 
 @job("short")
@@ -18,3 +38,96 @@ def prune_branches():
         return msg
     else:
         return "No branches pruned"
+
+
+def process_webhook_delivery(delivery):
+    """Process a stored webhook delivery, recording how it went."""
+    from metaci.repository.views import handle_github_webhook
+
+    if delivery.status != "processing":
+        delivery.started = timezone.now()
+    try:
+        handle_github_webhook(delivery.event, delivery.payload, delivery.repo)
+    except Exception:
+        logger.exception(f"Failed to process webhook delivery {delivery}")
+        delivery.status = "failed"
+        delivery.error = traceback.format_exc()
+    else:
+        delivery.status = "processed"
+        delivery.error = ""
+    delivery.processed = timezone.now()
+    delivery.save()
+
+
+def claim_webhook_delivery(repo_id):
+    """Claim a repository's oldest received delivery, so no other job processes it.
+
+    Returns None if there are no received deliveries left.
+    """
+    with transaction.atomic():
+        delivery = (
+            WebhookDelivery.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(repo_id=repo_id, status="received")
+            .select_related("repo")
+            .first()
+        )
+        if delivery is not None:
+            delivery.status = "processing"
+            delivery.started = timezone.now()
+            delivery.save(update_fields=["status", "started"])
+    return delivery
+
+
+@job("short")
+def process_webhook_deliveries(repo_id):
+    """Process a repository's stored webhook deliveries in the order received.
+
+    Only one worker processes a repository's deliveries at a time. A job
+    that finds another already doing so returns at once, leaving its
+    delivery to that one, and the job holding the lock checks for new
+    deliveries again after releasing it. Each delivery is claimed before
+    it is processed, so it is only processed once even if the lock
+    expires. A delivery that fails doesn't hold up the ones after it; it
+    can be replayed with the replay_webhook_deliveries command.
+    """
+    processed = 0
+    while True:
+        lock = _redis().lock(
+            WEBHOOK_LOCK_KEY.format(repo_id), timeout=WEBHOOK_LOCK_TIMEOUT
+        )
+        if not lock.acquire(blocking=False):
+            break
+        try:
+            while True:
+                delivery = claim_webhook_delivery(repo_id)
+                if delivery is None:
+                    break
+                process_webhook_delivery(delivery)
+                processed += 1
+                lock.reacquire()
+        finally:
+            lock.release()
+        # A delivery may have arrived after the last claim, and its job
+        # returned because the lock was still held
+        if not WebhookDelivery.objects.filter(
+            repo_id=repo_id, status="received"
+        ).exists():
+            break
+    return f"Processed {processed} webhook deliveries"
+
+
+@job("short")
+def check_webhook_deliveries():
+    """Queue the processing of deliveries that a failed job left behind."""
+    WebhookDelivery.objects.filter(
+        status="processing", started__lt=timezone.now() - WEBHOOK_PROCESSING_TIMEOUT
+    ).update(status="received", started=None)
+    repo_ids = set(
+        WebhookDelivery.objects.filter(
+            status="received",
+            received__lt=timezone.now() - timedelta(minutes=1),
+        ).values_list("repo_id", flat=True)
+    )
+    for repo_id in repo_ids:
+        process_webhook_deliveries.delay(repo_id)
+    return f"Queued webhook deliveries of {len(repo_ids)} repositories"
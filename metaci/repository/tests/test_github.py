@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+import responses
+from django_redis import get_redis_connection
+
+from metaci.repository import github
+from metaci.repository.models import Repository
+
+REPO = Repository(
+    owner="TestOwner", name="TestRepo", url="https://github.com/TestOwner/TestRepo"
+)
+
+
+@pytest.fixture(autouse=True)
+def get_api():
+    github.clear()
+    with mock.patch("metaci.repository.github.get_github_api_for_repo") as get_api:
+        get_api.return_value.session.auth = None
+        yield get_api
+    github.clear()
+
+
+@mock.patch("metaci.repository.github.time.monotonic")
+def test_get_github_repo__reuses_client(monotonic, get_api, settings):
+    settings.METACI_GITHUB_REPO_TTL = 300
+    gh = get_api.return_value
+    monotonic.return_value = 0
+
+    assert REPO.get_github_api() is gh.repository.return_value
+    monotonic.return_value = 299
+    REPO.get_github_api()
+    assert gh.repository.call_count == 1
+
+    # The repository is fetched again, with the same client
+    monotonic.return_value = 300
+    REPO.get_github_api()
+    assert gh.repository.call_count == 2
+    get_api.assert_called_once()
+
+
+def test_get_github_repo__token_expiring(get_api):
+    get_api.return_value.session.auth = mock.Mock(
+        expires_at=datetime.now(timezone.utc) + timedelta(minutes=1)
+    )
+
+    REPO.get_github_api()
+    REPO.get_github_api()
+
+    assert get_api.call_count == 2
+
+
+@pytest.fixture
+def redis():
+    redis = get_redis_connection("default")
+    yield redis
+    for key in redis.scan_iter("metaci:github-cache:*"):
+        redis.delete(key)
+
+
+@responses.activate
+def test_conditional_request_session(redis):
+    url = "https://api.github.com/repos/TestOwner/TestRepo"
+    rate_limit = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999"}
+    responses.add("GET", url, json={"id": 1}, headers={"ETag": '"abc"', **rate_limit})
+    responses.add("GET", url, status=304, headers=rate_limit)
+    session = github.ConditionalRequestSession()
+
+    assert session.get(url).json() == {"id": 1}
+    response = session.get(url)
+
+    assert responses.calls[1].request.headers["If-None-Match"] == '"abc"'
+    assert response.status_code == 200
+    assert response.json() == {"id": 1}
+    assert github.get_cache_stats() == {
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+        "rate_limit": 5000,
+        "rate_limit_remaining": 4999,
+    }
+
+
+@responses.activate
+def test_conditional_request_session__not_cached(redis):
+    url = "https://api.github.com/repos/TestOwner/TestRepo/zipball/main"
+    responses.add(
+        "GET",
+        url,
+        body=b"PK...",
+        headers={"ETag": '"abc"', "Content-Type": "application/zip"},
+    )
+    big = "https://api.github.com/repos/TestOwner/TestRepo/contents"
+    responses.add(
+        "GET", big, json=["x" * github.MAX_ENTRY_SIZE], headers={"ETag": '"def"'}
+    )
+    session = github.ConditionalRequestSession()
+
+    session.get(url, stream=True)
+    session.get(url)
+    session.get(big)
+
+    assert set(redis.scan_iter(github.RESPONSE_KEY.format("*"))) == {
+        github.STATS_KEY.encode()
+    }
+    # The streamed request isn't counted either
+    assert github.get_cache_stats()["misses"] == 2
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from metaci.conftest import RepositoryFactory
+from metaci.repository.models import WebhookDelivery
+from metaci.repository.tasks import (
+    check_webhook_deliveries,
+    claim_webhook_delivery,
+    process_webhook_deliveries,
+)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.repository.views.handle_github_webhook")
+def test_process_webhook_deliveries(handle):
+    repo = RepositoryFactory()
+    other = WebhookDelivery.objects.create(
+        repo=RepositoryFactory(), event="push", payload={}
+    )
+    for n in range(3):
+        WebhookDelivery.objects.create(repo=repo, event="push", payload={"n": n})
+    handle.side_effect = [Exception("bad delivery"), None, None]
+
+    assert process_webhook_deliveries(repo.id) == "Processed 3 webhook deliveries"
+
+    assert [call.args[1]["n"] for call in handle.call_args_list] == [0, 1, 2]
+    statuses = repo.webhook_deliveries.values_list("status", flat=True)
+    assert list(statuses) == ["failed", "processed", "processed"]
+    assert "bad delivery" in repo.webhook_deliveries.first().error
+    other.refresh_from_db()
+    assert other.status == "received"
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.repository.tasks._redis")
+@mock.patch("metaci.repository.views.handle_github_webhook")
+def test_process_webhook_deliveries__locked(handle, redis):
+    redis.return_value.lock.return_value.acquire.return_value = False
+    delivery = WebhookDelivery.objects.create(
+        repo=RepositoryFactory(), event="push", payload={}
+    )
+
+    assert process_webhook_deliveries(delivery.repo_id) == (
+        "Processed 0 webhook deliveries"
+    )
+
+    handle.assert_not_called()
+    delivery.refresh_from_db()
+    assert delivery.status == "received"
+
+
+@pytest.mark.django_db
+def test_claim_webhook_delivery():
+    repo = RepositoryFactory()
+    first = WebhookDelivery.objects.create(repo=repo, event="push", payload={})
+    WebhookDelivery.objects.create(repo=repo, event="push", payload={})
+
+    claimed = claim_webhook_delivery(repo.id)
+
+    assert claimed == first
+    first.refresh_from_db()
+    assert first.status == "processing"
+    assert first.started is not None
+    assert claim_webhook_delivery(repo.id) != first
+    assert claim_webhook_delivery(repo.id) is None
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.repository.tasks.process_webhook_deliveries.delay")
+def test_check_webhook_deliveries(process):
+    stale = WebhookDelivery.objects.create(
+        repo=RepositoryFactory(), event="push", payload={}
+    )
+    WebhookDelivery.objects.filter(id=stale.id).update(
+        received=timezone.now() - timedelta(minutes=5)
+    )
+    WebhookDelivery.objects.create(repo=RepositoryFactory(), event="push", payload={})
+
+    check_webhook_deliveries()
+
+    process.assert_called_once_with(stale.repo_id)
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.repository.tasks.process_webhook_deliveries.delay")
+def test_check_webhook_deliveries__stale_processing(process):
+    repo = RepositoryFactory()
+    stale = WebhookDelivery.objects.create(
+        repo=repo,
+        event="push",
+        payload={},
+        status="processing",
+        started=timezone.now() - timedelta(hours=1),
+    )
+    WebhookDelivery.objects.filter(id=stale.id).update(
+        received=timezone.now() - timedelta(hours=1)
+    )
+    running = WebhookDelivery.objects.create(
+        repo=repo, event="push", payload={}, status="processing", started=timezone.now()
+    )
+
+    check_webhook_deliveries()
+
+    stale.refresh_from_db()
+    running.refresh_from_db()
+    assert stale.status == "received"
+    assert running.status == "processing"
+    process.assert_called_once_with(repo.id)
@@ -141,6 +141,20 @@ def test_create_status__error():
     )
 
 
+@pytest.mark.django_db
+def test_create_status__canceled():
+    build, repo = setup_build_with_status("canceled")
+
+    utils.create_status(build)
+    repo.create_status.assert_called_once_with(
+        sha=build.commit,
+        state="error",
+        target_url=f"initech.co/builds/{build.id}",
+        description="The build was canceled",
+        context=build.plan.context,
+    )
+
+
 @pytest.mark.django_db
 def test_create_status__fail():
     build, repo = setup_build_with_status("fail")
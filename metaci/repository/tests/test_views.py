@@ -22,7 +22,8 @@ from metaci.conftest import (
 )
 from metaci.fixtures.factories import ReleaseCohortFactory
 from metaci.repository import views
-from metaci.repository.models import Branch
+from metaci.repository.models import Branch, WebhookDelivery
+from metaci.repository.tasks import process_webhook_deliveries
 
 
 class TestRepositoryViews(TestCase):
@@ -253,8 +254,9 @@ class TestRepositoryViews(TestCase):
         assert response.content == b"Not listening for this repository"
 
     @pytest.mark.django_db
+    @mock.patch("metaci.repository.views.process_webhook_deliveries.delay")
     @mock.patch("metaci.repository.views.validate_github_webhook")
-    def test_github_webhook__status_event(self, validate):
+    def test_github_webhook__status_event(self, validate, process):
         self.plan.trigger = "status"
         self.plan.regex = None
         self.plan.commit_status_regex = "Build succeeded"
@@ -269,6 +271,38 @@ class TestRepositoryViews(TestCase):
             "sha": "aR4Zd84F1i3No8",
         }
 
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url,
+                data=json.dumps(data),
+                content_type="application/json",
+                HTTP_X_GITHUB_EVENT="status",
+            )
+
+        assert response.status_code == 202
+        delivery = WebhookDelivery.objects.get()
+        assert (delivery.repo, delivery.event, delivery.payload) == (
+            self.repo,
+            "status",
+            data,
+        )
+        process.assert_called_once_with(self.repo.id)
+        assert not Build.objects.exists()
+
+        process_webhook_deliveries(self.repo.id)
+        assert len(Build.objects.all()) == 1
+
+    @pytest.mark.django_db
+    @mock.patch("metaci.repository.views.validate_github_webhook")
+    def test_github_webhook__status_event_not_triggering(self, validate):
+        url = reverse("github_webhook")
+        data = {
+            "repository": {"id": self.repo.github_id},
+            "context": "metaci/Plan1",
+            "state": "success",
+            "sha": "aR4Zd84F1i3No8",
+        }
+
         response = self.client.post(
             url,
             data=json.dumps(data),
@@ -276,8 +310,29 @@ class TestRepositoryViews(TestCase):
             HTTP_X_GITHUB_EVENT="status",
         )
 
-        assert response.content == b"OK"
-        assert len(Build.objects.all()) == 1
+        assert response.content == b"No plans triggered"
+        assert not WebhookDelivery.objects.exists()
+
+    @pytest.mark.django_db
+    @mock.patch("metaci.repository.views.process_webhook_deliveries.delay")
+    @mock.patch("metaci.repository.views.validate_github_webhook")
+    def test_github_webhook__redelivery(self, validate, process):
+        url = reverse("github_webhook")
+        data = {"repository": {"id": self.repo.github_id}, "ref": "refs/heads/main"}
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    url,
+                    data=json.dumps(data),
+                    content_type="application/json",
+                    HTTP_X_GITHUB_EVENT="push",
+                    HTTP_X_GITHUB_DELIVERY="72d3162e-cc78-11e3-81ab-4c9367dc0958",
+                )
+
+        assert response.content == b"Already received"
+        assert WebhookDelivery.objects.count() == 1
+        process.assert_called_once_with(self.repo.id)
 
     @pytest.mark.django_db
     def test_handle_github_push_webhook__no_branch_found(self):
@@ -294,8 +349,9 @@ class TestRepositoryViews(TestCase):
 
     # TODO: this test is essentially a no-op and should be revised.
     @pytest.mark.django_db
+    @mock.patch("metaci.repository.views.process_webhook_deliveries.delay")
     @mock.patch("metaci.repository.views.validate_github_webhook")
-    def test_github_webhook__with_tag(self, validate):
+    def test_github_webhook__with_tag(self, validate, process):
         self.client.force_login(self.user)
         url = reverse("github_webhook")
         push_data = {
@@ -310,8 +366,8 @@ class TestRepositoryViews(TestCase):
             content_type="application/json",
             HTTP_X_GITHUB_EVENT="push",
         )
-        assert response.status_code == 200
-        assert response.content == b"OK"
+        assert response.status_code == 202
+        assert response.content == b"Accepted"
 
     @pytest.mark.django_db
     def test_handle_github_push_webhook__with_branch(self):
@@ -381,10 +437,7 @@ class TestRepositoryViews(TestCase):
             )
 
     @pytest.mark.django_db
-    @mock.patch("metaci.repository.views.validate_github_webhook")
-    def test_github_webhook(self, validate):
-        self.client.force_login(self.user)
-        url = reverse("github_webhook")
+    def test_handle_github_webhook(self):
         push_data = {
             "repository": {"id": self.repo.github_id},
             "ref": "refs/tags/beta",
@@ -396,12 +449,7 @@ class TestRepositoryViews(TestCase):
             "handle_github_push_or_status_webhook",
             wraps=views.handle_github_push_or_status_webhook,
         ) as handler_mock:
-            self.client.post(
-                url,
-                data=json.dumps(push_data),
-                content_type="application/json",
-                HTTP_X_GITHUB_EVENT="push",
-            )
+            views.handle_github_webhook("push", push_data, self.repo)
             handler_mock.assert_called_once_with("push", push_data, self.repo)
 
         with patch.object(
@@ -409,12 +457,7 @@ class TestRepositoryViews(TestCase):
             "handle_github_push_or_status_webhook",
             wraps=views.handle_github_push_or_status_webhook,
         ) as handler_mock:
-            self.client.post(
-                url,
-                data=json.dumps(push_data),
-                content_type="application/json",
-                HTTP_X_GITHUB_EVENT="status",
-            )
+            views.handle_github_webhook("status", push_data, self.repo)
             handler_mock.assert_called_once_with("status", push_data, self.repo)
 
         with patch.object(
@@ -422,12 +465,7 @@ class TestRepositoryViews(TestCase):
             "handle_github_pr_webhook",
             wraps=views.handle_github_push_or_status_webhook,
         ) as handler_mock:
-            self.client.post(
-                url,
-                data=json.dumps(push_data),
-                content_type="application/json",
-                HTTP_X_GITHUB_EVENT="pull_request",
-            )
+            views.handle_github_webhook("pull_request", push_data, self.repo)
             handler_mock.assert_called_once_with("pull_request", push_data, self.repo)
 
     @pytest.mark.django_db
@@ -59,6 +59,10 @@ def create_status(build):
             description = f"⚠ ️{failed_tests}/{total_tests} failed"
             target_url = f"{build.get_external_url()}/tests"
 
+    elif build_status == "canceled":
+        state = "error"
+        description = "The build was canceled"
+
     else:
         raise BuildError(f"Unrecognized build status encountered: {build_status}")
 
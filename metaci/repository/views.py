@@ -7,6 +7,7 @@ from typing import Optional
 
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.csrf import csrf_exempt
@@ -14,13 +15,17 @@ from django.views.decorators.http import require_POST
 
 from metaci.build.models import Build
 from metaci.build.utils import view_queryset
+from metaci.plan import triggers as plan_triggers
+from metaci.plan.models import PlanRepository
 from metaci.release.models import Release
 from metaci.release.tasks import set_merge_freeze_status_for_commit
-from metaci.repository.models import Branch, Repository
+from metaci.repository.models import Branch, Repository, WebhookDelivery
+from metaci.repository.tasks import process_webhook_deliveries
 
 logger = logging.getLogger(__name__)
 
 TAG_BRANCH_PREFIX = "refs/tags/"
+WEBHOOK_EVENTS = ("push", "status", "pull_request")
 
 
 def repo_list(request, owner=None):
@@ -151,15 +156,49 @@ def validate_github_webhook(request):
 @csrf_exempt
 @require_POST
 def github_webhook(request):
+    """Store a webhook delivery to be processed by a worker.
+
+    GitHub gives up on a delivery after 10 seconds, so nothing slower than
+    storing it is done in the request. Deliveries are stored under their
+    X-GitHub-Delivery GUID, so a webhook GitHub redelivers is only
+    processed once.
+    """
     validate_github_webhook(request)
     event = request.META.get("HTTP_X_GITHUB_EVENT")
     payload = json.loads(request.body)
 
+    # Most status events, including MetaCI's own, trigger nothing,
+    # which the plan trigger index tells without a database query
+    if event == "status" and not plan_triggers.match(
+        payload["repository"]["id"], event, payload
+    ):
+        return HttpResponse("No plans triggered")
+
     try:
         repo = get_repository(payload)
     except Repository.DoesNotExist:
         return HttpResponse("Not listening for this repository")
 
+    if event not in WEBHOOK_EVENTS:
+        return HttpResponse("Unrecognized event")
+
+    try:
+        with transaction.atomic():
+            WebhookDelivery.objects.create(
+                repo=repo,
+                guid=request.META.get("HTTP_X_GITHUB_DELIVERY"),
+                event=event,
+                payload=payload,
+            )
+    except IntegrityError:
+        # GitHub redelivered a webhook we already have
+        return HttpResponse("Already received")
+    # The delivery is only visible to the worker once the request commits
+    transaction.on_commit(lambda: process_webhook_deliveries.delay(repo.id))
+    return HttpResponse("Accepted", status=202)
+
+
+def handle_github_webhook(event: str, payload: dict, repo: Repository) -> HttpResponse:
     if event in ("push", "status"):
         return handle_github_push_or_status_webhook(event, payload, repo)
     elif event == "pull_request":
@@ -246,25 +285,30 @@ def get_or_create_branch(branch_name, repo):
 
 
 def create_builds(event, payload, repo, branch, release):
-    for pr in repo.planrepository_set.should_run().filter(
-        plan__trigger__in=["commit", "tag", "status"]
-    ):
-        plan = pr.plan
-        run_build, commit, commit_message = plan.check_github_event(event, payload)
-        if run_build:
-            build = Build(
-                repo=repo,
-                plan=plan,
-                planrepo=pr,
-                commit=commit,
-                commit_message=commit_message,
-                branch=branch,
-                build_type="auto",
-            )
-            if release:
-                build.release = release
-                build.release_relationship_type = "test"
-            build.save()
+    matches = plan_triggers.match(repo.github_id, event, payload)
+    if not matches:
+        return
+    planrepos = PlanRepository.objects.select_related("plan").in_bulk(
+        [trigger.planrepo_id for trigger, _, _ in matches]
+    )
+    for trigger, commit, commit_message in matches:
+        pr = planrepos.get(trigger.planrepo_id)
+        if pr is None:
+            # Deleted since the index was loaded
+            continue
+        build = Build(
+            repo=repo,
+            plan=pr.plan,
+            planrepo=pr,
+            commit=commit,
+            commit_message=commit_message,
+            branch=branch,
+            build_type="auto",
+        )
+        if release:
+            build.release = release
+            build.release_relationship_type = "test"
+        build.save()
 
 
 def is_tag(ref):
@@ -0,0 +1,51 @@
+/*
+Live tailing of running build logs.
+
+Each element with a data-log-url attribute requests output added after the
+offset it has already shown from that URL, which holds the request until
+there is some, and appends it as it arrives. The page reloads once the
+build or flow finishes so the final result is shown.
+*/
+(function () {
+  var containers = document.querySelectorAll('[data-log-url]');
+  Array.prototype.forEach.call(containers, function (container) {
+    var pre = container.querySelector('pre.ansi2html-content');
+    var url = container.getAttribute('data-log-url');
+    var offset = 0;
+    var ansiState = '';
+    var retryInterval = 2;
+    var failures = 0;
+
+    function poll() {
+      var query = '?offset=' + offset + '&ansi_state=' + encodeURIComponent(ansiState);
+      fetch(url + query, { credentials: 'same-origin' })
+        .then(function (response) {
+          if (!response.ok) {
+            throw new Error(response.statusText);
+          }
+          return response.json();
+        })
+        .then(function (data) {
+          failures = 0;
+          if (data.reset) {
+            pre.innerHTML = '';
+          }
+          pre.insertAdjacentHTML('beforeend', data.html);
+          offset = data.offset;
+          ansiState = data.ansi_state;
+          if (data.complete) {
+            window.location.reload();
+          } else {
+            poll();
+          }
+        })
+        .catch(function () {
+          // Back off while the server is unavailable.
+          failures += 1;
+          window.setTimeout(poll, retryInterval * 1000 * Math.min(Math.pow(2, failures), 30));
+        });
+    }
+
+    poll();
+  });
+})();